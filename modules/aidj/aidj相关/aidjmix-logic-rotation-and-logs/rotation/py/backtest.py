@@ -0,0 +1,184 @@
+# rotation/py/backtest.py
+# Rotation backtesting: replay select_preset over weeks of minutes in one vectorised pass.
+# Same rules as select_preset (slot lookup, simple_head_tail guards, avgBpm bias),
+# evaluated with numpy over a minute grid instead of one call per minute.
+#
+#   python backtest.py --start 2026-09-01 --days 30 --telemetry telemetry.ndjson
+#   python backtest.py --days 30 --telemetry telemetry.ndjson --rotation candidate.json
+#
+# Rotation file / inline JSON: a list of RotationSlot objects, e.g.
+#   [{"start_hour": 0, "end_hour": 24, "preset": "classic"},
+#    {"start_hour": 1, "end_hour": 3, "preset": "hard_techno", "start_minute": 30, "weekdays": [5, 6]}]
+# (dates as ISO "YYYY-MM-DD"); defaults to DEFAULT_ROTATION.
+#
+# Telemetry file: NDJSON records {ts, recentErrors?, dropoutRate?, avgBpm?} (ts in epoch
+# s/ms or ISO local time), e.g. TelemetryAggregator.snapshot() logged once a minute.
+# Each record holds until the next one (forward fill).
+
+from typing import Dict, List, Optional, Sequence
+import argparse
+import datetime as _dt
+import json
+import os
+import time
+
+import numpy as np
+
+try:
+    from .preset_scheduler import (DEFAULT_ROTATION, Rotation, RotationSlot, RotationError,
+                                   compile_rotation, MINUTES_PER_DAY)
+except ImportError:  # run as a plain script directory
+    from preset_scheduler import (DEFAULT_ROTATION, Rotation, RotationSlot, RotationError,
+                                  compile_rotation, MINUTES_PER_DAY)
+
+BIAS_UP_FROM = ('deep_minimal', 'classic', 'hypnotic')
+BIAS_DOWN_FROM = ('peak_warehouse', 'hard_techno')
+
+def _epoch(ts) -> float:
+    if isinstance(ts, (int, float)):
+        return ts / 1000.0 if ts > 1e11 else float(ts)
+    return _dt.datetime.fromisoformat(str(ts)).timestamp()
+
+def load_telemetry(path: str) -> List[Dict]:
+    out = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                rec = json.loads(line)
+                if 'ts' in rec:
+                    out.append(rec)
+    return out
+
+def load_rotation(src: str) -> List[RotationSlot]:
+    """Rotation from a JSON file path or an inline JSON list of RotationSlot fields."""
+    text = open(src, 'r', encoding='utf-8').read() if os.path.exists(src) else src
+    try:
+        items = json.loads(text)
+    except ValueError as e:
+        raise RotationError(f'rotation is neither a file nor valid JSON: {e}') from None
+    if not isinstance(items, list):
+        raise RotationError('rotation JSON must be a list of slots')
+    slots = []
+    for item in items:
+        item = dict(item)
+        if item.get('weekdays') is not None:
+            item['weekdays'] = tuple(item['weekdays'])
+        if item.get('dates') is not None:
+            item['dates'] = tuple(_dt.date.fromisoformat(str(d)) for d in item['dates'])
+        try:
+            slots.append(RotationSlot(**item))
+        except TypeError as e:
+            raise RotationError(f'bad slot {item}: {e}') from None
+    return slots
+
+def _column(records: Sequence[Dict], key: str, fill: float) -> np.ndarray:
+    vals = [r.get(key) for r in records]
+    return np.array([v if isinstance(v, (int, float)) and not isinstance(v, bool) else fill for v in vals],
+                    dtype=np.float64)
+
+def telemetry_grid(records: Sequence[Dict], start: _dt.datetime, minutes: int) -> Dict[str, np.ndarray]:
+    """Forward-fill telemetry records onto the minute grid (missing → no signal)."""
+    errors = np.zeros(minutes, dtype=np.int32)
+    dropout = np.zeros(minutes, dtype=np.float64)
+    bpm = np.full(minutes, np.nan)
+    if not records:
+        return {'recentErrors': errors, 'dropoutRate': dropout, 'avgBpm': bpm}
+    recs = sorted(records, key=lambda r: _epoch(r['ts']))
+    ts = np.array([_epoch(r['ts']) for r in recs])
+    grid = start.timestamp() + 60.0 * np.arange(minutes)
+    idx = np.searchsorted(ts, grid, side='right') - 1    # last record at or before each minute
+    has = idx >= 0
+    errors[has] = _column(recs, 'recentErrors', 0)[idx[has]]
+    dropout[has] = _column(recs, 'dropoutRate', 0.0)[idx[has]]
+    bpm[has] = _column(recs, 'avgBpm', np.nan)[idx[has]]
+    return {'recentErrors': errors, 'dropoutRate': dropout, 'avgBpm': bpm}
+
+def slot_grid(rotation: Rotation, start: _dt.datetime, minutes: int) -> np.ndarray:
+    """Slot index for every minute of the grid, from the compiled weekday × minute table."""
+    compiled = compile_rotation(rotation)
+    week = np.array([np.frombuffer(r, dtype=np.uint16) for r in compiled.table])
+    first = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    offset = start.hour * 60 + start.minute
+    days = (offset + minutes + MINUTES_PER_DAY - 1) // MINUTES_PER_DAY
+    rows = week[[(first.weekday() + d) % 7 for d in range(days)]]
+    for d in range(days):
+        day = first.date() + _dt.timedelta(days=d)
+        if day in compiled.dated:
+            rows[d] = np.frombuffer(compiled.dated[day], dtype=np.uint16)
+    return rows.reshape(-1)[offset:offset + minutes].astype(np.int64)
+
+def _runs(mask: np.ndarray) -> int:
+    """Number of contiguous True periods."""
+    if not mask.size:
+        return 0
+    return int(mask[0]) + int(np.count_nonzero(mask[1:] & ~mask[:-1]))
+
+def backtest(rotation: Rotation = DEFAULT_ROTATION, telemetry: Optional[Sequence[Dict]] = None,
+             start: Optional[_dt.datetime] = None, days: float = 30, minutes: Optional[int] = None) -> Dict:
+    """Vectorised replay of select_preset for every minute in [start, start + days)."""
+    compiled = compile_rotation(rotation)
+    start = (start or _dt.datetime.now()).replace(second=0, microsecond=0)
+    n = int(minutes if minutes is not None else days * MINUTES_PER_DAY)
+    slots = slot_grid(compiled, start, n)
+    tel = telemetry_grid(telemetry or [], start, n)
+
+    names = sorted({s.preset for s in compiled.slots} | {'peak_warehouse', 'classic'})
+    code = {p: i for i, p in enumerate(names)}
+    slot_preset = np.array([code[s.preset] for s in compiled.slots])[slots]
+    slot_simple = np.array([bool(s.simple_head_tail) for s in compiled.slots])[slots]
+
+    err_force = tel['recentErrors'] > 0
+    drop_force = tel['dropoutRate'] > 0.05
+    simple = slot_simple | err_force | drop_force
+    bpm = tel['avgBpm']
+    with np.errstate(invalid='ignore'):
+        up = (bpm >= 132) & np.isin(slot_preset, [code[p] for p in BIAS_UP_FROM if p in code])
+        down = (bpm <= 126) & np.isin(slot_preset, [code[p] for p in BIAS_DOWN_FROM if p in code])
+    preset = np.where(up, code['peak_warehouse'], np.where(down, code['classic'], slot_preset))
+
+    counts = np.bincount(preset, minlength=len(names))
+    forced = simple & ~slot_simple
+    changed = preset[1:] != preset[:-1]
+    changed_any = changed | (simple[1:] != simple[:-1])
+    return {
+        'start': start.isoformat(timespec='minutes'),
+        'minutes': n,
+        'occupancy': {p: {'minutes': int(counts[i]), 'share': round(float(counts[i]) / max(1, n), 4)}
+                      for i, p in enumerate(names) if counts[i]},
+        'switches': {'preset': int(np.count_nonzero(changed)), 'preset_or_simple': int(np.count_nonzero(changed_any))},
+        'forced_simple_head_tail': {
+            'minutes': int(np.count_nonzero(forced)), 'periods': _runs(forced),
+            'by_errors_minutes': int(np.count_nonzero(err_force & ~slot_simple)),
+            'by_dropout_minutes': int(np.count_nonzero(drop_force & ~slot_simple)),
+        },
+        'bpm_bias': {
+            'up': {'minutes': int(np.count_nonzero(up)), 'triggers': _runs(up)},
+            'down': {'minutes': int(np.count_nonzero(down)), 'triggers': _runs(down)},
+        },
+        'series': {'preset': preset, 'simple_head_tail': simple, 'names': names},
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description='Backtest a preset rotation against recorded telemetry')
+    ap.add_argument('--start', type=str, default=None, help='local start time, ISO (default: 30 days ago)')
+    ap.add_argument('--days', type=float, default=30)
+    ap.add_argument('--telemetry', type=str, default=None, help='NDJSON telemetry records')
+    ap.add_argument('--rotation', type=str, default=None,
+                    help='candidate rotation: JSON file or inline JSON list of slots (default: DEFAULT_ROTATION)')
+    args = ap.parse_args()
+    try:
+        rotation = load_rotation(args.rotation) if args.rotation else DEFAULT_ROTATION
+        compile_rotation(rotation)
+    except (OSError, RotationError) as e:
+        ap.error(f'--rotation: {e}')
+    start = _dt.datetime.fromisoformat(args.start) if args.start else _dt.datetime.now() - _dt.timedelta(days=args.days)
+    records = load_telemetry(args.telemetry) if args.telemetry else []
+    t0 = time.perf_counter()
+    report = backtest(rotation, records, start, args.days)
+    report.pop('series')
+    report['elapsed_ms'] = round((time.perf_counter() - t0) * 1000, 1)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
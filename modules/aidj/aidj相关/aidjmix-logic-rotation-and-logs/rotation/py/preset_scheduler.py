@@ -1,12 +1,23 @@
 # rotation/py/preset_scheduler.py
 # Logic-only preset rotation for Python workflows (no ports, no servers).
+# Rotations are compiled once into a weekday × minute lookup table (7×1440),
+# so select_preset / minutes_until_next_change are O(1) per call.
 
 from dataclasses import dataclass
-from typing import List, Optional, Dict, Tuple
+from typing import List, Optional, Dict, Tuple, Union
+from array import array
 import datetime as _dt
+import operator
+import threading
 
 PresetName = str  # 'deep_minimal' | 'classic' | 'peak_warehouse' | 'hard_techno' | 'hypnotic'
 
+MINUTES_PER_DAY = 24 * 60
+_UNSET = 0xFFFF
+
+class RotationError(ValueError):
+    """Invalid rotation (bad bounds, overlap or uncovered minutes)."""
+
 @dataclass
 class RotationSlot:
     start_hour: int  # 0..23
@@ -14,6 +25,10 @@ class RotationSlot:
     preset: PresetName
     simple_head_tail: bool = False
     notes: str = ""
+    start_minute: int = 0                          # 0..59, added to start_hour
+    end_minute: int = 0                            # 0..59, added to end_hour (24:00 only with 0)
+    weekdays: Optional[Tuple[int, ...]] = None     # 0=Mon..6=Sun; None = every day
+    dates: Optional[Tuple[_dt.date, ...]] = None   # specific calendar days; overrides weekdays
 
 DEFAULT_ROTATION: List[RotationSlot] = [
     RotationSlot(0, 6,  'deep_minimal',  True,  'late night low-key flow'),
@@ -23,16 +38,154 @@ DEFAULT_ROTATION: List[RotationSlot] = [
     RotationSlot(22,24, 'hypnotic',      True,  'late evening long layers'),
 ]
 
-def _in_range(h: int, slot: RotationSlot) -> bool:
-    if slot.start_hour < slot.end_hour:
-        return slot.start_hour <= h < slot.end_hour
-    return h >= slot.start_hour or h < slot.end_hour
+def _bounds(slot: RotationSlot) -> Tuple[int, int]:
+    if not (0 <= slot.start_hour <= 23 and 0 <= slot.end_hour <= 24
+            and 0 <= slot.start_minute <= 59 and 0 <= slot.end_minute <= 59):
+        raise RotationError(f'slot out of range: {slot}')
+    if slot.end_hour == 24 and slot.end_minute:
+        raise RotationError(f'slot ends after 24:00: {slot}')
+    if slot.weekdays is not None and any(not 0 <= d <= 6 for d in slot.weekdays):
+        raise RotationError(f'weekday must be 0..6: {slot}')
+    return slot.start_hour * 60 + slot.start_minute, slot.end_hour * 60 + slot.end_minute
+
+def _spans(start: int, end: int) -> List[Tuple[int, int, int]]:
+    """(day offset, from, to) pieces; start >= end wraps past midnight (start == end → full day)."""
+    if start < end:
+        return [(0, start, end)]
+    return [(0, start, MINUTES_PER_DAY), (1, 0, end)] if end else [(0, start, MINUTES_PER_DAY)]
+
+def _fmt(h: int, m: int) -> str:
+    return f'{h}:{m:02d}' if m else str(h)
+
+def _run_lengths(row: array) -> array:
+    """run[m] = minutes from m until the slot index changes (or the row ends)."""
+    run = array('H', [0]) * MINUTES_PER_DAY
+    nxt = 0
+    for m in range(MINUTES_PER_DAY - 1, -1, -1):
+        nxt = nxt + 1 if m + 1 < MINUTES_PER_DAY and row[m + 1] == row[m] else 1
+        run[m] = nxt
+    return run
+
+class CompiledRotation:
+    """Weekday × minute slot table plus per-row run lengths for next-change lookups.
+
+    Layers: every-day slots < weekday slots < date slots; a more specific layer
+    overrides a more general one, while overlaps inside one layer are rejected.
+    Every minute of the week must end up covered by some slot.
+    """
+
+    def __init__(self, rotation: List[RotationSlot]):
+        if not rotation:
+            raise RotationError('empty rotation')
+        self.slots = list(rotation)
+        week = [array('H', [_UNSET]) * MINUTES_PER_DAY for _ in range(7)]
+        base_layer = [array('H', [_UNSET]) * MINUTES_PER_DAY for _ in range(7)]
+        dated: Dict[_dt.date, array] = {}
+
+        for idx, slot in enumerate(self.slots):
+            start, end = _bounds(slot)
+            if slot.dates:
+                for day in slot.dates:
+                    for off, a, b in _spans(start, end):
+                        d = day + _dt.timedelta(days=off)
+                        row = dated.setdefault(d, array('H', [_UNSET]) * MINUTES_PER_DAY)
+                        self._paint(row, a, b, idx, f'date {d}')
+                continue
+            layer = week if slot.weekdays is not None else base_layer
+            days = slot.weekdays if slot.weekdays is not None else range(7)
+            for wd in set(days):
+                for off, a, b in _spans(start, end):
+                    self._paint(layer[(wd + off) % 7], a, b, idx, f'weekday {(wd + off) % 7}')
+
+        for wd in range(7):
+            row, base = week[wd], base_layer[wd]
+            for m in range(MINUTES_PER_DAY):
+                if row[m] == _UNSET:
+                    row[m] = base[m]
+                    if row[m] == _UNSET:
+                        raise RotationError(f'gap in rotation: weekday {wd} {m // 60:02d}:{m % 60:02d}')
+        for d, row in dated.items():
+            fallback = week[d.weekday()]
+            for m in range(MINUTES_PER_DAY):
+                if row[m] == _UNSET:
+                    row[m] = fallback[m]
+
+        self.table = week
+        self.dated = dated
+        self._runs = [_run_lengths(r) for r in week]
+        self._dated_runs = {d: _run_lengths(r) for d, r in dated.items()}
 
-def select_preset(local_dt: _dt.datetime, rotation: List[RotationSlot]=DEFAULT_ROTATION,
+    def _paint(self, row: array, a: int, b: int, idx: int, where: str) -> None:
+        for m in range(a, b):
+            if row[m] != _UNSET:
+                other = self.slots[row[m]]
+                raise RotationError(f'overlap on {where} at {m // 60:02d}:{m % 60:02d}: '
+                                    f'{other.preset} vs {self.slots[idx].preset}')
+            row[m] = idx
+
+    def _row(self, day: _dt.date) -> Tuple[array, array]:
+        if day in self.dated:
+            return self.dated[day], self._dated_runs[day]
+        wd = day.weekday()
+        return self.table[wd], self._runs[wd]
+
+    def slot_at(self, local_dt: _dt.datetime) -> RotationSlot:
+        row, _ = self._row(local_dt.date())
+        return self.slots[row[local_dt.hour * 60 + local_dt.minute]]
+
+    def minutes_until_next_change(self, local_dt: _dt.datetime) -> int:
+        """Minutes until the active slot changes; bounded to one week if it never does."""
+        day = local_dt.date()
+        m = local_dt.hour * 60 + local_dt.minute
+        row, run = self._row(day)
+        cur = row[m]
+        total = run[m]
+        # Runs stop at midnight; continue into following days while the slot persists.
+        for _ in range(6):
+            if m + run[m] < MINUTES_PER_DAY:
+                break
+            day, m = day + _dt.timedelta(days=1), 0
+            row, run = self._row(day)
+            if row[0] != cur:
+                break
+            total += run[0]
+        return total
+
+DEFAULT_COMPILED = CompiledRotation(DEFAULT_ROTATION)   # compiled once; the default for lookups
+
+_COMPILED_CACHE_SIZE = 16
+# id(list) → (list, slot objects at compile time, table). Holding the list keeps its id from being reused.
+_compiled_cache: Dict[int, Tuple[List[RotationSlot], Tuple[RotationSlot, ...], CompiledRotation]] = {
+    id(DEFAULT_ROTATION): (DEFAULT_ROTATION, tuple(DEFAULT_ROTATION), DEFAULT_COMPILED)}
+_compiled_lock = threading.Lock()
+
+def compile_rotation(rotation: Union[List[RotationSlot], CompiledRotation]) -> CompiledRotation:
+    """Compile a rotation, cached per list object in a small bounded cache.
+
+    A hit requires the same list holding the same slot objects, so appending, removing or
+    replacing slots recompiles; after editing a slot's fields in place use CompiledRotation(list).
+    """
+    if isinstance(rotation, CompiledRotation):
+        return rotation
+    hit = _compiled_cache.get(id(rotation))
+    if (hit is not None and hit[0] is rotation and len(hit[1]) == len(rotation)
+            and all(map(operator.is_, hit[1], rotation))):
+        return hit[2]
+    compiled = CompiledRotation(rotation)
+    with _compiled_lock:
+        _compiled_cache[id(rotation)] = (rotation, tuple(rotation), compiled)
+        while len(_compiled_cache) > _COMPILED_CACHE_SIZE:
+            _compiled_cache.pop(next(iter(_compiled_cache)))   # oldest first
+    return compiled
+
+Rotation = Union[List[RotationSlot], CompiledRotation]
+
+def select_preset(local_dt: _dt.datetime, rotation: Rotation=DEFAULT_COMPILED,
                   telemetry: Optional[Dict]=None) -> Dict:
-    h = local_dt.hour
-    slot = next((s for s in rotation if _in_range(h, s)), rotation[0])
-    reasons = [f"time:{h}:00 in [{slot.start_hour},{slot.end_hour}) → {slot.preset}"]
+    h = local_dt.hour; m = local_dt.minute
+    slot = compile_rotation(rotation).slot_at(local_dt)
+    reasons = [f"time:{h}:{m:02d} in [{_fmt(slot.start_hour, slot.start_minute)},"
+               f"{_fmt(slot.end_hour, slot.end_minute)}) → {slot.preset}"]
     simple = bool(slot.simple_head_tail)
 
     if telemetry:
@@ -53,13 +206,13 @@ def select_preset(local_dt: _dt.datetime, rotation: List[RotationSlot]=DEFAULT_R
 
     return {'preset':slot.preset, 'simple_head_tail':simple, 'reason':reasons}
 
-def minutes_until_next_change(local_dt: _dt.datetime, rotation: List[RotationSlot]=DEFAULT_ROTATION) -> int:
-    h = local_dt.hour; m = local_dt.minute
-    slot = next((s for s in rotation if _in_range(h, s)), rotation[0])
-    end_h = slot.end_hour % 24
-    minutes = ((end_h - h) % 24)*60 - m
-    return minutes if minutes>0 else 60
+def minutes_until_next_change(local_dt: _dt.datetime, rotation: Rotation=DEFAULT_COMPILED) -> int:
+    return compile_rotation(rotation).minutes_until_next_change(local_dt)
 
 # Usage (no ports):
 # sel = select_preset(_dt.datetime.now(), DEFAULT_ROTATION, {'avgBpm':130, 'dropoutRate':0.02})
 # args = ['--preset', sel['preset']] + (['--simple_head_tail'] if sel['simple_head_tail'] else [])
+#
+# Minute-level / calendar-aware slots (weekday and date layers override the every-day layer):
+# WEEKEND = DEFAULT_ROTATION + [RotationSlot(1, 3, 'hard_techno', False, 'weekend peak', 30, 0, weekdays=(5, 6))]
+# table = compile_rotation(WEEKEND)   # raises RotationError on overlap/gap
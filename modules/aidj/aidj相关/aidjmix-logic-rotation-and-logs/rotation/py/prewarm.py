@@ -0,0 +1,142 @@
+# rotation/py/prewarm.py
+# Ahead-of-time playlist generation for rotation slot changes (no ports, no servers).
+# A background worker generates the upcoming slot's playlist `lead_minutes` before the
+# boundary, keeps it warm, regenerates it if telemetry flips the selected preset, and
+# swaps it in atomically once the boundary is reached.
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+import datetime as _dt
+import threading
+
+try:
+    from .preset_scheduler import (DEFAULT_ROTATION, Rotation, compile_rotation,
+                                   select_preset, minutes_until_next_change)
+except ImportError:  # run as a plain script directory
+    from preset_scheduler import (DEFAULT_ROTATION, Rotation, compile_rotation,
+                                  select_preset, minutes_until_next_change)
+
+Generator = Callable[[Dict], Any]   # selection dict → playlist (plan, m3u path, ...)
+
+@dataclass
+class WarmPlaylist:
+    starts_at: _dt.datetime   # first minute this playlist is valid for
+    selection: Dict           # select_preset(...) result it was generated for
+    playlist: Any
+
+def _same_selection(a: Dict, b: Dict) -> bool:
+    return a['preset'] == b['preset'] and a['simple_head_tail'] == b['simple_head_tail']
+
+def _floor_minute(t: _dt.datetime) -> _dt.datetime:
+    return t.replace(second=0, microsecond=0)
+
+class PlaylistPrewarmer:
+    """Keeps the current and the upcoming slot's playlists ready.
+
+    `generate` is called from the worker thread (or from `current()` on a cold
+    miss) with the selection dict; `telemetry_fn` supplies the telemetry dict used
+    for every selection (e.g. telemetry_stream.TelemetryAggregator.snapshot).
+    """
+
+    def __init__(self, generate: Generator, rotation: Rotation = DEFAULT_ROTATION,
+                 lead_minutes: int = 10, telemetry_fn: Optional[Callable[[], Optional[Dict]]] = None,
+                 poll_sec: float = 15.0, clock: Callable[[], _dt.datetime] = _dt.datetime.now):
+        self.generate = generate
+        self.rotation = compile_rotation(rotation)
+        self.lead_minutes = lead_minutes
+        self.telemetry_fn = telemetry_fn or (lambda: None)
+        self.poll_sec = poll_sec
+        self.clock = clock
+        self.active: Optional[WarmPlaylist] = None
+        self.upcoming: Optional[WarmPlaylist] = None
+        self.stats = {'generated': 0, 'prewarmed': 0, 'regenerated': 0, 'handovers': 0, 'cold_misses': 0}
+        self._lock = threading.Lock()
+        self._gen_lock = threading.Lock()   # one generation at a time
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------ worker
+    def start(self) -> 'PlaylistPrewarmer':
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='playlist-prewarm', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set(); self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def notify_telemetry(self) -> None:
+        """Wake the worker so a telemetry change is re-evaluated before the next poll."""
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:  # keep the worker alive; the cold path still serves
+                print(f'[prewarm] tick failed: {e}', flush=True)
+            self._wake.wait(self.poll_sec)
+            self._wake.clear()
+
+    # ------------------------------------------------------------------ logic
+    def _generate(self, starts_at: _dt.datetime, selection: Dict) -> WarmPlaylist:
+        with self._gen_lock:
+            playlist = self.generate(selection)
+        self.stats['generated'] += 1
+        return WarmPlaylist(starts_at, selection, playlist)
+
+    def _promote(self, now: _dt.datetime) -> None:
+        # caller holds self._lock
+        if self.upcoming is not None and now >= self.upcoming.starts_at:
+            self.active, self.upcoming = self.upcoming, None
+            self.stats['handovers'] += 1
+
+    def tick(self, now: Optional[_dt.datetime] = None) -> None:
+        """One scheduling step: hand over at the boundary, prewarm inside the lead window."""
+        now = _floor_minute(now or self.clock())
+        with self._lock:
+            self._promote(now)
+            warm = self.upcoming
+        left = minutes_until_next_change(now, self.rotation)
+        if left > self.lead_minutes:
+            return
+        boundary = now + _dt.timedelta(minutes=left)
+        wanted = select_preset(boundary, self.rotation, self.telemetry_fn())
+        if warm is not None and warm.starts_at == boundary and _same_selection(warm.selection, wanted):
+            return
+        fresh = self._generate(boundary, wanted)
+        with self._lock:
+            if warm is not None and warm.starts_at == boundary:
+                self.stats['regenerated'] += 1
+            else:
+                self.stats['prewarmed'] += 1
+            self.upcoming = fresh
+
+    def current(self, now: Optional[_dt.datetime] = None) -> WarmPlaylist:
+        """Playlist for `now`; prewarmed at boundaries, generated on demand on a cold miss
+        or when telemetry has changed the selection mid-slot."""
+        now = _floor_minute(now or self.clock())
+        with self._lock:
+            self._promote(now)
+            active = self.active
+        wanted = select_preset(now, self.rotation, self.telemetry_fn())
+        if active is not None and _same_selection(active.selection, wanted):
+            return active
+        fresh = self._generate(now, wanted)
+        with self._lock:
+            self.stats['cold_misses'] += 1
+            self.active = fresh
+        return fresh
+
+# Usage (no ports):
+# def gen(sel):
+#     args = ['python','-m','aidjmix.cli','features.json','out/','--preset', sel['preset']]
+#     if sel['simple_head_tail']: args.append('--simple_head_tail')
+#     return subprocess.run(args, check=True, capture_output=True, text=True).stdout
+# warm = PlaylistPrewarmer(gen, lead_minutes=10).start()
+# playlist = warm.current().playlist      # at 22:00 this is the prewarmed `hypnotic` set
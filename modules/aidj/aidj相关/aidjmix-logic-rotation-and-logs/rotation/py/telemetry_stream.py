@@ -0,0 +1,204 @@
+# rotation/py/telemetry_stream.py
+# Streaming telemetry for select_preset (logic + a local reader, no servers).
+# Tail-follows the metadata server's events.ndjson (or a local UDP socket) and keeps
+# rolling-window aggregates in a time-bucketed ring buffer: O(1) work per event and
+# per snapshot, never re-reading the log.
+
+from typing import Callable, Dict, Iterable, Optional
+import json
+import os
+import socket
+import threading
+import time
+
+# Same location metadata_server.js appends to (LOG_DIR/events.ndjson); override via env.
+DEFAULT_EVENT_LOG = os.environ.get('AIDJ_EVENT_LOG', '/Users/masher/code/logs/personal_website/events.ndjson')
+
+ERROR_KINDS = frozenset(('error', 'stream_error', 'playback_error'))
+DROPOUT_KINDS = frozenset(('dropout', 'stall', 'buffering', 'underrun'))
+
+class RollingWindow:
+    """Ring of `buckets` time buckets covering `window_sec`; running totals stay in sync,
+    so both add() and snapshot() are O(1) amortised (expiry touches each bucket once)."""
+
+    FIELDS = ('events', 'errors', 'dropouts', 'bpm_sum', 'bpm_n')
+
+    def __init__(self, window_sec: float = 300.0, buckets: int = 60):
+        self.window_sec = float(window_sec)
+        self.buckets = max(1, int(buckets))
+        self.bucket_sec = self.window_sec / self.buckets
+        self._ring = [[0.0] * len(self.FIELDS) for _ in range(self.buckets)]
+        self._totals = [0.0] * len(self.FIELDS)
+        self._head: Optional[int] = None   # absolute index of the newest bucket
+
+    def _advance(self, slot: int) -> None:
+        if self._head is None:
+            self._head = slot
+            return
+        if slot <= self._head:
+            return
+        # Expire every bucket we skip over (at most one full lap).
+        for s in range(max(self._head + 1, slot - self.buckets + 1), slot + 1):
+            cell = self._ring[s % self.buckets]
+            for i, v in enumerate(cell):
+                self._totals[i] -= v
+                cell[i] = 0.0
+        self._head = slot
+
+    def add(self, ts: float, events: int = 1, errors: int = 0, dropouts: int = 0,
+            bpm: Optional[float] = None) -> None:
+        slot = int(ts // self.bucket_sec)
+        self._advance(slot)
+        if slot <= self._head - self.buckets:
+            return  # older than the window
+        cell = self._ring[slot % self.buckets]
+        delta = (events, errors, dropouts, bpm or 0.0, 1 if bpm is not None else 0)
+        for i, v in enumerate(delta):
+            cell[i] += v
+            self._totals[i] += v
+
+    def totals(self, now: float) -> Dict[str, float]:
+        self._advance(int(now // self.bucket_sec))
+        return dict(zip(self.FIELDS, self._totals))
+
+def classify(event: Dict) -> Dict:
+    """Map one metadata-server event ({ts, kind, payload}) to window increments."""
+    kind = str(event.get('kind') or event.get('type') or '').lower()
+    payload = event.get('payload')
+    out = {'errors': 0, 'dropouts': 0, 'bpm': None}
+    if kind in ERROR_KINDS or (isinstance(payload, dict) and payload.get('error')):
+        out['errors'] = 1
+    if kind in DROPOUT_KINDS:
+        out['dropouts'] = 1
+    if kind == 'bpm':
+        value = payload.get('value') if isinstance(payload, dict) else payload
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+            out['bpm'] = float(value)
+    return out
+
+class TelemetryAggregator:
+    """Rolling telemetry for select_preset: recentErrors, dropoutRate, avgBpm.
+
+    dropoutRate = dropout events / all events in the window (errors and dropouts
+    share the error window; bpm uses its own, usually shorter, window).
+    """
+
+    def __init__(self, error_window_sec: float = 300.0, bpm_window_sec: float = 120.0,
+                 buckets: int = 60, clock: Callable[[], float] = time.time):
+        self.events = RollingWindow(error_window_sec, buckets)
+        self.bpm = RollingWindow(bpm_window_sec, buckets)
+        self.clock = clock
+        self.ingested = 0
+        self.malformed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: list = []
+
+    def ingest(self, event: Dict) -> None:
+        ts = event.get('ts')
+        ts = ts / 1000.0 if isinstance(ts, (int, float)) and ts > 1e11 else (ts or self.clock())
+        c = classify(event)
+        with self._lock:
+            self.events.add(ts, 1, c['errors'], c['dropouts'])
+            if c['bpm'] is not None:
+                self.bpm.add(ts, 0, bpm=c['bpm'])
+            self.ingested += 1
+
+    def ingest_line(self, line: str) -> None:
+        line = line.strip()
+        if not line:
+            return
+        try:
+            event = json.loads(line)
+        except ValueError:
+            self.malformed += 1
+            return
+        if isinstance(event, dict):
+            self.ingest(event)
+
+    def ingest_lines(self, lines: Iterable[str]) -> None:
+        for line in lines:
+            self.ingest_line(line)
+
+    def snapshot(self, now: Optional[float] = None) -> Dict:
+        """Ready-to-use telemetry dict for select_preset."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            ev = self.events.totals(now)
+            bp = self.bpm.totals(now)
+        snap = {
+            'recentErrors': int(ev['errors']),
+            'dropoutRate': (ev['dropouts'] / ev['events']) if ev['events'] else 0.0,
+        }
+        if bp['bpm_n']:
+            snap['avgBpm'] = round(bp['bpm_sum'] / bp['bpm_n'], 1)
+        return snap
+
+    # ------------------------------------------------------------------ sources
+    def follow_file(self, path: str = DEFAULT_EVENT_LOG, from_start: bool = False,
+                    poll_sec: float = 0.5) -> threading.Thread:
+        """Tail-follow an NDJSON file in a daemon thread (handles truncation/rotation)."""
+        def run() -> None:
+            fh = None; ino = None; pending = ''
+            seek_end = not from_start
+            while not self._stop.is_set():
+                try:
+                    if fh is None:
+                        fh = open(path, 'r', encoding='utf-8', errors='ignore')
+                        ino = os.fstat(fh.fileno()).st_ino
+                        if seek_end:
+                            fh.seek(0, os.SEEK_END)
+                    chunk = fh.read()
+                    if chunk:
+                        pending += chunk
+                        *lines, pending = pending.split('\n')
+                        self.ingest_lines(lines)
+                        continue
+                    st = os.stat(path)
+                    if st.st_ino != ino or st.st_size < fh.tell():
+                        # rotated or truncated → reopen and read the new file from its start
+                        fh.close(); fh = None; pending = ''
+                        seek_end = False
+                        continue
+                except FileNotFoundError:
+                    if fh is not None:
+                        fh.close(); fh = None
+                    seek_end = False
+                except Exception as e:
+                    print(f'[telemetry] follow error: {e}', flush=True)
+                self._stop.wait(poll_sec)
+            if fh is not None:
+                fh.close()
+        return self._spawn(run, 'telemetry-follow')
+
+    def follow_socket(self, host: str = '127.0.0.1', port: int = 3501) -> threading.Thread:
+        """Receive NDJSON events over local UDP (one or more lines per datagram)."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((host, port))
+        sock.settimeout(0.5)
+        def run() -> None:
+            with sock:
+                while not self._stop.is_set():
+                    try:
+                        data, _ = sock.recvfrom(65536)
+                    except socket.timeout:
+                        continue
+                    self.ingest_lines(data.decode('utf-8', errors='ignore').splitlines())
+        return self._spawn(run, 'telemetry-socket')
+
+    def _spawn(self, target: Callable[[], None], name: str) -> threading.Thread:
+        th = threading.Thread(target=target, name=name, daemon=True)
+        th.start()
+        self._threads.append(th)
+        return th
+
+    def stop(self, timeout: Optional[float] = 2.0) -> None:
+        self._stop.set()
+        for th in self._threads:
+            th.join(timeout)
+        self._threads = []
+
+# Usage (no ports besides the optional local UDP reader):
+# agg = TelemetryAggregator(); agg.follow_file()
+# sel = select_preset(_dt.datetime.now(), DEFAULT_ROTATION, agg.snapshot())
+# warm = PlaylistPrewarmer(gen, telemetry_fn=agg.snapshot).start()
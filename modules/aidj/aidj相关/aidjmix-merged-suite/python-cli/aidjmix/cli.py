@@ -2,6 +2,7 @@ import argparse, json, time
 from pathlib import Path
 from .types import TrackFeature
 from .config import LIMITS
+from .dedup import CANONICAL_RULES
 from .search import beam_search, greedy_sequence
 from .transitions import plan_transitions
 from .export_m3u import export_m3u
@@ -17,6 +18,15 @@ def main():
     ap.add_argument("--techno", type=int, default=1, help="Techno 优化（1=开,0=关）")
     ap.add_argument("--preset", type=str, default="classic", help="Techno 预设")
     ap.add_argument("--simple_head_tail", action="store_true", help="仅头尾相接")
+    ap.add_argument("--energy_store", type=str, default="list", choices=["list", "uint8", "float16"],
+                    help="能量曲线存储：list=原始列表；uint8/float16=重采样后量化进连续数组")
+    ap.add_argument("--energy_res", type=int, default=16, help="能量曲线重采样分辨率（紧凑存储时）")
+    ap.add_argument("--dedup", action="store_true", help="搜索前折叠重复/近似重复曲目")
+    ap.add_argument("--dedup_rule", type=str, default=None, choices=sorted(CANONICAL_RULES), help="代表选择规则（默认 config.DEDUP['rule']）")
+    ap.add_argument("--graph", type=str, default=None, help="近邻图文件：存在且与曲库/权重一致则内存映射复用，否则构建并保存")
+    ap.add_argument("--graph_k", type=int, default=LIMITS["graph_k"], help="近邻图每首保留的后继数")
+    ap.add_argument("--graph_rebuild", action="store_true", help="强制重建近邻图")
+    ap.add_argument("--graph_only", action="store_true", help="只构建/校验近邻图，不生成歌单")
     args = ap.parse_args()
 
     data = json.loads(Path(args.features_json).read_text("utf-8"))
@@ -24,8 +34,41 @@ def main():
     apply_preset(args.preset)
 
     tracks = [TrackFeature(**t) for t in data]
+    del data   # 解析出的 dict 仍引用各条 energyCurve 列表；紧凑存储时须释放才真正省内存
+    if args.dedup:
+        from .dedup import dedup_tracks
+        tracks, dupes = dedup_tracks(tracks, rule=args.dedup_rule)
+        print(f"[DEDUP] kept={len(tracks)} collapsed={sum(len(v) for v in dupes.values())}")
+    bank = None
+    if args.energy_store != "list":
+        from .energy import EnergyBank
+        bank = EnergyBank(tracks, resolution=args.energy_res, dtype=args.energy_store)
 
-    seq = greedy_sequence(tracks, args.minutes) if args.greedy else beam_search(tracks, args.minutes, args.beam)
+    graph = None
+    if args.graph:
+        from .neighbors import NeighborGraph, build_neighbor_graph, graph_signature
+        gpath = Path(args.graph)
+        if gpath.exists() and not args.graph_rebuild:
+            graph = NeighborGraph.load(gpath)
+            if graph.signature != graph_signature(tracks, bank) or graph.k != args.graph_k:
+                print(f"[GRAPH] stale (preset/weights/track features changed), rebuilding: {gpath}")
+                graph = None
+        if graph is None:
+            t0 = time.perf_counter()
+            build_neighbor_graph(tracks, args.graph_k, bank, preset=args.preset).save(gpath)
+            graph = NeighborGraph.load(gpath)
+            print(f"[GRAPH] built in {time.perf_counter()-t0:.2f}s")
+        print(f"[GRAPH] n={len(graph)} k={graph.k} nnz={graph.nnz} bytes={graph.nbytes} -> {gpath}")
+        if args.graph_only: return
+
+    if args.greedy: seq = greedy_sequence(tracks, args.minutes, bank, graph)
+    else: seq = beam_search(tracks, args.minutes, args.beam, bank, graph)
+    if graph is not None and graph.fallbacks:
+        print(f"[GRAPH] fallbacks={graph.fallbacks}")
+    if bank is not None:
+        # 能量曲线已移交 bank：只为选中的曲目反量化回列表，供导出的过渡计划使用
+        for t in seq:
+            if t.energyCurve is None: t.energyCurve = bank.curve(t.id)
     plan = plan_transitions(seq, techno=bool(args.techno), simple_head_tail=bool(args.simple_head_tail))
 
     ts = time.strftime("%Y%m%d_%H%M%S")
@@ -13,9 +13,18 @@ LIMITS = {
     "bpm_ideal": 128,
     "bpm_tol": 4,
     "bpm_soft_range": (124, 136),
+    "graph_k": 32,             # 近邻图每首保留的后继数
+    "graph_fallback": 256,     # 近邻耗尽时按 BPM 最接近取多少首现场评分
 }
 
 TRANSITION = {
     "default_crossfade_beats": 16,
     "techno_crossfade_beats": 24,
 }
+
+DEDUP = {
+    "duration_tol_sec": 3.0,   # 同版本的时长容差
+    "bpm_tol": 0.5,
+    "rule": "quality",         # quality|longest|shortest|features|first
+    "merge_edits": True,       # 电台剪辑等短版本并入原曲组
+}
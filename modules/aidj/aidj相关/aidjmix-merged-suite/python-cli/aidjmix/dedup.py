@@ -0,0 +1,162 @@
+import re
+import unicodedata
+from collections import defaultdict
+from pathlib import PurePath
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from .types import TrackFeature
+from .config import DEDUP
+
+# 搜索前去重：同一首歌的不同路径/格式/电台剪辑/重复上传折叠为一个代表。
+# 采用哈希分块索引（艺人+标题+调性+BPM 桶），只在同桶及相邻 BPM 桶内比较，避免两两比对。
+
+# 仅剥离“版本”标记；Remix/Dub 等不同作品保留
+_VERSION_RE = re.compile(
+    r"[\(\[]\s*(?:(?:original|extended|club|album|single|radio)\s*(?:mix|edit|version)"
+    r"|radio|edit|short\s*edit|remaster(?:ed)?(?:\s*\d{4})?|\d{4}\s*remaster(?:ed)?"
+    r"|explicit|clean|dirty|mono|stereo|hq|official(?:\s*audio)?)\s*[\)\]]",
+    re.I,
+)
+_EDIT_RE = re.compile(r"\b(?:radio|short|single)\s*(?:edit|version)\b|\bedit\b", re.I)
+_FEAT_RE = re.compile(r"\s*[\(\[]?\s*\b(?:feat|ft|featuring)\b\.?.*$", re.I)
+# " x " 只在两侧都有空白时视为合作分隔（避免拆坏 "Malcolm X"、"X-Press 2"）
+_ARTIST_SPLIT_RE = re.compile(r"\s*(?:,|&|/|;|\band\b|\bvs\.?)\s*|\s+x\s+(?=\S)", re.I)
+_PUNCT_RE = re.compile(r"[^\w\s]+")
+_WS_RE = re.compile(r"\s+")
+
+# 格式优先级（数值越小越好）
+FORMAT_RANK = {"flac": 0, "wav": 1, "aiff": 1, "aif": 1, "alac": 2, "m4a": 3, "ogg": 4, "opus": 4, "mp3": 5}
+
+def _fold(s: str) -> str:
+    s = unicodedata.normalize("NFKC", s or "").lower()
+    s = _PUNCT_RE.sub(" ", s)
+    return _WS_RE.sub(" ", s).strip()
+
+def normalize_title(t: TrackFeature) -> str:
+    """标题归一：去版本标记与 feat. 段；无标题时回退到文件名。"""
+    raw = t.title or PurePath(t.path or "").stem
+    raw = _VERSION_RE.sub(" ", raw)
+    raw = _FEAT_RE.sub("", raw)
+    return _fold(raw)
+
+def normalize_artist(t: TrackFeature) -> str:
+    """艺人归一：去 feat. 段，拆分合作艺人后排序拼接（顺序无关）。"""
+    raw = _FEAT_RE.sub("", t.artist or "")
+    names = sorted(n for n in (_fold(p) for p in _ARTIST_SPLIT_RE.split(raw)) if n)
+    return " ".join(names)
+
+def is_edit(t: TrackFeature) -> bool:
+    return bool(_EDIT_RE.search(t.title or ""))
+
+def _format_rank(t: TrackFeature) -> int:
+    ext = PurePath(t.path or "").suffix.lower().lstrip(".")
+    return FORMAT_RANK.get(ext, 6)
+
+def _feature_richness(t: TrackFeature) -> int:
+    return sum(1 for v in (t.energyCurve, t.downbeats, t.cueInSec, t.cueOutSec, t.vocality) if v is not None)
+
+# 代表选择规则：返回排序键，越小越优先
+CANONICAL_RULES: Dict[str, Callable[[TrackFeature], tuple]] = {
+    "quality":  lambda t: (is_edit(t), _format_rank(t), -_feature_richness(t), -(t.durationSec or 0)),
+    "longest":  lambda t: (-(t.durationSec or 0),),
+    "shortest": lambda t: ((t.durationSec or 0),),
+    "features": lambda t: (-_feature_richness(t), _format_rank(t)),
+    "first":    lambda t: (),
+}
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def dedup_tracks(tracks: List[TrackFeature],
+                 duration_tol: Optional[float] = None,
+                 bpm_tol: Optional[float] = None,
+                 rule: Union[str, Callable[[TrackFeature], tuple], None] = None,
+                 merge_edits: Optional[bool] = None) -> Tuple[List[TrackFeature], Dict[str, List[str]]]:
+    """折叠重复/近似重复曲目。
+
+    返回 (代表列表, {代表 id: [被折叠的 id...]})；代表列表保持原始相对顺序。
+    同组条件：艺人与标题归一后相同、调性相同、BPM 相差 ≤ bpm_tol，
+    且时长相差 ≤ duration_tol（merge_edits 时剪辑版不受时长约束）。
+    条件对组内任意两首都成立（全链接）：不会经中间曲目把超出容差的两首串进同一组。
+    """
+    duration_tol = DEDUP["duration_tol_sec"] if duration_tol is None else duration_tol
+    bpm_tol = DEDUP["bpm_tol"] if bpm_tol is None else bpm_tol
+    merge_edits = DEDUP["merge_edits"] if merge_edits is None else merge_edits
+    rule = rule or DEDUP["rule"]
+    rank = CANONICAL_RULES[rule] if isinstance(rule, str) else rule
+    if not tracks: return [], {}
+
+    n = len(tracks)
+    parent = list(range(n))
+    edits = [is_edit(t) for t in tracks]
+    width = max(bpm_tol, 1e-6)
+    index: Dict[tuple, List[int]] = defaultdict(list)
+
+    members: Dict[int, List[int]] = {i: [i] for i in range(n)}
+
+    def close(a: int, b: int, relax_edits: bool = False) -> bool:
+        ta, tb = tracks[a], tracks[b]
+        if abs((ta.bpm or 0) - (tb.bpm or 0)) > bpm_tol: return False
+        if relax_edits and (edits[a] or edits[b]): return True
+        return abs((ta.durationSec or 0) - (tb.durationSec or 0)) <= duration_tol
+
+    def union(i: int, j: int, relax_edits: bool = False) -> bool:
+        """两组所有成员两两满足条件时才合并。"""
+        ri, rj = _find(parent, i), _find(parent, j)
+        if ri == rj: return True
+        if not all(close(a, b, relax_edits) for a in members[ri] for b in members[rj]): return False
+        lo, hi = min(ri, rj), max(ri, rj)
+        parent[hi] = lo
+        members[lo].extend(members.pop(hi))
+        return True
+
+    def candidates(i: int):
+        t = tracks[i]
+        for b in (bkeys[i][1] - 1, bkeys[i][1], bkeys[i][1] + 1):
+            for j in index.get(bkeys[i][0] + (b,), ()):
+                if j != i and abs((tracks[j].bpm or 0) - (t.bpm or 0)) <= bpm_tol:
+                    yield j
+
+    bkeys: List[Optional[tuple]] = [None] * n
+    for i, t in enumerate(tracks):
+        title = normalize_title(t)
+        if not title:
+            continue  # 无可比对的标识，视为唯一
+        base = (normalize_artist(t), title, (t.keyCamelot or "").upper())
+        bkeys[i] = (base, int((t.bpm or 0) // width))
+        # 多探针：查相邻 BPM 桶，避免桶边界漏配
+        for j in candidates(i):
+            if close(i, j) and union(i, j):
+                break   # 只加入第一个完全兼容的组，不桥接多个组
+        index[base + (bkeys[i][1],)].append(i)
+
+    if merge_edits:
+        # 剪辑版：所在组若还没有完整版，则并入同块内第一个完整版所在组（只挂一次，不桥接其它组）
+        has_full: Dict[int, bool] = defaultdict(bool)
+        for i in range(n):
+            if not edits[i]:
+                has_full[_find(parent, i)] = True
+        for i in range(n):
+            if not edits[i] or bkeys[i] is None or has_full[_find(parent, i)]:
+                continue
+            for j in candidates(i):
+                if not edits[j] and union(i, j, relax_edits=True):
+                    has_full[_find(parent, i)] = True
+                    break
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for i in range(n):
+        groups[_find(parent, i)].append(i)
+
+    keep: List[int] = []
+    dupes: Dict[str, List[str]] = {}
+    for members in groups.values():
+        # 排序稳定：同分时保留原顺序靠前者
+        best = min(members, key=lambda i: rank(tracks[i]) + (i,))
+        keep.append(best)
+        if len(members) > 1:
+            dupes[tracks[best].id] = [tracks[i].id for i in members if i != best]
+    keep.sort()
+    return [tracks[i] for i in keep], dupes
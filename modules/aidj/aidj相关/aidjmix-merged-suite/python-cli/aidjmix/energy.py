@@ -0,0 +1,89 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .types import TrackFeature
+
+# 能量曲线紧凑存储：把每首歌长度不一的 energyCurve（Python float 列表）
+# 统一重采样到固定分辨率，并量化进一块由曲库持有的连续数组。
+# 评分（score.energy_score）直接从该数组读取头/尾段均值。
+
+ENERGY_DTYPES = {
+    "uint8": np.uint8,      # 0..1 → 0..255，误差 ≤ 1/510
+    "float16": np.float16,  # 半精度，误差约 1e-3
+}
+
+def resample_curve(curve: List[float], resolution: int) -> np.ndarray:
+    """把任意长度的分段曲线按面积平均重采样为 resolution 个点（0..1 截断）。
+
+    原曲线视作分段常数，对其累积积分做线性插值再差分，
+    因而头/尾某一比例的均值与原曲线在同一时间跨度上的均值一致。
+    """
+    src = np.asarray(curve, dtype=np.float64)
+    if len(src) == resolution:
+        return np.clip(src, 0.0, 1.0)
+    edges = np.linspace(0.0, 1.0, len(src) + 1)
+    cum = np.concatenate(([0.0], np.cumsum(src) / len(src)))
+    at = np.interp(np.linspace(0.0, 1.0, resolution + 1), edges, cum)
+    return np.clip(np.diff(at) * resolution, 0.0, 1.0)
+
+class EnergyBank:
+    """曲库级能量矩阵：N×resolution，uint8 或 float16，一行对应一首有曲线的歌。"""
+
+    def __init__(self, tracks: List[TrackFeature], resolution: int = 16,
+                 dtype: str = "uint8", release: bool = True):
+        if dtype not in ENERGY_DTYPES:
+            raise ValueError(f"unsupported energy dtype: {dtype}")
+        self.resolution = max(1, int(resolution))
+        self.dtype = dtype
+        self._scale = 255.0 if dtype == "uint8" else 1.0
+        self._rows: Dict[str, int] = {}
+        with_curve = [t for t in tracks if t.energyCurve]
+        self.data = np.zeros((len(with_curve), self.resolution), dtype=ENERGY_DTYPES[dtype])
+        for i, t in enumerate(with_curve):
+            row = resample_curve(t.energyCurve, self.resolution)
+            if dtype == "uint8":
+                row = np.rint(row * 255.0)
+            self.data[i] = row
+            self._rows[t.id] = i
+            # 释放原始列表，能量数据只保留在连续数组中
+            if release:
+                t.energyCurve = None
+        # 头/尾段均值按 frac 一次性向量化算好存成 Python float：评分热路径只做字典查找
+        self._means: Dict[float, Tuple[Dict[str, float], Dict[str, float]]] = {}
+        self._span_means(0.25)
+
+    def __contains__(self, track_id: str) -> bool:
+        return track_id in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.data.nbytes)
+
+    def _span(self, frac: float) -> int:
+        return max(1, int(self.resolution * frac))
+
+    def _span_means(self, frac: float) -> Tuple[Dict[str, float], Dict[str, float]]:
+        m = self._means.get(frac)
+        if m is None:
+            n = self._span(frac)
+            ids = list(self._rows)
+            heads = (self.data[:, :n].mean(axis=1).astype(np.float64) / self._scale).tolist()
+            tails = (self.data[:, -n:].mean(axis=1).astype(np.float64) / self._scale).tolist()
+            m = self._means[frac] = (dict(zip(ids, heads)), dict(zip(ids, tails)))
+        return m
+
+    def head(self, track_id: str, frac: float) -> float:
+        """前 frac 段的平均能量；无曲线时返回 -1（与列表版语义一致）。"""
+        return self._span_means(frac)[0].get(track_id, -1)
+
+    def tail(self, track_id: str, frac: float) -> float:
+        """后 frac 段的平均能量；无曲线时返回 -1。"""
+        return self._span_means(frac)[1].get(track_id, -1)
+
+    def curve(self, track_id: str) -> Optional[List[float]]:
+        """反量化出一条曲线（导出/调试用）。"""
+        i = self._rows.get(track_id)
+        if i is None: return None
+        return [float(v) / self._scale for v in self.data[i]]
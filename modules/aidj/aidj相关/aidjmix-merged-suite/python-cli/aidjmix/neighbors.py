@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .types import TrackFeature
+from .config import WEIGHTS, LIMITS
+from .energy import EnergyBank
+from .score import parse_camelot, key_score_camelot, energy_head, energy_tail, vocal_penalty
+
+# 稀疏 top-K 近邻图：大曲库下 N×N 评分矩阵放不下（10 万首 float32 约 40 GB），
+# 而搜索只看每首歌最强的若干个后继。按行分块、向量化计算 compat_score，
+# 每行只保留分数最高的 K 个后继，存成可内存映射的 CSR 文件：
+#   indptr[N+1] int64 / indices[nnz] int32 / scores[nnz] float32
+
+GRAPH_MAGIC = b"AIDJNBR1"
+_ALIGN = 64
+_BLOCK_ELEMS = 1 << 16   # 每块 行数×N 的元素上限（临时数组约 512 KB，留在缓存内）
+_SCORE_LIMITS = ("max_stretch_pct", "bpm_ideal", "bpm_tol", "bpm_soft_range")   # 影响 compat_score 的限制项
+
+class _Features:
+    """逐曲目预先算好 compat_score 中只依赖单首的量，供按块广播计算。"""
+
+    def __init__(self, tracks: List[TrackFeature], bank: Optional[EnergyBank] = None):
+        # 调性只有少数取值：编号后用 key_score_camelot 填一张 U×U 查找表
+        reps: Dict[str, int] = {}
+        names = [f"{k[0]}{k[1]}" if k else "" for k in (parse_camelot(t.keyCamelot) for t in tracks)]
+        self.key_code = np.array([reps.setdefault(x, len(reps)) for x in names], dtype=np.intp)
+        names = list(reps)
+        self.key_table = np.array([[key_score_camelot(x, y) for y in names] for x in names], dtype=np.float64)
+        # 速度：tempo_score 中 b_bpm 为 0 时按 1.0 计比值、a_bpm 同理
+        bpm = np.array([float(t.bpm or 0) for t in tracks])
+        self.bpm_num = np.where(bpm == 0, 1.0, bpm)
+        self.bpm_den = np.maximum(self.bpm_num, 1e-6)
+        lo, hi = LIMITS["bpm_soft_range"]
+        self.bpm_out = np.flatnonzero((bpm < lo) | (bpm > hi))
+        self.bpm_ideal = np.flatnonzero(~((bpm < lo) | (bpm > hi)) & (np.abs(bpm - LIMITS["bpm_ideal"]) <= LIMITS["bpm_tol"]))
+        self.head = np.array([energy_head(t, bank) for t in tracks], dtype=np.float64)
+        self.tail = np.array([energy_tail(t, bank) for t in tracks], dtype=np.float64)
+        self.beats = np.array([bool(t.downbeats and len(t.downbeats) > 1) for t in tracks])
+        self.phrase = np.where(self.beats, 0.7, 0.5)
+        self.vocal = WEIGHTS["vocal"] * np.array([1.0 + vocal_penalty(t) for t in tracks])
+
+def score_block(f: _Features, rows: np.ndarray) -> np.ndarray:
+    """rows 中每首作为前一首、全曲库作为后一首的 compat_score（len(rows)×N）。
+    各项计算与求和顺序同 compat_score，结果逐位一致；尽量原地运算以少分配临时数组。"""
+    score = f.key_table[f.key_code[rows]][:, f.key_code]
+    score *= WEIGHTS["key"]
+    # 速度
+    maxp = LIMITS["max_stretch_pct"] / 100.0
+    ratio = f.bpm_num[None, :] / f.bpm_den[rows][:, None]
+    ratio[ratio < 0.5] *= 2
+    ratio[ratio > 2] /= 2
+    diff = np.abs(1 - ratio, out=ratio)
+    near = diff <= maxp
+    part = np.maximum(0.05, 1 - diff / (maxp * 4))
+    part[near] = 1 - diff[near] / maxp
+    part[:, f.bpm_out] *= 0.6
+    part[:, f.bpm_ideal] = np.minimum(1.0, part[:, f.bpm_ideal] + 0.1)
+    part *= WEIGHTS["tempo"]
+    score += part
+    # 能量
+    tail = f.tail[rows][:, None]; head = f.head[None, :]
+    np.subtract(tail, head, out=part)
+    np.abs(part, out=part)
+    part *= 1.2
+    np.minimum(1.0, part, out=part)
+    np.subtract(1, part, out=part)
+    np.maximum(0.0, part, out=part)
+    part[(tail < 0) | (head < 0)] = 0.6
+    part *= WEIGHTS["energy"]
+    score += part
+    # 乐句 / 人声
+    score += WEIGHTS["phrase"] * np.where(f.beats[rows][:, None], f.phrase[None, :], 0.5)
+    score += f.vocal[None, :]
+    return np.clip(score, 0.0, 1.0, out=score)
+
+def _top_k(scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """每行取分数最高的 k 个（排除自身），按分数降序、同分按下标升序。"""
+    scores[np.arange(len(rows)), rows] = -np.inf
+    n = scores.shape[1]
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.zeros((len(rows), 0), np.int32), np.zeros((len(rows), 0), np.float32)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    vals = np.take_along_axis(scores, part, axis=1)
+    order = np.lexsort((part, -vals), axis=1)
+    idx = np.take_along_axis(part, order, axis=1)
+    return idx.astype(np.int32), np.take_along_axis(vals, order, axis=1).astype(np.float32)
+
+def graph_signature(tracks: List[TrackFeature], bank: Optional[EnergyBank] = None) -> str:
+    """曲库（逐曲目的评分特征）+ 权重/限制 + 能量存储方式的指纹；任一变化时已有的图即失效。"""
+    h = hashlib.sha256()
+    limits = {k: LIMITS[k] for k in _SCORE_LIMITS}
+    h.update(json.dumps([WEIGHTS, limits], sort_keys=True, default=list).encode("utf-8"))
+    h.update(f"{bank.dtype}:{bank.resolution}".encode("utf-8") if bank is not None else b"list")
+    for t in tracks:
+        # compat_score 实际用到的量：同 id 下 BPM/调性/能量/乐句/人声任一变化都要重建
+        feat = (t.id, t.keyCamelot, t.bpm, t.vocality, bool(t.downbeats and len(t.downbeats) > 1),
+                energy_head(t, bank), energy_tail(t, bank))
+        h.update(repr(feat).encode("utf-8") + b"\0")
+    return h.hexdigest()[:32]
+
+class NeighborGraph:
+    """CSR 近邻图：第 i 行 = 曲目 ids[i] 的最佳后继（indices 指向行号，scores 降序）。"""
+
+    def __init__(self, ids: List[str], indptr: np.ndarray, indices: np.ndarray, scores: np.ndarray,
+                 k: int, preset: str = "", signature: str = ""):
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+        self.k = k
+        self.preset = preset
+        self.signature = signature
+        self._rows: Optional[Dict[str, int]] = None
+        self.fallbacks = 0   # 搜索中邻居耗尽、退回有界全局扫描的次数
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nnz(self) -> int:
+        return int(self.indptr[-1])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.indptr.nbytes + self.indices.nbytes + self.scores.nbytes)
+
+    def row(self, track_id: str) -> Optional[int]:
+        if self._rows is None:
+            self._rows = {tid: i for i, tid in enumerate(self.ids)}
+        return self._rows.get(track_id)
+
+    def neighbors(self, track_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(后继行号, 分数)，按分数降序；不在图中的曲目返回空数组。"""
+        i = self.row(track_id)
+        if i is None:
+            return self.indices[:0], self.scores[:0]
+        a, b = int(self.indptr[i]), int(self.indptr[i + 1])
+        return self.indices[a:b], self.scores[a:b]
+
+    def save(self, path) -> None:
+        """单文件：魔数 + 头长度 + JSON 头 + 三个数组（各自 64 字节对齐，偏移相对数据区起点），原子替换。"""
+        path = Path(path)
+        arrays = [("indptr", np.ascontiguousarray(self.indptr, np.int64)),
+                  ("indices", np.ascontiguousarray(self.indices, np.int32)),
+                  ("scores", np.ascontiguousarray(self.scores, np.float32))]
+        header = {"n": len(self.ids), "k": self.k, "preset": self.preset, "signature": self.signature,
+                  "ids": self.ids}
+        off = 0
+        for name, arr in arrays:
+            header[name] = {"offset": off, "len": int(arr.size)}
+            off = _aligned(off + arr.nbytes)
+        blob = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        base = _aligned(len(GRAPH_MAGIC) + 8 + len(blob))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(GRAPH_MAGIC + len(blob).to_bytes(8, "little") + blob)
+            for name, arr in arrays:
+                f.write(b"\0" * (base + header[name]["offset"] - f.tell()))
+                arr.tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, mmap: bool = True) -> "NeighborGraph":
+        """读取图文件；mmap=True 时三个数组以只读内存映射打开，按需分页，不整体载入内存。"""
+        path = Path(path)
+        with open(path, "rb") as f:
+            if f.read(len(GRAPH_MAGIC)) != GRAPH_MAGIC:
+                raise ValueError(f"not a neighbor graph file: {path}")
+            size = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(size).decode("utf-8"))
+            base = _aligned(len(GRAPH_MAGIC) + 8 + size)
+            def arr(name, dtype):
+                off, n = base + header[name]["offset"], header[name]["len"]
+                if n == 0: return np.zeros(0, dtype)
+                if mmap: return np.memmap(path, dtype=dtype, mode="r", offset=off, shape=(n,))
+                f.seek(off)
+                return np.fromfile(f, dtype=dtype, count=n)
+            return cls(header["ids"], arr("indptr", np.int64), arr("indices", np.int32), arr("scores", np.float32),
+                       header["k"], header.get("preset", ""), header.get("signature", ""))
+
+def _aligned(off: int) -> int:
+    return (off + _ALIGN - 1) // _ALIGN * _ALIGN
+
+def build_neighbor_graph(tracks: List[TrackFeature], k: Optional[int] = None,
+                         bank: Optional[EnergyBank] = None, preset: str = "",
+                         workers: Optional[int] = None, block_elems: int = _BLOCK_ELEMS) -> NeighborGraph:
+    """按当前权重/预设为每首歌计算 top-K 后继，返回内存中的 CSR 图。
+
+    按行分块（每块 行数×N ≤ block_elems），块内 numpy 向量化计算，多块在线程池并行（numpy 运算释放 GIL）；
+    峰值内存与 N×N 无关，只与 workers × block_elems 及结果 N×K 有关。
+    """
+    k = LIMITS["graph_k"] if k is None else k
+    n = len(tracks)
+    f = _Features(tracks, bank)
+    rows_per_block = max(1, block_elems // max(1, n))
+    blocks = [np.arange(s, min(n, s + rows_per_block)) for s in range(0, n, rows_per_block)]
+    width = min(k, max(0, n - 1))
+    indices = np.zeros((n, width), np.int32)
+    scores = np.zeros((n, width), np.float32)
+
+    def run(rows: np.ndarray) -> None:
+        idx, val = _top_k(score_block(f, rows), rows, k)
+        indices[rows], scores[rows] = idx, val
+
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as ex:
+        list(ex.map(run, blocks))
+    indptr = np.arange(n + 1, dtype=np.int64) * width
+    return NeighborGraph([t.id for t in tracks], indptr, indices.reshape(-1), scores.reshape(-1),
+                         k, preset, graph_signature(tracks, bank))
@@ -1,13 +1,16 @@
 import re
+from typing import Optional
 from .types import TrackFeature
 from .config import WEIGHTS, LIMITS
+from .energy import EnergyBank
+
+def parse_camelot(k: str):
+    m = re.match(r"^(\d+)([ABab])$", k or "")
+    if not m: return None
+    return int(m.group(1)), m.group(2).upper()
 
 def key_score_camelot(a: str, b: str) -> float:
-    def parse(k: str):
-        m = re.match(r"^(\d+)([ABab])$", k or "")
-        if not m: return None
-        return int(m.group(1)), m.group(2).upper()
-    A = parse(a); B = parse(b)
+    A = parse_camelot(a); B = parse_camelot(b)
     if not A or not B: return 0.5
     (an, am), (bn, bm) = A, B
     if an == bn and am == bm: return 1.0
@@ -33,17 +36,25 @@ def tempo_score(a_bpm: float, b_bpm: float) -> float:
     elif abs((b_bpm or 0) - ideal) <= tol: base = min(1.0, base + 0.1)
     return base
 
-def energy_score(a: TrackFeature, b: TrackFeature) -> float:
-    def avg_head(arr, frac):
-        if not arr: return -1
-        n = max(1, int(len(arr)*frac))
-        return sum(arr[:n])/n
-    def avg_tail(arr, frac):
-        if not arr: return -1
-        n = max(1, int(len(arr)*frac))
-        return sum(arr[-n:])/n
-    tail = avg_tail(a.energyCurve or [], 0.25)
-    head = avg_head(b.energyCurve or [], 0.25)
+def energy_head(t: TrackFeature, bank: Optional[EnergyBank] = None, frac: float = 0.25) -> float:
+    """前 frac 段平均能量；无曲线返回 -1。"""
+    if bank is not None: return bank.head(t.id, frac)
+    arr = t.energyCurve or []
+    if not arr: return -1
+    n = max(1, int(len(arr)*frac))
+    return sum(arr[:n])/n
+
+def energy_tail(t: TrackFeature, bank: Optional[EnergyBank] = None, frac: float = 0.25) -> float:
+    """后 frac 段平均能量；无曲线返回 -1。"""
+    if bank is not None: return bank.tail(t.id, frac)
+    arr = t.energyCurve or []
+    if not arr: return -1
+    n = max(1, int(len(arr)*frac))
+    return sum(arr[-n:])/n
+
+def energy_score(a: TrackFeature, b: TrackFeature, bank: Optional[EnergyBank] = None) -> float:
+    tail = energy_tail(a, bank)
+    head = energy_head(b, bank)
     if tail < 0 or head < 0: return 0.6
     diff = abs(tail - head)
     return max(0.0, 1 - min(1.0, diff*1.2))
@@ -58,10 +69,10 @@ def vocal_penalty(b: TrackFeature) -> float:
     if v is None: return 0.0
     return - min(0.2, v * 0.2)
 
-def compat_score(a: TrackFeature, b: TrackFeature) -> float:
+def compat_score(a: TrackFeature, b: TrackFeature, bank: Optional[EnergyBank] = None) -> float:
     s_key = key_score_camelot(a.keyCamelot, b.keyCamelot)
     s_tmp = tempo_score(a.bpm, b.bpm)
-    s_eng = energy_score(a, b)
+    s_eng = energy_score(a, b, bank)
     s_phr = phrase_align_score(a, b)
     pen_v = vocal_penalty(b)
     score = (WEIGHTS["key"]*s_key +
@@ -1,25 +1,33 @@
-from typing import List, Set, Tuple
+import heapq
+from typing import Dict, List, Optional, Set, Tuple
 from .types import TrackFeature
 from .config import LIMITS
 from .score import compat_score
+from .energy import EnergyBank
+from .neighbors import NeighborGraph
 
-def greedy_sequence(tracks: List[TrackFeature], target_minutes: float) -> List[TrackFeature]:
+def greedy_sequence(tracks: List[TrackFeature], target_minutes: float,
+                    bank: Optional[EnergyBank] = None,
+                    graph: Optional[NeighborGraph] = None) -> List[TrackFeature]:
     if not tracks: return []
+    by_id = {t.id: t for t in tracks}
     used: Set[str] = set()
     start = pick_start(tracks)
     used.add(start.id)
     seq = [start]
     while minutes(seq) < target_minutes:
         cur = seq[-1]
-        cands: List[Tuple[TrackFeature, float]] = [(t, compat_score(cur, t)) for t in tracks if t.id not in used]
+        cands = successors(cur, tracks, used, bank, graph, by_id)
         if not cands: break
-        cands.sort(key=lambda x:x[1], reverse=True)
         t,_ = cands[0]
         seq.append(t); used.add(t.id)
     return seq
 
-def beam_search(tracks: List[TrackFeature], target_minutes: float, beam_width: int) -> List[TrackFeature]:
+def beam_search(tracks: List[TrackFeature], target_minutes: float, beam_width: int,
+                bank: Optional[EnergyBank] = None,
+                graph: Optional[NeighborGraph] = None) -> List[TrackFeature]:
     if not tracks: return []
+    by_id = {t.id: t for t in tracks}
     seeds = seed_candidates(tracks, min(beam_width, max(1, len(tracks)//4)))
     paths: List[Tuple[List[TrackFeature], float]] = [([s], 0.0) for s in seeds]
     best = paths[0]
@@ -31,8 +39,7 @@ def beam_search(tracks: List[TrackFeature], target_minutes: float, beam_width: i
                 continue
             used = {t.id for t in seq}
             cur = seq[-1]
-            cands = [(t, compat_score(cur, t)) for t in tracks if t.id not in used]
-            cands.sort(key=lambda x:x[1], reverse=True)
+            cands = successors(cur, tracks, used, bank, graph, by_id)
             for t, s in cands[:beam_width]:
                 nxt.append((seq+[t], sumScore + s))
         nxt.sort(key=lambda p: avg_score(p), reverse=True)
@@ -42,6 +49,28 @@ def beam_search(tracks: List[TrackFeature], target_minutes: float, beam_width: i
         if not paths: break
     return best[0]
 
+def successors(cur: TrackFeature, tracks: List[TrackFeature], used: Set[str],
+               bank: Optional[EnergyBank] = None, graph: Optional[NeighborGraph] = None,
+               by_id: Optional[Dict[str, TrackFeature]] = None) -> List[Tuple[TrackFeature, float]]:
+    """cur 的候选后继（分数降序）。无图时对全部未用曲目评分；
+    有图时取其预计算近邻中未用的，近邻耗尽则退回 BPM 最接近的 graph_fallback 首现场评分。"""
+    if graph is None:
+        cands = [(t, compat_score(cur, t, bank)) for t in tracks if t.id not in used]
+    else:
+        by_id = by_id if by_id is not None else {t.id: t for t in tracks}
+        idx, scores = graph.neighbors(cur.id)
+        cands = []
+        for j, s in zip(idx.tolist(), scores.tolist()):
+            t = by_id.get(graph.ids[j])
+            if t is not None and t.id not in used: cands.append((t, s))
+        if cands: return cands
+        graph.fallbacks += 1
+        pool = heapq.nsmallest(LIMITS["graph_fallback"], (t for t in tracks if t.id not in used),
+                               key=lambda t: abs((t.bpm or 0)-(cur.bpm or 0)))
+        cands = [(t, compat_score(cur, t, bank)) for t in pool]
+    cands.sort(key=lambda x:x[1], reverse=True)
+    return cands
+
 def minutes(seq: List[TrackFeature]) -> float:
     return sum(t.durationSec for t in seq)/60.0
 
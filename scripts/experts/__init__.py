@@ -5,7 +5,7 @@
 专家团队编排器模块包
 
 模块结构：
-- config.py: 配置管理
+- config.py: 配置管理（惰性 Settings）
 - http_client.py: HTTP通信
 - document_processor.py: 文档处理
 - expert_collaboration.py: 专家协作
@@ -16,8 +16,9 @@ from .config import (
     load_environment_config,
     get_provider_configs,
     mask_secret,
-    LOG_DIR,
-    REPORT_FILE
+    Settings,
+    get_settings,
+    configure
 )
 
 from .http_client import (
@@ -53,7 +54,16 @@ __all__ = [
     'ExpertCollaboration',
     'load_environment_config',
     'get_provider_configs',
+    'Settings',
+    'get_settings',
+    'configure',
     'call_ai_provider',
     'collect_doc_text',
     'validate_document_content'
 ]
+
+
+def __getattr__(name: str):
+    # LOG_DIR / REPORT_FILE 等旧常量按需从当前设置读取（导入包时不解析路径）
+    from . import config
+    return getattr(config, name)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器请求录制/回放模块
+
+功能：
+1. 录制（MEETING_CASSETTE_MODE=record）：每次提供商调用以请求指纹（与响应缓存同一算法）为键，
+   记录状态、原始响应与内容；流式调用另记录每个内容增量相对请求开始的时间（SSE 帧节奏）
+2. 磁带文件为 gzip 压缩的 JSON 行，会议结束（或进程退出）时原子写入
+3. 回放（MEETING_CASSETTE_MODE=replay）：不发起任何网络请求，按指纹取出录制的响应；
+   同一指纹被调用多次时按录制顺序依次返回。MEETING_CASSETTE_PACE=instant 立即返回，
+   recorded 按录制的首 token 与帧间隔重放，用于离线复现整场会议、剖析非网络部分的耗时
+"""
+
+import atexit
+import gzip
+import json
+import os
+import pathlib
+import threading
+import time
+from typing import Callable, Dict, List, Any, Optional
+from config import Settings, get_settings
+
+
+RECORD, REPLAY, OFF = 'record', 'replay', 'off'
+PACE_INSTANT, PACE_RECORDED = 'instant', 'recorded'
+
+
+class Cassette:
+    """一盘磁带：{指纹: [录制条目...]}。record() / take() 线程安全。"""
+
+    def __init__(self, path: pathlib.Path, mode: str, pace: str = PACE_INSTANT):
+        self.path = pathlib.Path(path)
+        self.mode = mode
+        self.pace = pace
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.stats = {'recorded': 0, 'replayed': 0, 'misses': 0}
+        if mode == REPLAY:
+            self._load()
+        elif mode == RECORD:
+            atexit.register(self.save)
+
+    def _load(self) -> None:
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries.setdefault(entry['key'], []).append(entry)
+        except (OSError, EOFError, ValueError) as e:
+            print(f"[experts] 磁带读取失败: {self.path}: {e}")
+
+    def record(self, key: str, streaming: bool, result: Dict[str, Any],
+               frames: Optional[List[list]], duration_sec: float) -> None:
+        """录制一次调用。frames 为 [[相对请求开始的秒数, 增量文本], ...]（非流式为 None）。"""
+        net = result.get('net') or {}
+        entry = {
+            'key': key,
+            'streaming': streaming,
+            'ok': bool(result.get('ok')),
+            'status': result.get('status') or 0,
+            'raw': result.get('raw'),
+            'content': result.get('content') or '',
+            'ttft_sec': net.get('ttft_sec'),
+            'duration_sec': round(duration_sec, 4),
+            'frames': [[round(t, 4), text] for t, text in frames] if frames else None,
+        }
+        with self._lock:
+            self.entries.setdefault(key, []).append(entry)
+            self._dirty = True
+            self.stats['recorded'] += 1
+
+    def take(self, key: str) -> Optional[Dict[str, Any]]:
+        """按录制顺序取出该指纹的下一条（用尽后重复最后一条）；未录制返回 None。"""
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                self.stats['misses'] += 1
+                return None
+            i = self._cursor.get(key, 0)
+            self._cursor[key] = i + 1
+            self.stats['replayed'] += 1
+            return entries[min(i, len(entries) - 1)]
+
+    def save(self) -> None:
+        """原子写入磁带（仅录制模式且有新条目时）。"""
+        with self._lock:
+            if self.mode != RECORD or not self._dirty:
+                return
+            lines = [json.dumps(e, ensure_ascii=False, separators=(',', ':'))
+                     for entries in self.entries.values() for e in entries]
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp, self.path)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            s: Dict[str, Any] = dict(self.stats)
+            s['keys'] = len(self.entries)
+        s['mode'] = self.mode
+        s['pace'] = self.pace
+        return s
+
+
+def replay_entry(entry: Dict[str, Any], pace: str, on_piece: Callable[[str], None],
+                 on_first_token: Optional[Callable[[], None]] = None, cancel=None) -> Dict[str, Any]:
+    """按录制内容重放一次调用，返回与 http_client 相同结构的结果。
+
+    流式条目逐帧调用 on_piece（终端回显）；pace=recorded 时按录制的帧时间等待，
+    期间可被 cancel（CancelToken）取消。非流式条目在 recorded 模式下等待录制的总耗时。
+    """
+    t0 = time.perf_counter()
+    net: Dict[str, Any] = {'replayed': True}
+    frames = entry.get('frames') or []
+    if not frames and entry.get('content'):
+        frames = [[entry.get('ttft_sec') or 0.0, entry['content']]]
+    for i, (at, text) in enumerate(frames):
+        if pace == PACE_RECORDED:
+            delay = at - (time.perf_counter() - t0)
+            if delay > 0:
+                time.sleep(delay)
+        if cancel is not None and cancel.is_set():
+            return {'ok': False, 'status': entry.get('status') or 0, 'raw': 'CANCELLED', 'content': '', 'net': net}
+        if i == 0:
+            net['ttft_sec'] = round(time.perf_counter() - t0, 4)
+            if on_first_token is not None:
+                on_first_token()
+        on_piece(text)
+    if pace == PACE_RECORDED:
+        rest = (entry.get('duration_sec') or 0.0) - (time.perf_counter() - t0)
+        if rest > 0:
+            time.sleep(rest)
+    return {
+        'ok': entry.get('ok', False),
+        'status': entry.get('status') or 0,
+        'raw': entry.get('raw'),
+        'content': entry.get('content') or '',
+        'net': net,
+    }
+
+
+_CASSETTE: Optional[Cassette] = None
+_CASSETTE_SETTINGS: Optional[Settings] = None
+_CASSETTE_LOCK = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """全局磁带（生效设置变化时重建）；MEETING_CASSETTE_MODE=off（默认）时返回 None。"""
+    global _CASSETTE, _CASSETTE_SETTINGS
+    settings = get_settings()
+    if settings.cassette_mode not in (RECORD, REPLAY):
+        return None
+    with _CASSETTE_LOCK:
+        if _CASSETTE is None or _CASSETTE_SETTINGS is not settings:
+            if _CASSETTE is not None:
+                _CASSETTE.save()
+            _CASSETTE = Cassette(settings.cassette_file, settings.cassette_mode, settings.cassette_pace)
+            _CASSETTE_SETTINGS = settings
+        return _CASSETTE
+
+
+def cassette_stats() -> Dict[str, Any]:
+    return _CASSETTE.snapshot() if _CASSETTE is not None else {}
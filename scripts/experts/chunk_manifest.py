@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器切片清单模块
+
+功能：
+1. 记录上一次会议每个切片的内容哈希，以及各提供商对该切片的分析结果
+2. 本次运行时按切片哈希比对：未变化的切片直接复用结果，只把新增/修改的切片发给专家
+3. 清单原子写入，只保留当前文档仍存在的切片，避免无限增长
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+from typing import Dict, List, Optional, Any
+from config import get_settings
+
+
+def chunk_hash(text: str) -> str:
+    """切片内容哈希（SHA-256 前 16 字节十六进制）。"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+def prompt_hash(system_prompt: str) -> str:
+    """系统提示词指纹：提示词模板变化时已有结果自动失效。"""
+    return hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()[:16]
+
+
+class ChunkManifest:
+    """切片清单：{'chunks': [hash...], 'results': {provider: {hash: {prompt, model, content, at}}}}。"""
+
+    def __init__(self, path: Optional[pathlib.Path] = None):
+        self.path = pathlib.Path(path or get_settings().manifest_file)
+        self._lock = threading.Lock()
+        self.previous_chunks: List[str] = []
+        self.results: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.current_chunks: List[str] = []
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+            self.previous_chunks = list(data.get('chunks') or [])
+            self.results = dict(data.get('results') or {})
+        except (OSError, ValueError):
+            pass
+
+    def diff(self, chunks: List[str]) -> Dict[str, Any]:
+        """登记本次切片并与上次比对，返回 {'hashes', 'changed'(1 起的序号), 'unchanged'}。"""
+        self.current_chunks = [chunk_hash(c) for c in chunks]
+        known = set(self.previous_chunks)
+        changed = [i for i, h in enumerate(self.current_chunks, 1) if h not in known]
+        return {
+            'hashes': self.current_chunks,
+            'changed': changed,
+            'unchanged': len(chunks) - len(changed),
+        }
+
+    def lookup(self, provider: Dict[str, str], chunk_text: str, system_prompt: str) -> Optional[str]:
+        """上次同一提供商/模型/提示词对相同切片的成功结果；没有则返回 None。"""
+        with self._lock:
+            entry = self.results.get(provider['name'], {}).get(chunk_hash(chunk_text))
+        if (entry and entry.get('model') == provider.get('model')
+                and entry.get('prompt') == prompt_hash(system_prompt)):
+            return entry.get('content')
+        return None
+
+    def record(self, provider: Dict[str, str], chunk_text: str, system_prompt: str, content: str) -> None:
+        """记录一条成功的切片分析结果。"""
+        with self._lock:
+            self.results.setdefault(provider['name'], {})[chunk_hash(chunk_text)] = {
+                'model': provider.get('model'),
+                'prompt': prompt_hash(system_prompt),
+                'content': content,
+                'at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+
+    def save(self) -> None:
+        """原子写入清单；只保留当前文档中仍存在的切片结果。"""
+        live = set(self.current_chunks)
+        with self._lock:
+            results = {
+                name: {h: e for h, e in entries.items() if h in live}
+                for name, entries in self.results.items()
+            }
+            data = json.dumps({'chunks': self.current_chunks, 'results': results},
+                              ensure_ascii=False, indent=2)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_text(data, encoding='utf-8')
+        os.replace(tmp, self.path)
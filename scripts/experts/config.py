@@ -5,7 +5,7 @@
 专家团队编排器配置管理模块
 
 功能：
-1. 管理所有配置常量和环境变量
+1. 管理所有配置常量和环境变量（Settings 惰性求值，导入无副作用）
 2. 提供安全的密钥读取和掩码功能
 3. 统一管理API端点和模型配置
 """
@@ -13,20 +13,11 @@
 import os
 import pathlib
 import datetime as dt
-from typing import Dict, Any
+import functools
+import threading
+from typing import Dict, Any, List, Mapping, Optional
 
 
-# ============================= 路径与常量 =============================
-REPO_ROOT = pathlib.Path('/Users/masher/code')
-PROJECT_ROOT = REPO_ROOT / '程序集_Programs' / '个人网站项目V2'
-# 统一时间戳，确保 logs 与 outputs 对齐
-TIMESTAMP = dt.datetime.now().strftime('%Y%m%d_%H%M%S')
-LOG_DIR = REPO_ROOT / 'logs' / 'personal_website' / 'experts_meetings' / TIMESTAMP
-LOG_DIR.mkdir(parents=True, exist_ok=True)
-REPORT_FILE = REPO_ROOT / 'GPT_EXPERTS_ANALYSIS_AND_BUGBOT_REPORT.md'
-OUTPUT_DIR = REPO_ROOT / 'outputs' / 'personal_website' / 'experts_meetings' / TIMESTAMP
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
 # ============================= 明文内置密钥（仅用户本机使用） =============================
 # 说明：按用户要求将密钥写入代码作为兜底；若 .env.local 或进程环境存在值，则优先使用环境值。
 # 注意：日志与纪要始终写"掩码"，不输出完整密钥。
@@ -35,17 +26,321 @@ DEFAULT_DASHSCOPE_API_KEY = 'sk-bf7fb00b049845d484cb4f6aa39b20db'
 DEFAULT_DEEPSEEK_BASE_URL = 'https://api.deepseek.com/v1'
 DEFAULT_DASHSCOPE_BASE_URL = 'https://dashscope.aliyuncs.com/compatible-mode/v1'
 
-# ============================= 网络与超时配置 =============================
-# 说明：默认禁用系统代理，防止被错误代理劫持导致请求长时间阻塞。
-# 超时可通过环境变量 MEETING_HTTP_TIMEOUT_SEC 调整（默认 15 秒）。
-REQUEST_TIMEOUT_SEC: int = int(os.environ.get('MEETING_HTTP_TIMEOUT_SEC', '120') or '120')
-MAX_TOKENS: int = int(os.environ.get('MEETING_MAX_TOKENS', '256') or '256')
-MAX_ATTEMPTS: int = int(os.environ.get('MEETING_HTTP_ATTEMPTS', '3') or '3')
-DISABLE_PROXY: bool = (os.environ.get('MEETING_DISABLE_PROXY', 'true').lower() == 'true')
-STREAM_ENABLED: bool = (os.environ.get('MEETING_STREAM', 'true').lower() == 'true')
-ECHO_STREAM: bool = (os.environ.get('MEETING_ECHO_STREAM', 'true').lower() == 'true')
-ECHO_STREAM_MODE: str = os.environ.get('MEETING_ECHO_STREAM_MODE', 'line')  # line|raw|off
-ECHO_STREAM_PREFIX: bool = (os.environ.get('MEETING_ECHO_STREAM_PREFIX', 'true').lower() == 'true')
+# ============================= 运行设置（惰性求值） =============================
+# 说明：导入本模块不读环境变量、不创建目录、不计算时间戳；所有路径与环境相关的取值
+# 在首次访问 get_settings() 的对应属性时才解析并缓存。测试/压测可用 Settings(env={...}, ...)
+# 构造互不干扰的独立设置，再经 configure() 设为当前进程的生效设置。
+# 目录只在真正写文件时由写入方创建（parents=True）。
+
+# 各提供商默认限流额度（可由 MEETING_RPM / MEETING_TPM 统一覆盖）
+DEFAULT_RATE_LIMITS: Dict[str, Dict[str, int]] = {
+    'deepseek': {'rpm': 60, 'tpm': 120000},
+    'dashscope': {'rpm': 60, 'tpm': 100000},
+    'openai': {'rpm': 60, 'tpm': 60000},
+    'default': {'rpm': 30, 'tpm': 40000},
+}
+
+
+class Settings:
+    """专家编排器运行设置。每个属性首次访问时解析（cached_property），构造本身无副作用。
+
+    - env: 读取的环境变量映射（默认 os.environ，在首次访问时读取）
+    - overrides: 直接指定属性值（如 repo_root=..., timestamp=..., cache_enabled=False）
+    """
+
+    def __init__(self, env: Optional[Mapping[str, str]] = None, **overrides: Any):
+        self._env = env
+        for name, value in overrides.items():
+            if not isinstance(getattr(type(self), name, None), functools.cached_property):
+                raise AttributeError(f'未知的设置项: {name}')
+            self.__dict__[name] = value
+
+    # ---- 环境读取辅助 ----
+    @property
+    def env(self) -> Mapping[str, str]:
+        return os.environ if self._env is None else self._env
+
+    def _str(self, key: str, default: str) -> str:
+        return self.env.get(key, default) or default
+
+    def _int(self, key: str, default: int) -> int:
+        return int(self.env.get(key, str(default)) or str(default))
+
+    def _float(self, key: str, default: float) -> float:
+        return float(self.env.get(key, str(default)) or str(default))
+
+    def _bool(self, key: str, default: bool) -> bool:
+        return str(self.env.get(key, 'true' if default else 'false')).lower() == 'true'
+
+    # ---- 路径与时间戳 ----
+    @functools.cached_property
+    def repo_root(self) -> pathlib.Path:
+        return pathlib.Path(self._str('MEETING_REPO_ROOT', '/Users/masher/code'))
+
+    @functools.cached_property
+    def project_root(self) -> pathlib.Path:
+        return self.repo_root / '程序集_Programs' / '个人网站项目V2'
+
+    @functools.cached_property
+    def timestamp(self) -> str:
+        # 统一时间戳，确保 logs 与 outputs 对齐
+        return dt.datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    @functools.cached_property
+    def log_dir(self) -> pathlib.Path:
+        return self.repo_root / 'logs' / 'personal_website' / 'experts_meetings' / self.timestamp
+
+    @functools.cached_property
+    def output_dir(self) -> pathlib.Path:
+        return self.repo_root / 'outputs' / 'personal_website' / 'experts_meetings' / self.timestamp
+
+    @functools.cached_property
+    def report_file(self) -> pathlib.Path:
+        return self.repo_root / 'GPT_EXPERTS_ANALYSIS_AND_BUGBOT_REPORT.md'
+
+    # ---- 多文档语料 ----
+    # MEETING_CORPUS 为逗号分隔的 glob 模式（相对 repo_root，支持 **），设置后取代单一报告文件；
+    # 默认只分析自上次会议以来新增/修改的文件（按 mtime/哈希清单判断），MEETING_CORPUS_CHANGED_ONLY=false 全量。
+    @functools.cached_property
+    def corpus_patterns(self) -> List[str]:
+        return [p.strip() for p in self._str('MEETING_CORPUS', '').split(',') if p.strip()]
+
+    @functools.cached_property
+    def corpus_changed_only(self) -> bool:
+        return self._bool('MEETING_CORPUS_CHANGED_ONLY', True)
+
+    @functools.cached_property
+    def corpus_manifest_file(self) -> pathlib.Path:
+        return self.repo_root / '.cache' / 'experts_corpus_manifest.json'
+
+    @functools.cached_property
+    def corpus_mmap_min_bytes(self) -> int:
+        # 超过该大小（KB）的文件以 mmap 读取，0 表示不使用 mmap
+        return self._int('MEETING_CORPUS_MMAP_KB', 256) * 1024
+
+    @functools.cached_property
+    def corpus_workers(self) -> int:
+        return self._int('MEETING_CORPUS_WORKERS', 8)
+
+    # ---- 网络与超时 ----
+    # 默认禁用系统代理，防止被错误代理劫持导致请求长时间阻塞；超时见 MEETING_HTTP_TIMEOUT_SEC。
+    @functools.cached_property
+    def request_timeout_sec(self) -> int:
+        return self._int('MEETING_HTTP_TIMEOUT_SEC', 120)
+
+    @functools.cached_property
+    def max_tokens(self) -> int:
+        return self._int('MEETING_MAX_TOKENS', 256)
+
+    @functools.cached_property
+    def max_attempts(self) -> int:
+        return self._int('MEETING_HTTP_ATTEMPTS', 3)
+
+    @functools.cached_property
+    def disable_proxy(self) -> bool:
+        return self._bool('MEETING_DISABLE_PROXY', True)
+
+    @functools.cached_property
+    def stream_enabled(self) -> bool:
+        return self._bool('MEETING_STREAM', True)
+
+    @functools.cached_property
+    def echo_stream(self) -> bool:
+        return self._bool('MEETING_ECHO_STREAM', True)
+
+    @functools.cached_property
+    def echo_stream_mode(self) -> str:
+        return self._str('MEETING_ECHO_STREAM_MODE', 'line')  # line|raw|off
+
+    @functools.cached_property
+    def echo_stream_prefix(self) -> bool:
+        return self._bool('MEETING_ECHO_STREAM_PREFIX', True)
+
+    # ---- 录制与回放 ----
+    # MEETING_CASSETTE_MODE=record 把每次提供商调用（含 SSE 帧节奏）录入磁带；=replay 离线按磁带回放，
+    # MEETING_CASSETTE_PACE=instant 立即返回，recorded 按录制节奏重放。
+    @functools.cached_property
+    def cassette_mode(self) -> str:
+        return self._str('MEETING_CASSETTE_MODE', 'off').lower()  # off|record|replay
+
+    @functools.cached_property
+    def cassette_pace(self) -> str:
+        return self._str('MEETING_CASSETTE_PACE', 'instant').lower()  # instant|recorded
+
+    @functools.cached_property
+    def cassette_file(self) -> pathlib.Path:
+        return pathlib.Path(self._str('MEETING_CASSETTE', str(self.repo_root / '.cache' / 'experts_cassette.jsonl.gz')))
+
+    # ---- 并发与限流 ----
+    # 每个提供商的分段请求并发发送，受令牌桶（RPM/TPM）与最大在途请求数限制；
+    # 遇到 429 会按 Retry-After 暂停并自动降速。
+    @functools.cached_property
+    def max_in_flight(self) -> int:
+        return self._int('MEETING_MAX_IN_FLIGHT', 4)
+
+    @functools.cached_property
+    def rate_limits(self) -> Dict[str, Dict[str, int]]:
+        limits = {name: dict(v) for name, v in DEFAULT_RATE_LIMITS.items()}
+        for v in limits.values():
+            if self.cassette_mode == 'replay':
+                # 回放不访问网络，默认不按 RPM/TPM 节流（显式设置 MEETING_RPM/TPM 时仍生效）
+                v['rpm'] = v['tpm'] = 10 ** 9
+            if self.env.get('MEETING_RPM'):
+                v['rpm'] = int(self.env['MEETING_RPM'])
+            if self.env.get('MEETING_TPM'):
+                v['tpm'] = int(self.env['MEETING_TPM'])
+        return limits
+
+    # ---- 提供商健康与熔断 ----
+    # 会议开始前以短超时并发探测各端点，结果缓存 MEETING_HEALTH_TTL_SEC 秒（跨次运行）；
+    # 连续 MEETING_BREAKER_FAILURES 次网络失败/超时/5xx 打开熔断，MEETING_BREAKER_OPEN_SEC 秒后半开试探。
+    @functools.cached_property
+    def probe_timeout_sec(self) -> float:
+        return self._float('MEETING_PROBE_TIMEOUT_SEC', 3.0)
+
+    @functools.cached_property
+    def health_ttl_sec(self) -> float:
+        return self._float('MEETING_HEALTH_TTL_SEC', 300.0)
+
+    @functools.cached_property
+    def breaker_failures(self) -> int:
+        return self._int('MEETING_BREAKER_FAILURES', 3)
+
+    @functools.cached_property
+    def breaker_open_sec(self) -> float:
+        return self._float('MEETING_BREAKER_OPEN_SEC', 60.0)
+
+    @functools.cached_property
+    def health_file(self) -> pathlib.Path:
+        return self.repo_root / '.cache' / 'experts_provider_health.json'
+
+    # ---- 对冲请求 ----
+    # 分段请求超过该提供商 TTFT 的 p{hedge_percentile} 仍无首 token 时，向另一提供商发出对冲请求，
+    # 先出首 token 者胜出；对冲次数不超过主请求数 × MEETING_HEDGE_BUDGET。默认关闭。
+    @functools.cached_property
+    def hedge_enabled(self) -> bool:
+        return self._bool('MEETING_HEDGE', False)
+
+    @functools.cached_property
+    def hedge_percentile(self) -> float:
+        return self._float('MEETING_HEDGE_PERCENTILE', 95.0)
+
+    @functools.cached_property
+    def hedge_budget(self) -> float:
+        return self._float('MEETING_HEDGE_BUDGET', 0.1)
+
+    @functools.cached_property
+    def hedge_initial_delay_sec(self) -> float:
+        # 样本不足时的初始阈值
+        return self._float('MEETING_HEDGE_DELAY_SEC', 10.0)
+
+    # ---- 响应缓存 ----
+    # 相同提供商/模型/消息/参数的请求直接复用磁盘缓存，避免未改动的报告重复计费。
+    # MEETING_CACHE=false 关闭缓存；MEETING_CACHE_BYPASS=true 本次不读缓存（仍写入新结果）。
+    @functools.cached_property
+    def cache_dir(self) -> pathlib.Path:
+        return self.repo_root / '.cache' / 'experts_responses'
+
+    @functools.cached_property
+    def cache_enabled(self) -> bool:
+        return self._bool('MEETING_CACHE', True)
+
+    @functools.cached_property
+    def cache_bypass(self) -> bool:
+        return self._bool('MEETING_CACHE_BYPASS', False)
+
+    @functools.cached_property
+    def cache_ttl_sec(self) -> int:
+        return self._int('MEETING_CACHE_TTL_SEC', 7 * 24 * 3600)
+
+    @functools.cached_property
+    def cache_max_bytes(self) -> int:
+        return self._int('MEETING_CACHE_MAX_MB', 200) * 1024 * 1024
+
+    # ---- 增量分析与日志 ----
+    # 按内容定义切片，与上次会议的切片清单比对，只把新增/修改的切片发给专家（MEETING_INCREMENTAL=false 全量）。
+    @functools.cached_property
+    def incremental_enabled(self) -> bool:
+        return self._bool('MEETING_INCREMENTAL', True)
+
+    @functools.cached_property
+    def manifest_file(self) -> pathlib.Path:
+        return self.repo_root / '.cache' / 'experts_chunk_manifest.json'
+
+    @functools.cached_property
+    def log_compress_min_bytes(self) -> int:
+        # 原始响应日志：超过该大小（KB）的 JSON 压缩为 .json.gz，0 表示不压缩
+        return self._int('MEETING_LOG_COMPRESS_KB', 0) * 1024
+
+    # ---- 文档切片 ----
+    # 按 token 预算打包段落，预算取各模型上下文窗口扣除输出与提示词后的最小值，
+    # 并以 MEETING_CHUNK_TOKENS 封顶；相邻切片可重叠若干 token 保持上下文。
+    @functools.cached_property
+    def chunk_token_cap(self) -> int:
+        return self._int('MEETING_CHUNK_TOKENS', 8000)
+
+    @functools.cached_property
+    def chunk_overlap_tokens(self) -> int:
+        return self._int('MEETING_CHUNK_OVERLAP_TOKENS', 0)
+
+    # 聚合收敛：分段结果按 token 预算分组并发归约，逐层收敛到一次最终聚合（层数随分段数对数增长）
+    @functools.cached_property
+    def reduce_token_cap(self) -> int:
+        return self._int('MEETING_REDUCE_TOKENS', 16000)
+
+
+_SETTINGS: Optional[Settings] = None
+_SETTINGS_LOCK = threading.Lock()
+
+
+def get_settings() -> Settings:
+    """当前进程生效的设置（首次调用时构造，读取 os.environ）。"""
+    global _SETTINGS
+    if _SETTINGS is None:
+        with _SETTINGS_LOCK:
+            if _SETTINGS is None:
+                _SETTINGS = Settings()
+    return _SETTINGS
+
+
+def configure(settings: Optional[Settings] = None, **overrides: Any) -> Settings:
+    """替换当前生效设置（测试/压测每轮构造独立设置）。依赖设置的全局组件会在下次取用时按新设置重建。"""
+    global _SETTINGS
+    with _SETTINGS_LOCK:
+        _SETTINGS = settings if settings is not None else Settings(**overrides)
+    return _SETTINGS
+
+
+# 兼容旧的模块级常量名（config.LOG_DIR 等）：按需从当前设置读取，不在导入时求值
+_LEGACY_NAMES = {
+    'REPO_ROOT': 'repo_root', 'PROJECT_ROOT': 'project_root', 'TIMESTAMP': 'timestamp',
+    'LOG_DIR': 'log_dir', 'OUTPUT_DIR': 'output_dir', 'REPORT_FILE': 'report_file',
+    'CORPUS_PATTERNS': 'corpus_patterns', 'CORPUS_CHANGED_ONLY': 'corpus_changed_only',
+    'CORPUS_MANIFEST_FILE': 'corpus_manifest_file', 'CORPUS_MMAP_MIN_BYTES': 'corpus_mmap_min_bytes',
+    'CORPUS_WORKERS': 'corpus_workers',
+    'REQUEST_TIMEOUT_SEC': 'request_timeout_sec', 'MAX_TOKENS': 'max_tokens', 'MAX_ATTEMPTS': 'max_attempts',
+    'DISABLE_PROXY': 'disable_proxy', 'STREAM_ENABLED': 'stream_enabled', 'ECHO_STREAM': 'echo_stream',
+    'ECHO_STREAM_MODE': 'echo_stream_mode', 'ECHO_STREAM_PREFIX': 'echo_stream_prefix',
+    'MAX_IN_FLIGHT': 'max_in_flight', 'RATE_LIMITS': 'rate_limits',
+    'CASSETTE_MODE': 'cassette_mode', 'CASSETTE_PACE': 'cassette_pace', 'CASSETTE_FILE': 'cassette_file',
+    'HEDGE_ENABLED': 'hedge_enabled', 'HEDGE_PERCENTILE': 'hedge_percentile', 'HEDGE_BUDGET': 'hedge_budget',
+    'HEDGE_INITIAL_DELAY_SEC': 'hedge_initial_delay_sec',
+    'PROBE_TIMEOUT_SEC': 'probe_timeout_sec', 'HEALTH_TTL_SEC': 'health_ttl_sec',
+    'BREAKER_FAILURES': 'breaker_failures', 'BREAKER_OPEN_SEC': 'breaker_open_sec', 'HEALTH_FILE': 'health_file',
+    'CACHE_DIR': 'cache_dir', 'CACHE_ENABLED': 'cache_enabled', 'CACHE_BYPASS': 'cache_bypass',
+    'CACHE_TTL_SEC': 'cache_ttl_sec', 'CACHE_MAX_BYTES': 'cache_max_bytes',
+    'INCREMENTAL_ENABLED': 'incremental_enabled', 'MANIFEST_FILE': 'manifest_file',
+    'LOG_COMPRESS_MIN_BYTES': 'log_compress_min_bytes',
+    'CHUNK_TOKEN_CAP': 'chunk_token_cap', 'CHUNK_OVERLAP_TOKENS': 'chunk_overlap_tokens',
+    'REDUCE_TOKEN_CAP': 'reduce_token_cap',
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LEGACY_NAMES:
+        return getattr(get_settings(), _LEGACY_NAMES[name])
+    raise AttributeError(f"module 'config' has no attribute {name!r}")
+
 
 # ============================= 模型配置 =============================
 MODEL_CONFIGS = {
@@ -54,6 +349,7 @@ MODEL_CONFIGS = {
         'supported_models': ['deepseek-chat', 'deepseek-coder', 'deepseek-llm-7b-chat'],
         'features': ['streaming', 'deep_thinking', 'function_calling'],
         'max_tokens': 4096,
+        'context_window': 64000,
         'temperature_range': (0.1, 0.9)
     },
     'dashscope': {
@@ -61,6 +357,7 @@ MODEL_CONFIGS = {
         'supported_models': ['qwen-plus', 'qwen-turbo', 'qwen-max', 'qwen-max-longcontext'],
         'features': ['streaming', 'vision', 'audio', 'deep_thinking'],
         'max_tokens': 8192,
+        'context_window': 131072,
         'temperature_range': (0.1, 1.0)
     },
     'openai': {
@@ -68,6 +365,7 @@ MODEL_CONFIGS = {
         'supported_models': ['gpt-4o-mini', 'gpt-4o', 'gpt-3.5-turbo'],
         'features': ['streaming', 'function_calling', 'vision'],
         'max_tokens': 4096,
+        'context_window': 128000,
         'temperature_range': (0.1, 2.0)
     }
 }
@@ -126,13 +424,14 @@ def read_env_file(path: pathlib.Path) -> Dict[str, str]:
 def load_environment_config() -> Dict[str, str]:
     """加载环境配置，优先使用环境变量，其次使用配置文件，最后使用默认值。"""
     # 多路径查找配置文件
+    settings = get_settings()
     candidates = [
-        PROJECT_ROOT / '.env.local',
-        REPO_ROOT / '.env.local',
-        REPO_ROOT / '.secrets' / 'ai_providers.env'
+        settings.project_root / '.env.local',
+        settings.repo_root / '.env.local',
+        settings.repo_root / '.secrets' / 'ai_providers.env'
     ]
     
-    env: Dict[str, str] = dict(os.environ)
+    env: Dict[str, str] = dict(settings.env)
     
     # 读取配置文件
     for p in candidates:
@@ -211,10 +510,11 @@ def normalize_base_url(base: str) -> str:
 
 def get_model_specific_params(provider_type: str, model: str) -> Dict[str, Any]:
     """获取模型特定的参数配置。"""
+    settings = get_settings()
     base_params = {
         'temperature': 0.3,
-        'stream': STREAM_ENABLED,
-        'max_tokens': MAX_TOKENS,
+        'stream': settings.stream_enabled,
+        'max_tokens': settings.max_tokens,
     }
     
     # 根据提供商和模型添加特定参数
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器连接池模块
+
+功能：
+1. 按 Provider 源站（scheme+host+port）维护 HTTP/1.1 keep-alive 长连接池
+2. 连接数上限（按 max_in_flight 与对冲余量确定）、空闲超时淘汰，多线程安全复用；池满等待有截止时间并计入排队耗时
+3. 统计每次请求的握手耗时（TCP+TLS）与复用次数，便于观察节省效果
+4. 可取消请求：CancelToken.cancel() 立即关闭该请求占用连接的套接字，阻塞中的读写随即返回，连接不再复用
+"""
+
+import http.client
+import math
+import socket
+import threading
+import time
+import urllib.parse
+from urllib import request
+from typing import Dict, Optional, Tuple, Any
+from config import get_settings
+
+
+POOL_MAX_SIZE: int = 4           # 每个源站连接数上限的下限（实际上限见 pool_max_size()）
+POOL_IDLE_TIMEOUT_SEC: float = 60.0  # 空闲超过该时长的连接在下次取用时关闭
+POOL_WAIT_POLL_SEC: float = 0.2      # 池满等待归还时检查取消令牌的间隔
+
+
+class RequestCancelled(Exception):
+    """请求已被 CancelToken 取消。"""
+
+
+class PoolTimeout(TimeoutError):
+    """连接池已满，等待归还超过请求超时。"""
+
+
+class CancelToken:
+    """请求取消令牌：请求期间绑定其连接，cancel() 置位并关闭该连接的套接字（线程安全）。"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._event.set()
+            conn = self._conn
+        if conn is not None:
+            _shutdown(conn)
+
+    def bind(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._conn = conn
+            cancelled = self._event.is_set()
+        if cancelled:
+            _shutdown(conn)
+
+    def unbind(self) -> None:
+        with self._lock:
+            self._conn = None
+
+
+def _shutdown(conn: http.client.HTTPConnection) -> None:
+    sock = conn.sock
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class ConnectionPool:
+    """单个源站的连接池。acquire() 取连接（必要时新建并计时握手），release() 归还。"""
+
+    def __init__(self, scheme: str, host: str, port: int,
+                 maxsize: int = POOL_MAX_SIZE, idle_timeout: float = POOL_IDLE_TIMEOUT_SEC):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.maxsize = max(1, maxsize)
+        self.idle_timeout = idle_timeout
+        self._idle: list[Tuple[http.client.HTTPConnection, float]] = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self.stats = {
+            'requests': 0,
+            'created': 0,
+            'reused': 0,
+            'evicted': 0,
+            'handshake_sec_total': 0.0,
+            'waits': 0,
+            'wait_sec_total': 0.0,
+            'wait_timeouts': 0,
+        }
+
+    @property
+    def origin(self) -> str:
+        return f'{self.scheme}://{self.host}:{self.port}'
+
+    def _new_connection(self, timeout: float) -> http.client.HTTPConnection:
+        """新建连接；若未禁用代理且环境配置了代理，则走代理（HTTPS 使用 CONNECT 隧道）。"""
+        proxy = None
+        if not get_settings().disable_proxy and not request.proxy_bypass(self.host):
+            proxy = request.getproxies().get(self.scheme)
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        if proxy:
+            p = urllib.parse.urlsplit(proxy if '://' in proxy else f'http://{proxy}')
+            conn = cls(p.hostname, p.port or 8080, timeout=timeout)
+            conn.set_tunnel(self.host, self.port)
+            return conn
+        return cls(self.host, self.port, timeout=timeout)
+
+    def _evict_idle(self, now: float) -> None:
+        keep = []
+        for conn, since in self._idle:
+            if now - since > self.idle_timeout:
+                conn.close()
+                self.stats['evicted'] += 1
+            else:
+                keep.append((conn, since))
+        self._idle = keep
+
+    def resize(self, maxsize: int) -> None:
+        """调整连接数上限（配置变化时由 get_pool 调用），唤醒等待者按新上限重试。"""
+        with self._cond:
+            self.maxsize = max(1, maxsize)
+            self._cond.notify_all()
+
+    def acquire(self, timeout: Optional[float] = None, cancel: Optional[CancelToken] = None
+                ) -> Tuple[http.client.HTTPConnection, bool, float, float]:
+        """返回 (连接, 是否复用, 握手耗时秒, 池满等待秒)。
+
+        连接数达上限时阻塞等待归还，最多等 timeout 秒（超时抛出 PoolTimeout）；等待期间取消则抛出 RequestCancelled。
+        """
+        if timeout is None:
+            timeout = get_settings().request_timeout_sec
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = 0.0
+        blocked = False
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._evict_idle(now)
+                if blocked and (self._idle or self._in_use < self.maxsize):
+                    waited = now - start
+                    self.stats['waits'] += 1
+                    self.stats['wait_sec_total'] += waited
+                if self._idle:
+                    conn, _ = self._idle.pop()   # LIFO：优先用最热的连接
+                    self._in_use += 1
+                    self.stats['requests'] += 1
+                    self.stats['reused'] += 1
+                    conn.timeout = timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(timeout)
+                    return conn, True, 0.0, waited
+                if self._in_use < self.maxsize:
+                    self._in_use += 1
+                    break
+                if cancel is not None and cancel.is_set():
+                    raise RequestCancelled()
+                remaining = deadline - now
+                if remaining <= 0:
+                    self.stats['wait_timeouts'] += 1
+                    self.stats['wait_sec_total'] += now - start
+                    raise PoolTimeout(f'connection pool {self.origin} full ({self.maxsize}) for {timeout:.1f}s')
+                blocked = True
+                self._cond.wait(min(POOL_WAIT_POLL_SEC, remaining))
+        # 握手在锁外进行，避免阻塞其它线程
+        t0 = time.perf_counter()
+        try:
+            conn = self._new_connection(timeout)
+            conn.connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        cost = time.perf_counter() - t0
+        with self._cond:
+            self.stats['requests'] += 1
+            self.stats['created'] += 1
+            self.stats['handshake_sec_total'] += cost
+        return conn, False, cost, waited
+
+    def release(self, conn: http.client.HTTPConnection, reusable: bool = True) -> None:
+        """归还连接；不可复用（响应未读完/出错/服务端要求关闭）时直接关闭。"""
+        with self._cond:
+            self._in_use -= 1
+            if reusable and conn.sock is not None and len(self._idle) < self.maxsize:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                conn.close()
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            for conn, _ in self._idle:
+                conn.close()
+            self._idle = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            s = dict(self.stats)
+            s['idle'] = len(self._idle)
+            s['in_use'] = self._in_use
+            s['maxsize'] = self.maxsize
+        s['handshake_sec_total'] = round(s['handshake_sec_total'], 4)
+        s['wait_sec_total'] = round(s['wait_sec_total'], 4)
+        s['handshake_ms_avg'] = round(1000 * s['handshake_sec_total'] / s['created'], 1) if s['created'] else 0.0
+        return s
+
+
+_POOLS: Dict[Tuple[str, str, int], ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def pool_max_size() -> int:
+    """每个源站的连接数上限：不少于限流器的 max_in_flight，启用对冲时再加上对冲余量
+    （对冲请求另占许可，被取消的一方归还连接前也仍占着连接），避免在途请求在池里无声排队。"""
+    settings = get_settings()
+    headroom = max(1, math.ceil(settings.max_in_flight * settings.hedge_budget)) if settings.hedge_enabled else 0
+    return max(POOL_MAX_SIZE, settings.max_in_flight + headroom)
+
+
+def get_pool(url: str) -> ConnectionPool:
+    """按 URL 的源站取（或创建）连接池；上限随配置（pool_max_size）调整。"""
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme or 'https'
+    port = parts.port or (443 if scheme == 'https' else 80)
+    key = (scheme, parts.hostname or '', port)
+    maxsize = pool_max_size()
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = ConnectionPool(scheme, key[1], port, maxsize)
+        elif pool.maxsize != maxsize:
+            pool.resize(maxsize)
+        return pool
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """所有源站连接池的统计快照（origin -> stats）。"""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    return {p.origin: p.snapshot() for p in pools}
+
+
+def close_all_pools() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    for p in pools:
+        p.close()
+
+
+def pooled_request(method: str, url: str, body: Optional[bytes], headers: dict,
+                   timeout: Optional[float] = None, cancel: Optional[CancelToken] = None
+                   ) -> Tuple[http.client.HTTPResponse, ConnectionPool, http.client.HTTPConnection, Dict[str, Any]]:
+    """通过连接池发送请求，返回 (响应, 池, 连接, 网络信息)。
+
+    调用方读完响应后必须调用 finish_response()（传入同一 cancel）归还连接。
+    复用的连接若已被服务端关闭（发送阶段或读状态行时断开），自动换新连接重试一次。
+    传入 cancel 时连接绑定到令牌，取消后抛出 RequestCancelled。
+    网络信息中的 pool_wait_sec 为池满等待归还的耗时（两次尝试合计）。
+    """
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    pool = get_pool(url)
+    pool_wait = 0.0
+    for attempt in range(2):
+        if cancel is not None and cancel.is_set():
+            raise RequestCancelled()
+        conn, reused, cost, waited = pool.acquire(timeout, cancel)
+        pool_wait += waited
+        if cancel is not None:
+            cancel.bind(conn)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                http.client.CannotSendRequest, http.client.BadStatusLine):
+            _release_failed(pool, conn, cancel)
+            if reused and attempt == 0:
+                continue
+            raise
+        except Exception:
+            _release_failed(pool, conn, cancel)
+            raise
+        return resp, pool, conn, {'reused': reused, 'connect_sec': round(cost, 4),
+                                  'pool_wait_sec': round(pool_wait, 4), 'origin': pool.origin}
+    raise http.client.RemoteDisconnected('connection closed')  # 不可达，仅为类型完整
+
+
+def _release_failed(pool: ConnectionPool, conn: http.client.HTTPConnection, cancel: Optional[CancelToken]) -> None:
+    if cancel is not None:
+        cancel.unbind()
+    pool.release(conn, reusable=False)
+    if cancel is not None and cancel.is_set():
+        raise RequestCancelled()
+
+
+def finish_response(resp: http.client.HTTPResponse, pool: ConnectionPool,
+                    conn: http.client.HTTPConnection, drain: bool = True,
+                    cancel: Optional[CancelToken] = None) -> None:
+    """结束一次响应并归还连接：读尽剩余字节后才可复用，否则关闭。"""
+    if cancel is not None:
+        cancel.unbind()
+        if cancel.is_set():   # 套接字可能已被关闭，不再复用
+            pool.release(conn, reusable=False)
+            return
+    reusable = False
+    try:
+        if drain and not resp.isclosed():
+            resp.read()
+        reusable = resp.isclosed() and not resp.will_close
+    except Exception:
+        reusable = False
+    finally:
+        pool.release(conn, reusable=reusable)
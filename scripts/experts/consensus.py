@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器跨专家共识模块
+
+功能：
+1. 从各专家输出中逐条抽取 TODO 与风险项（列表项 + 所在小节/行内标记判断类别）
+2. 字符 shingle + MinHash 签名 + LSH 分桶找近重复候选，近似线性扩展，不做全量两两比较
+3. 并查集合并近重复项为簇，按支持该簇的专家数标记共识，只有一位专家提出的作为独特见解
+"""
+
+import random
+import re
+import zlib
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+
+
+MINHASH_PERMUTATIONS: int = 64
+LSH_BANDS: int = 16              # 16 段 × 4 行：Jaccard 约 0.5 以上的项大概率落入同一桶
+SIMILARITY_THRESHOLD: float = 0.5
+SHINGLE_SIZE: int = 3
+MIN_ITEM_CHARS: int = 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_LIST_ITEM_RE = re.compile(r'^(\s*)(?:[-*+•]|\d+[.)、]|[（(]\d+[)）])\s+(?:\[[ xX]\]\s*)?(.+)$')
+_TAG_RE = re.compile(r'^\s*(?:\*\*)?\s*[\[【]?\s*(todo|risk|风险|待办)\s*[\]】]?\s*(?:\*\*)?\s*[:：]?\s*', re.I)
+_HEADING_RE = re.compile(r'^\s*(?:#{1,6}\s+|\*\*)(.+?)(?:\*\*)?\s*[:：]?\s*$')
+_NORMALIZE_RE = re.compile(r'[\W_]+', re.U)
+
+
+def _kind_of(label: str) -> Optional[str]:
+    label = label.lower()
+    if 'risk' in label or '风险' in label:
+        return 'risk'
+    if 'todo' in label or '待办' in label or '任务' in label:
+        return 'todo'
+    return None
+
+
+def extract_items(content: str) -> List[Dict[str, str]]:
+    """抽取一位专家输出中的 TODO/风险条目：[{'kind': 'todo'|'risk', 'text', 'section'}]。
+
+    类别优先取条目自身的 [TODO]/[Risk] 标记，其次取所在小节标题；缩进的子项视为上一条的细节，不单独成条。
+    """
+    items: List[Dict[str, str]] = []
+    section, section_kind = '', None
+    for line in content.splitlines():
+        m = _LIST_ITEM_RE.match(line)
+        if not m:
+            h = _HEADING_RE.match(line)
+            tag = _TAG_RE.match(line)
+            if h:
+                section = h.group(1).strip()
+                section_kind = _kind_of(section)
+            elif tag and not line[tag.end():].strip():   # 单独一行的 "TODO：" / "[Risk]"
+                section_kind = _kind_of(tag.group(1))
+            continue
+        indent, text = m.group(1), m.group(2).strip()
+        if len(indent.expandtabs(4)) >= 2 and items:
+            continue
+        tag = _TAG_RE.match(text)
+        kind = _kind_of(tag.group(1)) if tag else section_kind
+        if tag:
+            text = text[tag.end():].strip()
+        text = text.strip('*').strip()
+        if kind is None or len(text) < MIN_ITEM_CHARS:
+            continue
+        items.append({'kind': kind, 'text': text, 'section': section})
+    return items
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> set:
+    """去除标点空白、小写后的字符 k-gram 哈希集合（中英文通用）。"""
+    s = _NORMALIZE_RE.sub('', text.lower())
+    if len(s) <= k:
+        return {zlib.crc32(s.encode('utf-8'))}
+    return {zlib.crc32(s[i:i + k].encode('utf-8')) for i in range(len(s) - k + 1)}
+
+
+class MinHasher:
+    """MinHash 签名：num_perm 个 (a·x + b) mod p 的通用哈希，固定种子保证跨次运行一致。"""
+
+    def __init__(self, num_perm: int = MINHASH_PERMUTATIONS, seed: int = 1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+
+    def signature(self, shingle_set: Iterable[int]) -> Tuple[int, ...]:
+        values = list(shingle_set)
+        return tuple(min(((a * x + b) % _MERSENNE_PRIME) & _MAX_HASH for x in values)
+                     for a, b in self.params)
+
+
+def estimated_similarity(sig1: Tuple[int, ...], sig2: Tuple[int, ...]) -> float:
+    return sum(1 for x, y in zip(sig1, sig2) if x == y) / len(sig1)
+
+
+def cluster_items(items: List[Dict[str, Any]], threshold: float = SIMILARITY_THRESHOLD,
+                  num_perm: int = MINHASH_PERMUTATIONS, bands: int = LSH_BANDS) -> Tuple[List[List[int]], Dict[str, int]]:
+    """对条目做近重复聚类，返回 (簇列表[条目下标], 统计)。
+
+    LSH：签名分成 bands 段，任一段完全相同的条目落入同一桶；桶内各条只与桶首条核对估计相似度，
+    比较次数与条目数 × bands 成正比。只有 TODO 与 TODO、风险与风险之间才会合并。
+    """
+    hasher = MinHasher(num_perm)
+    rows = max(1, num_perm // bands)
+    sigs = [hasher.signature(shingles(it['text'])) for it in items]
+    parent = list(range(len(items)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets: Dict[tuple, List[int]] = {}
+    for i, (it, sig) in enumerate(zip(items, sigs)):
+        for b in range(bands):
+            buckets.setdefault((it['kind'], b, sig[b * rows:(b + 1) * rows]), []).append(i)
+
+    checked = set()
+    stats = {'items': len(items), 'candidate_pairs': 0, 'merged': 0}
+    for members in buckets.values():
+        i = members[0]
+        for j in members[1:]:
+            if (i, j) in checked:
+                continue
+            checked.add((i, j))
+            stats['candidate_pairs'] += 1
+            ri, rj = find(i), find(j)
+            if ri != rj and estimated_similarity(sigs[i], sigs[j]) >= threshold:
+                parent[max(ri, rj)] = min(ri, rj)
+                stats['merged'] += 1
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(items)):
+        groups.setdefault(find(i), []).append(i)
+    clusters = sorted(groups.values(), key=lambda g: g[0])
+    stats['clusters'] = len(clusters)
+    return clusters, stats
+
+
+def build_consensus(outputs: Dict[str, str], min_support: int = 2) -> Dict[str, Any]:
+    """跨专家共识：{'consensus', 'unique_insights', 'stats'}。
+
+    outputs 为 {专家名: 输出文本}。每簇以最详细（最长）的条目作代表，
+    支持数 = 提出该簇条目的不同专家数；支持数 ≥ min_support 的为共识（按支持数降序），只有一位专家的为独特见解。
+    """
+    items: List[Dict[str, Any]] = []
+    for provider, content in outputs.items():
+        for it in extract_items(content or ''):
+            it['provider'] = provider
+            items.append(it)
+    clusters, stats = cluster_items(items)
+
+    consensus, unique = [], []
+    for members in clusters:
+        providers = list(dict.fromkeys(items[i]['provider'] for i in members))
+        rep = max((items[i] for i in members), key=lambda it: len(it['text']))
+        entry = {
+            'kind': rep['kind'],
+            'text': rep['text'],
+            'support': len(providers),
+            'providers': providers,
+            'variants': len(members),
+        }
+        if len(providers) >= min_support:
+            consensus.append(entry)
+        elif len(providers) == 1:
+            unique.append(entry)
+    consensus.sort(key=lambda e: (-e['support'], -e['variants']))
+    stats['consensus'] = len(consensus)
+    stats['unique'] = len(unique)
+    return {'consensus': consensus, 'unique_insights': unique, 'stats': stats}
+
+
+def format_item(entry: Dict[str, Any], total_experts: int = 0) -> str:
+    """渲染为纪要中的一行：[TODO] 文本（支持 2/3：A、B）。"""
+    label = 'TODO' if entry.get('kind') == 'todo' else 'Risk'
+    support = f"{entry.get('support', 0)}/{total_experts}" if total_experts else str(entry.get('support', 0))
+    return f"[{label}] {entry.get('text', '')}（支持 {support}：{'、'.join(entry.get('providers', []))}）"
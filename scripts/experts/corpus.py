@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器多文档语料模块
+
+功能：
+1. 按 glob 模式（相对仓库根目录，支持 **）发现多个文档，如 apps/webui/src/*.md、docs/**/*.md
+2. 线程池并行读取，保持发现顺序输出；大文件使用 mmap，按空行切段后逐段解码，不整体载入
+3. 文件清单（mtime/大小 + 内容哈希）：mtime 与大小未变的文件不打开即跳过，
+   仅 mtime 变化而内容哈希相同的文件同样视为未变化
+4. 跨文件丢弃完全重复的段落（保留首次出现）
+5. 输出带来源标题的段落流，直接交给切片函数逐段消费，不拼接成一个大字符串
+"""
+
+import collections
+import hashlib
+import json
+import mmap
+import os
+import pathlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Any
+from config import get_settings
+
+
+_BLANK_LINES_RE = re.compile(rb'\r?\n(?:[ \t]*\r?\n)+')
+DEDUP_MIN_CHARS: int = 40   # 过短的段落（分隔线、代码围栏等）不参与去重
+
+
+def iter_byte_paragraphs(buf) -> Iterator[bytes]:
+    """按空行切分字节缓冲（bytes 或 mmap），逐个产出非空段落（去掉首尾空白）。"""
+    start = 0
+    for m in _BLANK_LINES_RE.finditer(buf):
+        para = buf[start:m.start()].strip()
+        if para:
+            yield para
+        start = m.end()
+    para = buf[start:].strip()
+    if para:
+        yield para
+
+
+class CorpusManifest:
+    """语料文件清单：{'files': {相对路径: {'mtime_ns', 'size', 'sha256', 'at'}}}。"""
+
+    def __init__(self, path: Optional[pathlib.Path] = None):
+        self.path = pathlib.Path(path or get_settings().corpus_manifest_file)
+        self._lock = threading.Lock()
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.current: Dict[str, Dict[str, Any]] = {}
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+            self.files = dict(data.get('files') or {})
+        except (OSError, ValueError):
+            pass
+
+    def get(self, rel: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.files.get(rel)
+
+    def record(self, rel: str, mtime_ns: int, size: int, sha256: str) -> None:
+        with self._lock:
+            self.current[rel] = {'mtime_ns': mtime_ns, 'size': size, 'sha256': sha256,
+                                 'at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+    def save(self) -> None:
+        """原子写入清单；只保留本次仍被发现的文件。"""
+        with self._lock:
+            data = json.dumps({'files': dict(self.current)}, ensure_ascii=False, indent=2)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_text(data, encoding='utf-8')
+        os.replace(tmp, self.path)
+
+
+class CorpusLoader:
+    """多文档语料加载器。paragraphs() 产出段落流（每个文件以来源标题开头），统计见 snapshot()。"""
+
+    def __init__(self, patterns: List[str], root: Optional[pathlib.Path] = None,
+                 manifest: Optional[CorpusManifest] = None, changed_only: Optional[bool] = None,
+                 mmap_min_bytes: Optional[int] = None, workers: Optional[int] = None):
+        """未指定的参数取当前设置（repo_root / corpus_changed_only / corpus_mmap_min_bytes / corpus_workers）。"""
+        settings = get_settings()
+        self.patterns = list(patterns)
+        self.root = pathlib.Path(root or settings.repo_root)
+        self.manifest = manifest if manifest is not None else CorpusManifest()
+        self.changed_only = settings.corpus_changed_only if changed_only is None else changed_only
+        self.mmap_min_bytes = settings.corpus_mmap_min_bytes if mmap_min_bytes is None else mmap_min_bytes
+        self.workers = max(1, settings.corpus_workers if workers is None else workers)
+        self.sources: List[str] = []   # 实际输出了段落的文件（相对路径）
+        self._lock = threading.Lock()
+        self.stats = {'files': 0, 'read': 0, 'unchanged': 0, 'skipped': 0, 'mmapped': 0,
+                      'bytes': 0, 'paragraphs': 0, 'duplicates': 0, 'errors': 0}
+
+    def discover(self) -> List[pathlib.Path]:
+        """按模式顺序发现文件（每个模式内按路径排序，跨模式去重）。"""
+        seen = set()
+        files: List[pathlib.Path] = []
+        for pattern in self.patterns:
+            for path in sorted(self.root.glob(pattern)):
+                key = path.resolve()
+                if key in seen or not path.is_file():
+                    continue
+                seen.add(key)
+                files.append(path)
+        return files
+
+    def _bump(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+
+    def _read(self, path: pathlib.Path) -> Optional[List[tuple]]:
+        """读取单个文件，返回 [(段落文本, 段落摘要)]；未变化且可跳过时返回 None。在工作线程中执行。"""
+        rel = path.relative_to(self.root).as_posix()
+        st = path.stat()
+        prev = self.manifest.get(rel)
+        if prev and prev.get('mtime_ns') == st.st_mtime_ns and prev.get('size') == st.st_size:
+            self.manifest.record(rel, st.st_mtime_ns, st.st_size, prev.get('sha256', ''))
+            self._bump('unchanged')
+            if self.changed_only:
+                return None
+        with open(path, 'rb') as f:
+            if st.st_size >= self.mmap_min_bytes > 0:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._bump('mmapped')
+            else:
+                buf = f.read()
+        try:
+            sha = hashlib.sha256(buf).hexdigest()
+            self.manifest.record(rel, st.st_mtime_ns, st.st_size, sha)
+            if prev and prev.get('sha256') == sha and prev.get('mtime_ns') != st.st_mtime_ns:
+                self._bump('unchanged')   # 仅 mtime 变化（如 touch / checkout）
+                if self.changed_only:
+                    return None
+            self._bump('read')
+            self._bump('bytes', st.st_size)
+            return [(p.decode('utf-8', errors='replace'), hashlib.blake2b(p, digest_size=16).digest())
+                    for p in iter_byte_paragraphs(buf)]
+        finally:
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+
+    def paragraphs(self) -> Iterator[str]:
+        """并行读取、按发现顺序产出段落（以空行结尾）；跨文件完全重复的段落只保留首次出现。"""
+        files = self.discover()
+        self.stats['files'] = len(files)
+        seen = set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='corpus') as executor:
+            # 有界预读：最多 2×workers 个文件在途，保持输出顺序的同时不把全部语料留在内存
+            window: "collections.deque" = collections.deque()
+            pending = iter(files)
+            for path in pending:
+                window.append((path, executor.submit(self._read, path)))
+                if len(window) >= 2 * self.workers:
+                    break
+            while window:
+                path, future = window.popleft()
+                nxt = next(pending, None)
+                if nxt is not None:
+                    window.append((nxt, executor.submit(self._read, nxt)))
+                try:
+                    paras = future.result()
+                except OSError as e:
+                    self._bump('errors')
+                    print(f"[experts] 语料读取失败: {path}: {e}")
+                    continue
+                if paras is None:
+                    self._bump('skipped')
+                    continue
+                header_sent = False
+                for text, digest in paras:
+                    if len(text) >= DEDUP_MIN_CHARS:
+                        if digest in seen:
+                            self._bump('duplicates')
+                            continue
+                        seen.add(digest)
+                    if not header_sent:
+                        rel = path.relative_to(self.root).as_posix()
+                        self.sources.append(rel)
+                        header_sent = True
+                        yield f'# 来源：{rel}\n\n'
+                    self._bump('paragraphs')
+                    yield text + '\n\n'
+
+    def save_manifest(self) -> None:
+        self.manifest.save()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self.stats)
+        s['sources'] = len(self.sources)
+        return s
@@ -12,14 +12,17 @@
 """
 
 import pathlib
-from typing import List, Dict, Any
-from config import REPORT_FILE, EXPERT_ROLES
+import re
+import zlib
+from typing import Callable, Iterable, List, Dict, Any, Union
+from config import EXPERT_ROLES, get_settings
+from token_estimator import estimate_tokens
 
 
 def collect_doc_text() -> str:
     """读取主报告文档内容。若不存在则返回空串。"""
     try:
-        return REPORT_FILE.read_text(encoding='utf-8')
+        return get_settings().report_file.read_text(encoding='utf-8')
     except Exception:
         return ''
 
@@ -58,6 +61,134 @@ def split_text_for_chunks(text: str, max_chars: int = 12000) -> List[str]:
     return chunks
 
 
+_SENTENCE_RE = re.compile(r'.*?(?:[。！？!?；;]|\.\s|\n|\Z)', re.S)
+
+
+def _iter_paragraphs(text: str) -> Iterable[str]:
+    """按空行切段（空行归入前一段），拼接后与原文一致。"""
+    start, end = 0, len(text)
+    while start < end:
+        i = text.find('\n\n', start)
+        if i < 0:
+            yield text[start:]
+            return
+        i += 2
+        while i < end and text[i] == '\n':
+            i += 1
+        yield text[start:i]
+        start = i
+
+
+def split_text_by_tokens(text: Union[str, Iterable[str]], max_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """按 token 预算切片：单遍扫描段落，尽量填满每段的预算，减少请求次数。
+    
+    - token 数由 estimate_tokens 按文字体系估算（中英文不再按同一字符上限处理）
+    - 超出预算的单个段落按句子再切，单句仍超预算时按估算比例硬切
+    - overlap_tokens > 0 时，下一段以上一段末尾不超过该预算的若干段落开头，保持上下文衔接
+    - text 也可以是段落流（如 CorpusLoader.paragraphs()），逐段消费，不拼接成整串
+    """
+    max_tokens = max(1, max_tokens)
+    overlap_tokens = min(max(0, overlap_tokens), max_tokens // 2)
+    if isinstance(text, str):
+        if estimate_tokens(text) <= max_tokens:
+            return [text]
+        paragraphs = _iter_paragraphs(text)
+    else:
+        paragraphs = text
+    
+    def pieces():
+        """逐个产出 (文本, token 数)，每个不超过预算。"""
+        for para in paragraphs:
+            n = estimate_tokens(para)
+            if n <= max_tokens:
+                yield para, n
+                continue
+            for sm in _SENTENCE_RE.finditer(para):
+                sent = sm.group()
+                if not sent:
+                    continue
+                k = estimate_tokens(sent)
+                if k <= max_tokens:
+                    yield sent, k
+                    continue
+                step = max(1, len(sent) * max_tokens // k)
+                for i in range(0, len(sent), step):
+                    part = sent[i:i + step]
+                    yield part, estimate_tokens(part)
+    
+    chunks: List[str] = []
+    current: List[tuple] = []
+    total = 0
+    for piece, n in pieces():
+        if current and total + n > max_tokens:
+            chunks.append(''.join(p for p, _ in current))
+            # 重叠：从上一段尾部取回不超过 overlap_tokens 的片段
+            tail: List[tuple] = []
+            kept = 0
+            for p, k in reversed(current):
+                if kept + k > overlap_tokens or kept + k + n > max_tokens:
+                    break
+                tail.append((p, k))
+                kept += k
+            current, total = tail[::-1], kept
+        current.append((piece, n))
+        total += n
+    if current:
+        chunks.append(''.join(p for p, _ in current))
+    return chunks
+
+
+_HEADING_RE = re.compile(r'#{1,2}\s')
+
+
+def split_text_content_defined(text: Union[str, Iterable[str]], max_chars: int = 7000, min_chars: int = 3500,
+                               anchor_every: int = 12, size: Callable[[str], int] = len) -> List[str]:
+    """内容定义切片：边界只由附近内容决定，局部编辑不会让后续所有切片整体位移。
+    
+    切分规则（按空行划分段落块，拼接后与原文逐字节一致）：
+    1. 一级/二级标题（# / ##）前切分（当前段已达 min_chars）
+    2. 段落块内容哈希满足 crc32 % anchor_every == 0 时在其后切分（当前段已达 min_chars）
+    3. 超过 max_chars 时强制切分；超长单块退回 split_text_for_chunks / split_text_by_tokens
+    强制切分只影响到下一个锚点为止，其后的边界与编辑前保持一致。
+    size 为长度度量（默认字符数；传入 estimate_tokens 时 max_chars/min_chars 按 token 计）。
+    text 也可以是以空行结尾的段落流（如 CorpusLoader.paragraphs()），逐段消费。
+    """
+    if isinstance(text, str):
+        if size(text) <= max_chars:
+            return [text]
+        blocks = (b for b in re.split(r'(?<=\n\n)', text) if b)
+    else:
+        blocks = text
+    chunks: List[str] = []
+    current: List[str] = []
+    total = 0
+    
+    def cut() -> None:
+        nonlocal current, total
+        if current:
+            chunks.append(''.join(current))
+        current, total = [], 0
+    
+    for block in blocks:
+        block_size = size(block)
+        if total >= min_chars and _HEADING_RE.match(block):
+            cut()
+        if total and total + block_size > max_chars:
+            cut()
+        if block_size > max_chars:
+            if size is len:
+                chunks.extend(split_text_for_chunks(block, max_chars=max_chars))
+            else:
+                chunks.extend(split_text_by_tokens(block, max_chars))
+            continue
+        current.append(block)
+        total += block_size
+        if total >= min_chars and zlib.crc32(block.strip().encode('utf-8')) % anchor_every == 0:
+            cut()
+    cut()
+    return chunks
+
+
 def generate_expert_prompt(provider_type: str, chunk_index: int, total_chunks: int, chunk_content: str) -> Dict[str, Any]:
     """生成专家角色特定的提示词。
     
@@ -103,8 +234,65 @@ def generate_expert_prompt(provider_type: str, chunk_index: int, total_chunks: i
     }
 
 
+_SUMMARY_SEPARATOR = '\n\n'
+
+
+def group_outputs_by_tokens(outputs: List[str], max_tokens: int,
+                            size: Callable[[str], int] = estimate_tokens) -> List[List[str]]:
+    """把多段输出按顺序贪心打包成若干组，每组合计不超过 max_tokens。
+    
+    为保证逐层归约必然收敛，除最后一组外每组至少 2 段（超预算的段与相邻段同组，由调用方截断）。
+    """
+    groups: List[List[str]] = []
+    current: List[str] = []
+    total = 0
+    for text in outputs:
+        n = size(text)
+        if len(current) >= 2 and total + n > max_tokens:
+            groups.append(current)
+            current, total = [], 0
+        current.append(text)
+        total += n
+    if current:
+        groups.append(current)
+    return groups
+
+
+def fit_outputs_to_budget(outputs: List[str], max_tokens: int) -> List[str]:
+    """合计超过 max_tokens 时，把每段截断到平均份额内（按句子边界），保证一次请求放得下。"""
+    if sum(estimate_tokens(t) for t in outputs) <= max_tokens or not outputs:
+        return outputs
+    share = max(1, max_tokens // len(outputs))
+    return [t if estimate_tokens(t) <= share else split_text_by_tokens(t, share)[0] for t in outputs]
+
+
+def generate_partial_summary_prompt(provider_type: str, outputs: List[str], level: int, group: int) -> Dict[str, Any]:
+    """生成中间层归约的提示词：只合并去重，保留细节，供上一层继续归约。"""
+    expert_role = EXPERT_ROLES.get(provider_type, EXPERT_ROLES['deepseek'])
+    
+    system_prompt = (
+        f'你是{expert_role["name"]}，正在分层汇总一份长报告的多段分析结果（第 {level} 层第 {group} 组）。'
+        '请对以下多段输出做合并去重，不要做最终取舍：\n\n'
+        '1) 保留全部 [TODO] 与 [Risk]，合并重复项，保留验收标准、文件路径/端口/env 等细节\n'
+        '2) 按模块/目录分组列出\n'
+        '3) 标注各段之间相互冲突的结论\n'
+        '4) 只输出合并后的列表，不写开场白与总结。'
+    )
+    
+    user_message = (
+        f'请基于你的专长领域{expert_role["specialty"]}，合并以下多段分析结果：\n\n'
+        + '\n\n----- 以下为待合并的多段输出 -----\n\n' + _SUMMARY_SEPARATOR.join(outputs)
+    )
+    
+    return {
+        'system_prompt': system_prompt,
+        'user_message': user_message,
+        'expert_role': expert_role
+    }
+
+
 def generate_summary_prompt(provider_type: str, combined_outputs: List[str]) -> Dict[str, Any]:
-    """生成聚合收敛的提示词，用于整合多段专家输出。"""
+    """生成聚合收敛的提示词，用于整合多段专家输出（分层归约时为最后一层）。"""
     expert_role = EXPERT_ROLES.get(provider_type, EXPERT_ROLES['deepseek'])
     
     system_prompt = (
@@ -119,7 +307,7 @@ def generate_summary_prompt(provider_type: str, combined_outputs: List[str]) ->
     
     user_message = (
         f'请基于你的专长领域{expert_role["specialty"]}，对以下多段分析结果进行聚合：\n\n'
-        + '\n\n----- 以下为多段聚合 -----\n\n' + '\n\n'.join(combined_outputs)
+        + '\n\n----- 以下为多段聚合 -----\n\n' + _SUMMARY_SEPARATOR.join(combined_outputs)
     )
     
     return {
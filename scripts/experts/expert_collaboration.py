@@ -5,22 +5,32 @@
 专家团队编排器专家协作模块
 
 功能：
-1. 管理专家并行处理流程
+1. 管理专家并行处理流程（分段并发请求，按提供商令牌桶限流）
 2. 聚合和整合专家分析结果
 3. 生成结构化的会议纪要
 4. 处理专家间的协作和冲突解决
 """
 
-import time
-import json
 import pathlib
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from config import LOG_DIR, STREAM_ENABLED, OUTPUT_DIR
+from config import get_settings
 from http_client import call_ai_provider, probe_endpoint_reachable
+from rate_limiter import ProviderLimiter, get_limiter, estimate_request_tokens
+from chunk_manifest import ChunkManifest
+from log_writer import LogWriter
+from hedging import Hedger
+from token_estimator import reduce_token_budget
+from provider_health import get_health_registry, is_failure_status, OPEN
+from consensus import build_consensus, format_item
+from cassette import get_cassette, REPLAY
+from meeting_report import MeetingReport, STAGE_ANALYZING, STAGE_REDUCING
 from document_processor import (
     generate_expert_prompt, 
     generate_summary_prompt,
+    generate_partial_summary_prompt,
+    group_outputs_by_tokens,
+    fit_outputs_to_budget,
     format_expert_section,
     validate_document_content
 )
@@ -29,9 +39,23 @@ from document_processor import (
 class ExpertCollaboration:
     """专家协作管理器，负责协调多个AI专家的并行工作。"""
     
-    def __init__(self, providers: List[Dict[str, str]], log_dir: pathlib.Path):
+    def __init__(self, providers: List[Dict[str, str]], log_dir: pathlib.Path,
+                 manifest: Optional[ChunkManifest] = None, report: Optional[MeetingReport] = None):
         self.providers = providers
         self.log_dir = log_dir
+        self.manifest = manifest  # 增量分析：复用上次会议中未变化切片的结果
+        self.report = report      # 增量纪要：进度与各提供商章节随完成写入
+        settings = get_settings()
+        self.use_streaming = settings.stream_enabled
+        self.max_attempts = settings.max_attempts
+        self.log_writer = LogWriter(log_dir, settings.output_dir)  # 原始响应后台写入
+        # 提供商健康：会议开始前统一并发探测（带 TTL 缓存），请求结果驱动各提供商熔断器
+        self.health = get_health_registry()
+        self.available: Dict[str, bool] = {}
+        # 对冲请求：分段首 token 过慢时向其它提供商发出重复请求（MEETING_HEDGE=true 开启）
+        self.hedger = None
+        if settings.hedge_enabled and len(providers) > 1:
+            self.hedger = Hedger(providers, is_available=lambda p: self.health.breaker(p).state != OPEN)
         self.meeting_results = {}
         self.collaboration_log = []
         
@@ -42,67 +66,57 @@ class ExpertCollaboration:
         
         print(f"[experts] 开始处理提供商: {provider_name}，模型: {provider['model']}")
         
-        # 检查端点连通性
-        if not probe_endpoint_reachable(provider['base']):
-            print(f"[experts] 端点不可达: {provider['base']}，跳过该提供商")
+        # 检查端点连通性（run_parallel_meeting 已统一探测；单独调用时在此补测）
+        if provider_name not in self.available:
+            self.available.update(self.health.probe_all([provider], probe_endpoint_reachable))
+        if not self.available[provider_name]:
+            circuit_open = self.health.breaker(provider).state == OPEN
+            reason = '熔断打开' if circuit_open else '端点不可达'
+            print(f"[experts] {reason}: {provider['base']}，跳过该提供商")
+            if self.hedger is not None:
+                self.hedger.exclude(provider_name)
             return {
                 'provider': provider_name,
-                'status': 'unreachable',
-                'content': f"端点不可达，跳过：{provider['base']}",
+                'status': 'circuit_open' if circuit_open else 'unreachable',
+                'content': f"{reason}，跳过：{provider['base']}",
                 'chunks_processed': 0,
                 'total_chunks': len(chunks)
             }
         
-        # 逐段处理文档
-        chunk_results = []
-        for i, chunk in enumerate(chunks, 1):
-            print(f"[experts] {provider_name} 进度: {i}/{len(chunks)} -> 请求中...")
-            
-            # 生成专家特定的提示词
-            prompt_data = generate_expert_prompt(provider_type, i, len(chunks), chunk)
-            
-            messages = [
-                {'role': 'system', 'content': prompt_data['system_prompt']},
-                {'role': 'user', 'content': prompt_data['user_message']},
-            ]
-            
-            # 调用AI提供商
-            result = call_ai_provider(provider, messages, STREAM_ENABLED)
-            
-            if result.get('ok'):
-                chunk_results.append(str(result.get('content') or '').strip())
-                print(f"[experts] {provider_name} 进度: {i}/{len(chunks)} -> 成功")
+        # 分段并发处理：受该提供商令牌桶（RPM/TPM）与在途上限约束，429 时自动退让
+        limiter = get_limiter(provider)
+        chunk_results: List[str] = [''] * len(chunks)
+        pending = []
+        for i in range(1, len(chunks) + 1):
+            reused = self._reuse_chunk(provider, i, chunks)
+            if reused is None:
+                pending.append(i)
             else:
-                error_msg = f"[ERROR {result.get('status')}] {result.get('raw')}"
-                chunk_results.append(error_msg)
-                print(f"[experts] {provider_name} 进度: {i}/{len(chunks)} -> 失败 [HTTP {result.get('status')}]")
-            
-            # 保存原始响应
-            raw_path = self.log_dir / f"raw_{provider_name.replace('(', '_').replace(')', '_')}_part{i}.json"
-            self._write_text(raw_path, json.dumps(result, ensure_ascii=False, indent=2))
-            # 同步一份到 outputs 归档
-            out_raw = OUTPUT_DIR / raw_path.name
-            self._write_text(out_raw, json.dumps(result, ensure_ascii=False, indent=2))
-            
-            # 轻微节流，避免触发速率限制
-            time.sleep(0.3)
-        
-        # 聚合收敛
-        print(f"[experts] {provider_name} 聚合收敛 -> 请求中...")
-        summary_prompt = generate_summary_prompt(provider_type, chunk_results)
-        
-        summary_messages = [
-            {'role': 'system', 'content': summary_prompt['system_prompt']},
-            {'role': 'user', 'content': summary_prompt['user_message']},
-        ]
+                chunk_results[i - 1] = reused
+        if len(pending) < len(chunks):
+            print(f"[experts] {provider_name} 复用未变化切片 {len(chunks) - len(pending)}/{len(chunks)}，"
+                  f"待分析 {len(pending)} 段")
+        done = len(chunks) - len(pending)
+        if self.report is not None:
+            self.report.chunk_progress(provider_name, done, len(chunks), STAGE_ANALYZING)
+        with ThreadPoolExecutor(max_workers=max(1, min(limiter.max_in_flight, len(pending) or 1)),
+                                thread_name_prefix=f"chunk-{provider_type}") as executor:
+            futures = [
+                executor.submit(self._process_chunk, provider, limiter, i, chunks)
+                for i in pending
+            ]
+            for future in as_completed(futures):
+                i, text = future.result()
+                chunk_results[i - 1] = text
+                done += 1
+                if self.report is not None:
+                    self.report.chunk_progress(provider_name, done, len(chunks), STAGE_ANALYZING)
+        print(f"[experts] {provider_name} 限流统计: {limiter.snapshot()}")
         
-        # 调用聚合接口
-        final_result = call_ai_provider(
-            provider, 
-            summary_messages, 
-            STREAM_ENABLED, 
-            {'temperature': 0.2}
-        )
+        # 聚合收敛：分组并发归约，逐层收敛到最终一次聚合
+        if self.report is not None:
+            self.report.chunk_progress(provider_name, done, len(chunks), STAGE_REDUCING)
+        final_result, reduce_depth = self._reduce_summaries(provider, limiter, chunk_results)
         
         if final_result.get('ok'):
             final_content = str(final_result.get('content') or '').strip()
@@ -120,15 +134,173 @@ class ExpertCollaboration:
             'chunks_processed': len(chunks),
             'total_chunks': len(chunks),
             'chunk_results': chunk_results,
+            'reduce_depth': reduce_depth,
             'raw_final': final_result
         }
     
+    def _summary_call(self, provider: Dict[str, str], limiter: ProviderLimiter,
+                      prompt: Dict[str, Any]) -> Dict[str, Any]:
+        """发送一次聚合/归约请求（同样计入该提供商的限流额度与熔断器）。"""
+        messages = [
+            {'role': 'system', 'content': prompt['system_prompt']},
+            {'role': 'user', 'content': prompt['user_message']},
+        ]
+        breaker = self.health.breaker(provider)
+        if not breaker.allow():
+            return _circuit_open_result()
+        with limiter.slot(estimate_request_tokens(messages)) as outcome:
+            result = call_ai_provider(
+                provider, 
+                messages, 
+                self.use_streaming, 
+                {'temperature': 0.2, '_queue_wait_sec': round(outcome['queue_wait_sec'], 4)}
+            )
+            outcome['status'] = result.get('status') or 0
+            outcome['retry_after'] = (result.get('net') or {}).get('retry_after')
+        breaker.record(not is_failure_status(result.get('status') or 0))
+        return result
+    
+    def _reduce_summaries(self, provider: Dict[str, str], limiter: ProviderLimiter,
+                          outputs: List[str]) -> Tuple[Dict[str, Any], int]:
+        """分层归约：按该模型的 token 预算把分段结果分组，各组并发合并为一段；
+        逐层重复直到只剩一组，再做最终聚合。返回 (最终聚合结果, 中间归约层数)。"""
+        provider_name = provider['name']
+        provider_type = provider.get('provider_type', 'unknown')
+        budget = reduce_token_budget(provider)
+        level = list(outputs)
+        depth = 0
+        while True:
+            groups = group_outputs_by_tokens(level, budget)
+            if len(groups) <= 1:
+                break
+            depth += 1
+            print(f"[experts] {provider_name} 聚合收敛 -> 第 {depth} 层归约：{len(level)} 段 -> {len(groups)} 组")
+            next_level = [g[0] if len(g) == 1 else '' for g in groups]   # 单段组直接进入下一层
+            merge = [j for j, g in enumerate(groups) if len(g) > 1]
+            with ThreadPoolExecutor(max_workers=max(1, min(limiter.max_in_flight, len(merge))),
+                                    thread_name_prefix=f"reduce-{provider_type}") as executor:
+                futures = {
+                    executor.submit(self._reduce_group, provider, limiter, groups[j], budget, depth, j + 1): j
+                    for j in merge
+                }
+                for future in as_completed(futures):
+                    next_level[futures[future]] = future.result()
+            level = next_level
+        
+        print(f"[experts] {provider_name} 聚合收敛 -> 请求中...")
+        summary_prompt = generate_summary_prompt(provider_type, fit_outputs_to_budget(level, budget))
+        return self._summary_call(provider, limiter, summary_prompt), depth
+    
+    def _reduce_group(self, provider: Dict[str, str], limiter: ProviderLimiter, group: List[str],
+                      budget: int, level: int, index: int) -> str:
+        """合并一组输出；失败时保留该组原文节选，不丢信息。"""
+        prompt = generate_partial_summary_prompt(provider.get('provider_type', 'unknown'),
+                                                 fit_outputs_to_budget(group, budget), level, index)
+        result = self._summary_call(provider, limiter, prompt)
+        if result.get('ok'):
+            return str(result.get('content') or '').strip()
+        print(f"[experts] {provider['name']} 第 {level} 层第 {index} 组归约失败 [HTTP {result.get('status')}]，保留原文节选")
+        return '\n\n'.join(fit_outputs_to_budget(group, budget // 2))
+    
+    def _reuse_chunk(self, provider: Dict[str, str], i: int, chunks: List[str]) -> Optional[str]:
+        """增量分析：若该切片内容与上次会议相同且已有成功结果，直接返回该结果。"""
+        if self.manifest is None:
+            return None
+        prompt_data = generate_expert_prompt(provider.get('provider_type', 'unknown'), i, len(chunks), chunks[i - 1])
+        reused = self.manifest.lookup(provider, chunks[i - 1], prompt_data['system_prompt'])
+        if reused is not None:
+            print(f"[experts] {provider['name']} 进度: {i}/{len(chunks)} -> 未变化，复用上次结果")
+        return reused
+    
+    def _chunk_messages(self, provider: Dict[str, str], i: int,
+                        chunks: List[str]) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+        """按提供商的专家角色生成第 i 个分段的提示词与消息。"""
+        prompt_data = generate_expert_prompt(provider.get('provider_type', 'unknown'), i, len(chunks), chunks[i - 1])
+        messages = [
+            {'role': 'system', 'content': prompt_data['system_prompt']},
+            {'role': 'user', 'content': prompt_data['user_message']},
+        ]
+        return prompt_data, messages
+    
+    def _process_chunk(self, provider: Dict[str, str], limiter: ProviderLimiter,
+                       i: int, chunks: List[str]) -> Tuple[int, str]:
+        """处理单个分段：取得限流许可后请求，429 时按 Retry-After 退让并重排队。"""
+        provider_name = provider['name']
+        
+        # 生成专家特定的提示词
+        prompt_data, messages = self._chunk_messages(provider, i, chunks)
+        est_tokens = estimate_request_tokens(messages)
+        breaker = self.health.breaker(provider)
+        result: Dict[str, Any] = {'ok': False, 'status': 0, 'raw': 'NO_ATTEMPT', 'content': ''}
+        
+        # 429 只在这里处理：客户端在 _limited 下立即返回 429，由限流器退让后重排队
+        for attempt in range(1, self.max_attempts + 1):
+            # 熔断打开时立即跳过，不占用限流名额
+            if not breaker.allow():
+                result = _circuit_open_result()
+                break
+            with limiter.slot(est_tokens) as outcome:
+                print(f"[experts] {provider_name} 进度: {i}/{len(chunks)} -> 请求中...")
+                # 调用AI提供商
+                extra = {
+                    '_queue_wait_sec': round(outcome['queue_wait_sec'], 4),
+                    '_retry': attempt - 1,
+                    '_limited': True,
+                }
+                if self.hedger is not None:
+                    # 备用提供商按其自身的专家角色重建提示词
+                    result = self.hedger.call(call_ai_provider, provider, messages, self.use_streaming, extra,
+                                              build_messages=lambda p: self._chunk_messages(p, i, chunks)[1])
+                else:
+                    result = call_ai_provider(provider, messages, self.use_streaming, extra)
+                # 只以主提供商自身的结果归还其许可（对冲时胜者可能是备用方）
+                hedge = result.get('hedge')
+                if hedge is not None:
+                    outcome['status'] = hedge['primary_status']
+                    outcome['retry_after'] = hedge['primary_retry_after']
+                else:
+                    outcome['status'] = result.get('status') or 0
+                    outcome['retry_after'] = (result.get('net') or {}).get('retry_after')
+            result['queue_wait_sec'] = round(outcome['queue_wait_sec'], 3)
+            if (result.get('hedge') or {}).get('winner', provider_name) == provider_name:
+                breaker.record(not is_failure_status(outcome['status']))
+            if result.get('ok') or outcome['status'] != 429 or attempt == self.max_attempts:
+                break
+            print(f"[experts] {provider_name} 进度: {i}/{len(chunks)} -> 触发限流 429，"
+                  f"重排队（{attempt}/{self.max_attempts}）")
+        
+        if result.get('ok'):
+            text = str(result.get('content') or '').strip()
+            print(f"[experts] {provider_name} 进度: {i}/{len(chunks)} -> 成功")
+            if self.manifest is not None:
+                self.manifest.record(provider, chunks[i - 1], prompt_data['system_prompt'], text)
+        else:
+            text = f"[ERROR {result.get('status')}] {result.get('raw')}"
+            print(f"[experts] {provider_name} 进度: {i}/{len(chunks)} -> 失败 [HTTP {result.get('status')}]")
+        
+        # 保存原始响应（后台写入 LOG_DIR，并链接到 outputs 归档，不阻塞请求线程）
+        self.log_writer.submit(f"raw_{provider_name.replace('(', '_').replace(')', '_')}_part{i}.json", result)
+        return i, text
+    
     def run_parallel_meeting(self, chunks: List[str]) -> Dict[str, Any]:
         """运行并行专家会议，所有专家同时处理文档。"""
         print(f"[experts] 启动并行专家会议，提供商数量: {len(self.providers)}")
         
-        # 使用线程池并行处理
-        with ThreadPoolExecutor(max_workers=min(len(self.providers), 3)) as executor:
+        # 并发探测所有端点（短超时，TTL 内复用上次结果；熔断打开的直接跳过）
+        # 磁带回放不访问网络：视所有提供商可用，也不写回健康状态
+        cassette = get_cassette()
+        replaying = cassette is not None and cassette.mode == REPLAY
+        if replaying:
+            self.available = {p['name']: True for p in self.providers}
+            print(f"[experts] 磁带回放: {cassette.path}（{cassette.pace}），跳过端点探测")
+        else:
+            self.available = self.health.probe_all(self.providers, probe_endpoint_reachable)
+            hs = self.health.snapshot()
+            print(f"[experts] 端点探测: 可用 {sum(self.available.values())}/{len(self.providers)}"
+                  f"（实际探测 {hs['probed']}，缓存命中 {hs['probe_cache_hits']}，熔断跳过 {hs['skipped_open']}）")
+        
+        # 使用线程池并行处理（各提供商独立限流，互不占用彼此的并发额度）
+        with ThreadPoolExecutor(max_workers=max(1, len(self.providers))) as executor:
             # 提交所有任务
             future_to_provider = {
                 executor.submit(self.process_provider_parallel, provider, chunks): provider
@@ -151,7 +323,26 @@ class ExpertCollaboration:
                         'chunks_processed': 0,
                         'total_chunks': len(chunks)
                     }
+                # 增量纪要：该提供商完成即追加其章节，不等待其它提供商
+                if self.report is not None:
+                    self.report.provider_done(provider['name'], self.meeting_results[provider['name']])
+        
+        if self.hedger is not None:
+            hs = self.hedger.snapshot()
+            print(f"[experts] 对冲请求: 分段 {hs['calls']} 次，对冲 {hs['hedged']} 次（备用胜出 {hs['hedge_wins']}，"
+                  f"主请求胜出 {hs['primary_wins']}，预算拒绝 {hs['budget_denied']}）")
         
+        if not replaying:
+            try:
+                self.health.save()
+            except OSError as e:
+                print(f"[experts] 健康状态写入失败: {e}")
+        
+        # 等待后台日志全部落盘
+        self.log_writer.close()
+        ws = self.log_writer.snapshot()
+        print(f"[experts] 原始响应日志: 写入 {ws['written']} 个（批次 {ws['batches']}，压缩 {ws['compressed']}，"
+              f"归档链接 {ws['linked']}/复制 {ws['copied']}，失败 {ws['errors']}）")
         return self.meeting_results
     
     def generate_collaboration_summary(self) -> Dict[str, Any]:
@@ -170,21 +361,22 @@ class ExpertCollaboration:
                 'recommendations': []
             }
         
-        # 分析专家输出，寻找共识和分歧
-        consensus_points = []
+        # 分析专家输出：逐条抽取 TODO/风险，MinHash/LSH 聚类近重复项，按支持专家数区分共识与独特见解
+        clustered = build_consensus({name: self.meeting_results[name].get('content', '')
+                                     for name in successful_providers})
         conflict_points = []
-        unique_insights = []
-        
-        # 这里可以添加更复杂的分析逻辑
-        # 目前简化处理，主要关注TODO项目的重叠度
+        ds = clustered['stats']
+        print(f"[experts] 共识分析: 条目 {ds['items']}，聚为 {ds['clusters']} 簇（候选对 {ds['candidate_pairs']}），"
+              f"共识 {ds['consensus']}，独特见解 {ds['unique']}")
         
         return {
             'status': 'success',
             'successful_experts': successful_providers,
             'total_experts': len(self.providers),
-            'consensus': consensus_points,
+            'consensus': clustered['consensus'],
             'conflicts': conflict_points,
-            'unique_insights': unique_insights,
+            'unique_insights': clustered['unique_insights'],
+            'dedup': ds,
             'collaboration_score': len(successful_providers) / len(self.providers)
         }
     
@@ -211,6 +403,10 @@ class ExpertCollaboration:
         path.write_text(content, encoding='utf-8')
 
 
+def _circuit_open_result() -> Dict[str, Any]:
+    return {'ok': False, 'status': 0, 'raw': 'CIRCUIT_OPEN', 'content': ''}
+
+
 def create_meeting_summary(meeting_results: Dict[str, Any], collaboration_summary: Dict[str, Any]) -> List[str]:
     """创建结构化的会议纪要。"""
     meeting_lines = []
@@ -232,10 +428,11 @@ def create_meeting_summary(meeting_results: Dict[str, Any], collaboration_summar
     if collaboration_summary.get('status') == 'success':
         meeting_lines.append("\n## 专家协作总结\n")
         
+        total = collaboration_summary.get('total_experts', 0)
         if collaboration_summary.get('consensus'):
             meeting_lines.append("### 专家共识\n")
             for consensus in collaboration_summary['consensus']:
-                meeting_lines.append(f"- {consensus}\n")
+                meeting_lines.append(f"- {format_item(consensus, total)}\n")
         
         if collaboration_summary.get('conflicts'):
             meeting_lines.append("### 专家分歧\n")
@@ -245,7 +442,7 @@ def create_meeting_summary(meeting_results: Dict[str, Any], collaboration_summar
         if collaboration_summary.get('unique_insights'):
             meeting_lines.append("### 独特见解\n")
             for insight in collaboration_summary['unique_insights']:
-                meeting_lines.append(f"- {insight}\n")
+                meeting_lines.append(f"- {format_item(insight, total)}\n")
     
     return meeting_lines
 
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器对冲请求模块
+
+功能：
+1. 按提供商记录首 token 时间（TTFT），以其分位数（默认 p95）作为对冲触发阈值
+2. 主请求超过阈值仍未产出首 token 时，把同一消息发给另一个已配置的提供商（备用模型）
+3. 先产出首 token 的一方胜出，另一方被取消（立即关闭其连接，释放连接池与限流名额）
+4. 对冲预算：对冲次数不超过主请求数的一定比例，控制额外开销
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Any, Optional
+from config import get_settings
+from connection_pool import CancelToken
+from metrics import percentile
+from rate_limiter import get_limiter, estimate_request_tokens
+
+
+HEDGE_MIN_SAMPLES: int = 20     # 样本数不足时使用固定的初始阈值
+HEDGE_SAMPLE_WINDOW: int = 200  # 每个提供商只保留最近的样本
+
+
+class LatencyTracker:
+    """各提供商最近的 TTFT 样本（线程安全）。"""
+
+    def __init__(self, window: int = HEDGE_SAMPLE_WINDOW):
+        self.window = window
+        self._samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, ttft_sec: Optional[float]) -> None:
+        if ttft_sec is None:
+            return
+        with self._lock:
+            samples = self._samples.setdefault(name, [])
+            samples.append(ttft_sec)
+            if len(samples) > self.window:
+                del samples[:len(samples) - self.window]
+
+    def quantile(self, name: str, q: float, default: float) -> float:
+        with self._lock:
+            samples = list(self._samples.get(name, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return default
+        return percentile(samples, q)
+
+
+class HedgeBudget:
+    """对冲预算：已对冲次数 + 1 ≤ 比例 × 主请求数 + 1（允许最先的一次突发）。"""
+
+    def __init__(self, ratio: float):
+        self.ratio = max(0.0, ratio)
+        self._lock = threading.Lock()
+        self.primary = 0
+        self.hedged = 0
+
+    def note_primary(self) -> None:
+        with self._lock:
+            self.primary += 1
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.ratio <= 0 or self.hedged + 1 > self.ratio * self.primary + 1:
+                return False
+            self.hedged += 1
+            return True
+
+
+class Hedger:
+    """对冲请求调度器：每场会议一个实例，在所有提供商之间共享 TTFT 统计与预算。"""
+
+    def __init__(self, providers: List[Dict[str, str]], percentile_q: Optional[float] = None,
+                 budget_ratio: Optional[float] = None, initial_delay_sec: Optional[float] = None,
+                 is_available: Optional[Callable[[Dict[str, str]], bool]] = None):
+        settings = get_settings()
+        self.providers = providers
+        self.is_available = is_available  # 如熔断器未打开
+        self.percentile_q = settings.hedge_percentile if percentile_q is None else percentile_q
+        self.initial_delay_sec = settings.hedge_initial_delay_sec if initial_delay_sec is None else initial_delay_sec
+        self.budget = HedgeBudget(settings.hedge_budget if budget_ratio is None else budget_ratio)
+        self.tracker = LatencyTracker()
+        self._excluded: set = set()
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'hedged': 0, 'hedge_wins': 0, 'primary_wins': 0,
+                      'budget_denied': 0, 'no_backup': 0}
+
+    def exclude(self, provider_name: str) -> None:
+        """不再把对冲请求发给该提供商（如端点不可达）。"""
+        with self._lock:
+            self._excluded.add(provider_name)
+
+    def hedge_delay(self, provider: Dict[str, str]) -> float:
+        return self.tracker.quantile(provider['name'], self.percentile_q, self.initial_delay_sec)
+
+    def pick_backup(self, provider: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """选择首 token 中位数最快的其它提供商作为备用。"""
+        with self._lock:
+            candidates = [p for p in self.providers
+                          if p['name'] != provider['name'] and p['name'] not in self._excluded]
+        if self.is_available is not None:
+            candidates = [p for p in candidates if self.is_available(p)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda p: self.tracker.quantile(p['name'], 50, self.initial_delay_sec))
+
+    def _bump(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def call(self, call_fn: Callable[..., Dict[str, Any]], provider: Dict[str, str], messages: list[dict],
+             use_streaming: bool, extra: Dict[str, Any],
+             build_messages: Optional[Callable[[Dict[str, str]], list]] = None) -> Dict[str, Any]:
+        """发出主请求；超过阈值未见首 token 时（预算允许）向备用提供商发出对冲请求，返回先响应者的结果。
+
+        call_fn 与 call_ai_provider 签名相同。build_messages(备用提供商) 为备用方重建提示词
+        （未给出时沿用主请求的消息）。主请求在调用方线程持有的限流许可下发出，对冲请求另行取得
+        备用提供商的限流许可。结果附带 result['hedge'] 描述本次对冲情况，其中 primary_status /
+        primary_retry_after 是主请求自身的结果（被取消时为 0），调用方据此归还主提供商的许可。
+        """
+        self._bump('calls')
+        self.budget.note_primary()
+        race = _Race(call_fn, use_streaming, extra)
+        race.start(provider, messages, limited=False)
+        delay = self.hedge_delay(provider)
+        deadline = time.monotonic() + delay
+        hedge_checked = False
+
+        while True:
+            timeout = None
+            if not hedge_checked and race.winner is None and len(race.racers) == 1:
+                timeout = max(0.0, deadline - time.monotonic())
+            event = race.next_event(timeout)
+            if event is None:
+                backup = self.pick_backup(provider)
+                if backup is None:
+                    self._bump('no_backup')
+                elif not self.budget.try_acquire():
+                    self._bump('budget_denied')
+                else:
+                    self._bump('hedged')
+                    race.start(backup, build_messages(backup) if build_messages is not None else messages,
+                               limited=True)
+                    print(f"[experts] {provider['name']} 首 token 超过 {delay:.2f}s，对冲请求 -> {backup['name']}")
+                hedge_checked = True
+                continue
+            result = race.handle(event)
+            if result is not None:
+                break
+
+        winner = race.racers[race.winner]
+        if race.winner == 0:
+            if result.get('ok'):
+                self.tracker.record(provider['name'], _ttft(result, race.elapsed(0)))
+            if len(race.racers) > 1:
+                self._bump('primary_wins')
+        else:
+            self._bump('hedge_wins')
+            # 只记录观测到的 TTFT；被取消的主请求没有真实样本，不计入（避免阈值被截断值抬高）
+            self.tracker.record(winner['provider']['name'], _ttft(result, race.elapsed(race.winner)))
+        primary = race.racers[0].get('result') or {}
+        result['hedge'] = {
+            'hedged': len(race.racers) > 1,
+            'delay_sec': round(delay, 3),
+            'winner': winner['provider']['name'],
+            'primary_status': primary.get('status') or 0,
+            'primary_retry_after': (primary.get('net') or {}).get('retry_after'),
+        }
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self.stats)
+        s['budget_ratio'] = self.budget.ratio
+        s['percentile'] = self.percentile_q
+        return s
+
+
+def _ttft(result: Dict[str, Any], elapsed: float) -> float:
+    return (result.get('net') or {}).get('ttft_sec') or elapsed
+
+
+class _Race:
+    """一次对冲竞速：每个参赛请求在独立线程运行，首 token / 完成事件经队列汇总到调用方线程。"""
+
+    def __init__(self, call_fn: Callable[..., Dict[str, Any]], use_streaming: bool, extra: Dict[str, Any]):
+        self.call_fn = call_fn
+        self.use_streaming = use_streaming
+        self.extra = extra
+        self.events: "queue.Queue[tuple]" = queue.Queue()
+        self.racers: List[Dict[str, Any]] = []
+        self.winner: Optional[int] = None
+        self.failed: Dict[int, Dict[str, Any]] = {}
+
+    def start(self, provider: Dict[str, str], messages: list[dict], limited: bool) -> None:
+        idx = len(self.racers)
+        cancel = CancelToken()
+        self.racers.append({'provider': provider, 'cancel': cancel, 'started': time.monotonic()})
+        threading.Thread(target=self._run, args=(idx, provider, messages, cancel, limited),
+                         name=f'hedge-{provider["name"]}', daemon=True).start()
+
+    def elapsed(self, idx: int) -> float:
+        return time.monotonic() - self.racers[idx]['started']
+
+    def _run(self, idx: int, provider: Dict[str, str], messages: list[dict],
+             cancel: CancelToken, limited: bool) -> None:
+        extra = {**self.extra, '_cancel': cancel,
+                 '_on_first_token': lambda: self.events.put(('first', idx, None))}
+        try:
+            if limited:
+                with get_limiter(provider).slot(estimate_request_tokens(messages)) as outcome:
+                    if cancel.is_set():
+                        result = {'ok': False, 'status': 0, 'raw': 'CANCELLED', 'content': ''}
+                    else:
+                        extra['_queue_wait_sec'] = round(outcome['queue_wait_sec'], 4)
+                        result = self.call_fn(provider, messages, self.use_streaming, extra)
+                    outcome['status'] = result.get('status') or 0
+                    outcome['retry_after'] = (result.get('net') or {}).get('retry_after')
+            else:
+                result = self.call_fn(provider, messages, self.use_streaming, extra)
+        except Exception as e:
+            result = {'ok': False, 'status': 0, 'raw': f'EXCEPTION: {e}', 'content': ''}
+        self.events.put(('done', idx, result))
+
+    def next_event(self, timeout: Optional[float]) -> Optional[tuple]:
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _crown(self, idx: int) -> None:
+        self.winner = idx
+        for i, racer in enumerate(self.racers):
+            if i != idx:
+                racer['cancel'].cancel()
+
+    def handle(self, event: tuple) -> Optional[Dict[str, Any]]:
+        """处理一个事件；胜者完成时返回其结果。全部失败时返回主请求的失败结果。"""
+        kind, idx, result = event
+        if kind == 'done':
+            self.racers[idx]['result'] = result
+        if self.winner is not None and idx != self.winner:
+            return None   # 已被取消的一方
+        if kind == 'first':
+            if self.winner is None:
+                self._crown(idx)
+            return None
+        # 完成：非流式或缓存命中没有首 token 事件，成功完成即视为先响应
+        if self.winner is None and result.get('ok'):
+            self._crown(idx)
+        if self.winner == idx:
+            return result
+        self.failed[idx] = result
+        if len(self.failed) == len(self.racers):
+            self.winner = 0
+            return self.failed[0]
+        return None
@@ -9,57 +9,100 @@
 2. 实现OpenAI兼容的Chat Completions API调用
 3. 支持流式和非流式响应
 4. 包含重试机制和错误处理
+5. 经 connection_pool 复用 keep-alive 长连接，避免每次请求重新握手
+6. 解析 429/503 的 Retry-After，退避时遵循服务端给出的等待时长
+7. 经 response_cache 复用相同请求的历史响应（流式调用方同样经回显重放）
+8. 每次调用记录结构化请求指标（排队/建连/首 token/总耗时/字节/速率/重试/状态）
+9. 经 cassette 录制请求指纹与原始响应（含 SSE 帧节奏），或离线回放录制内容
 """
 
+import email.utils
 import json
 import time
 import typing as t
 from urllib import request, error
-from config import REQUEST_TIMEOUT_SEC, MAX_TOKENS, MAX_ATTEMPTS, DISABLE_PROXY, ECHO_STREAM, ECHO_STREAM_MODE, ECHO_STREAM_PREFIX
+from config import get_settings, get_model_specific_params
+from connection_pool import pooled_request, finish_response, CancelToken
+from response_cache import get_cache, cache_key, cache_bypassed
+from cassette import get_cassette, replay_entry, RECORD, REPLAY
+from sse_stream import SSEDecoder, SentenceSegmenter, READ_BLOCK_SIZE
+from metrics import get_metrics, build_entry
+from token_estimator import estimate_tokens
 
 
-def http_post_json(url: str, headers: dict, payload: dict, timeout: int = REQUEST_TIMEOUT_SEC) -> tuple[int, dict]:
-    """发送 JSON POST 请求，返回 (状态码, JSON或文本)。出现异常返回 (0, 错误字符串)。"""
+def parse_retry_after(value: t.Any) -> t.Optional[float]:
+    """解析 Retry-After 头（秒数或 HTTP 日期），返回需等待的秒数；缺失或无法解析返回 None。"""
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(str(value)).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def http_post_json(url: str, headers: dict, payload: dict, timeout: t.Optional[int] = None,
+                   net: dict = None, cancel: t.Optional[CancelToken] = None) -> tuple[int, dict]:
+    """发送 JSON POST 请求，返回 (状态码, JSON或文本)。出现异常返回 (0, 错误字符串)。
+    - 经连接池复用 keep-alive 连接；若传入 net 字典，会写入本次的 reused/connect_sec（握手耗时）/pool_wait_sec（池满等待）
+      以及 retry_after（服务端 Retry-After 秒数，没有则为 None）与 bytes（响应体字节数）
+    - 传入 cancel 时请求可被中途取消（返回 (0, 'CANCELLED')）
+    """
     try:
         data = json.dumps(payload).encode('utf-8')
-        req = request.Request(url, data=data, headers={
+        resp, pool, conn, info = pooled_request('POST', url, data, {
             'Content-Type': 'application/json',
             'Accept': 'application/json',
             'User-Agent': 'ExpertsOrchestrator/1.0 (+https://local)',
-            'Connection': 'close',
+            'Connection': 'keep-alive',
             **headers,
-        })
-        # 可选禁用代理，避免环境代理导致长时间阻塞
-        opener = request.build_opener(request.ProxyHandler({})) if DISABLE_PROXY else request.build_opener()
-        with opener.open(req, timeout=timeout) as resp:
-            raw = resp.read()
-            ctype = resp.headers.get('Content-Type', '')
-            if 'application/json' in ctype:
-                return resp.status, json.loads(raw.decode('utf-8', errors='ignore'))
-            return resp.status, raw.decode('utf-8', errors='ignore')
-    except error.HTTPError as e:
+        }, timeout=timeout, cancel=cancel)
+        if net is not None:
+            net.update(info)
+            net['retry_after'] = parse_retry_after(resp.headers.get('Retry-After'))
         try:
-            body = e.read().decode('utf-8', errors='ignore')
-        except Exception:
-            body = str(e)
-        return e.code or 0, body
+            raw = resp.read()
+        finally:
+            finish_response(resp, pool, conn, cancel=cancel)
+        if net is not None:
+            net['bytes'] = len(raw)
+        text = raw.decode('utf-8', errors='ignore')
+        if resp.status >= 400:
+            return resp.status, text
+        ctype = resp.headers.get('Content-Type', '')
+        if 'application/json' in ctype:
+            return resp.status, json.loads(text)
+        return resp.status, text
     except Exception as e:  # noqa: B902 - 兼容较老解释器
+        if cancel is not None and cancel.is_set():
+            return 0, 'CANCELLED'
         return 0, f'EXCEPTION: {e}'
 
 
 def openai_compatible_chat(base_url: str, api_key: str, model: str, messages: list[dict], extra: dict = None) -> dict:
-    """调用 OpenAI 兼容的 Chat Completions 接口，带退避重试，返回统一结构。"""
+    """调用 OpenAI 兼容的 Chat Completions 接口，带退避重试，返回统一结构。
+
+    extra['_limited'] 为真表示调用方持有限流许可并自行处理 429：此时 429 立即返回，
+    不在持有许可期间睡眠重试，由限流器据此退让后重排队。
+    """
     url = base_url.rstrip('/') + '/chat/completions'
+    max_attempts = get_settings().max_attempts
     payload = {
         'model': model,
         'messages': messages,
         'temperature': 0.3,
         'stream': False,
-        'max_tokens': MAX_TOKENS,
+        'max_tokens': get_settings().max_tokens,
     }
     if extra:
         # 过滤掉以 '_' 开头的本地扩展参数（不发送给服务端）
         payload.update({k: v for k, v in extra.items() if not str(k).startswith('_')})
+    payload['stream'] = False  # 非流式接口：模型参数里的 stream=True 不能带过来，否则返回 SSE 无法按 JSON 解析
+    cancel = (extra or {}).get('_cancel')
+    limited = bool((extra or {}).get('_limited'))
 
     transient_statuses = {0, 408, 429, 500, 502, 503, 504}
     attempt = 0
@@ -67,9 +110,15 @@ def openai_compatible_chat(base_url: str, api_key: str, model: str, messages: li
     last_status: int = 0
     last_data: t.Any = ''
     
-    while attempt < MAX_ATTEMPTS:
-        status, data = http_post_json(url, headers={'Authorization': f'Bearer {api_key}'}, payload=payload)
+    net: dict = {}
+    while attempt < max_attempts:
+        status, data = http_post_json(url, headers={'Authorization': f'Bearer {api_key}'}, payload=payload,
+                                      net=net, cancel=cancel)
         last_status, last_data = status, data
+        if data == 'CANCELLED':
+            return {'ok': False, 'status': 0, 'raw': 'CANCELLED', 'content': '', 'net': net}
+        if status == 429 and limited:
+            return {'ok': False, 'status': status, 'raw': data, 'content': '', 'net': net}
         
         if status and isinstance(data, dict):
             try:
@@ -79,28 +128,56 @@ def openai_compatible_chat(base_url: str, api_key: str, model: str, messages: li
                     'status': status,
                     'raw': data,
                     'content': content,
+                    'net': net,
                 }
             except Exception:
                 # 非标准返回结构，若非临时性错误则直接返回
                 if status not in transient_statuses:
-                    return {'ok': False, 'status': status, 'raw': data, 'content': ''}
+                    return {'ok': False, 'status': status, 'raw': data, 'content': '', 'net': net}
         else:
             # 非 JSON 或异常，若非临时性则直接返回
             if status not in transient_statuses:
-                return {'ok': False, 'status': status, 'raw': data, 'content': ''}
+                return {'ok': False, 'status': status, 'raw': data, 'content': '', 'net': net}
 
         attempt += 1
-        print(f"[experts] 重试第 {attempt}/{MAX_ATTEMPTS} 次（状态 {status}），退避 {backoff_sec:.1f}s")
-        time.sleep(backoff_sec)
+        net['retries'] = attempt
+        # 429/503 若带 Retry-After，至少等待服务端要求的时长
+        wait_sec = max(backoff_sec, net.get('retry_after') or 0.0)
+        print(f"[experts] 重试第 {attempt}/{max_attempts} 次（状态 {status}），退避 {wait_sec:.1f}s")
+        time.sleep(wait_sec)
         backoff_sec *= 1.6
 
-    return {'ok': False, 'status': last_status, 'raw': last_data, 'content': ''}
+    return {'ok': False, 'status': last_status, 'raw': last_data, 'content': '', 'net': net}
+
+
+class StreamEcho:
+    """流式回显：跨帧聚合增量文本，按句子终止符逐句打印到终端（设置 echo_stream* 控制）。"""
+
+    def __init__(self, echo_tag: str = ''):
+        settings = get_settings()
+        self.enabled = settings.echo_stream and settings.echo_stream_mode != 'off'
+        self.prefix = (echo_tag or '[GPT-TEAM] ') if settings.echo_stream_prefix else ''
+        self.segmenter = SentenceSegmenter()  # 增量切句，避免逐字符/逐词刷屏
+
+    def feed(self, text: str) -> None:
+        if not self.enabled:
+            return
+        for s in self.segmenter.push(text):
+            print(self.prefix + s, flush=True)
+
+    def flush(self) -> None:
+        tail = self.segmenter.flush()
+        if self.enabled and tail:
+            print(self.prefix + tail, flush=True)
 
 
 def openai_compatible_chat_streaming(base_url: str, api_key: str, model: str, messages: list[dict], extra: dict = None) -> dict:
     """以流式（SSE）方式调用 Chat Completions，逐行解析 data 帧，聚合 content 返回。
     - 兼容 OpenAI/DeepSeek/DashScope 的 SSE 增量格式（choices[0].delta.content 或 message）
     - 若中途超时但已有增量内容，则视为 ok=True 并返回已聚合文本
+    - 对冲请求：extra['_on_first_token'] 在收到首个内容增量时回调；extra['_cancel']（CancelToken）
+      取消时立即关闭连接，返回 raw='CANCELLED'
+    - 录制：extra['_frames'] 为列表时追加每个内容增量 [相对请求开始的秒数, 文本]
     """
     url = base_url.rstrip('/') + '/chat/completions'
     payload = {
@@ -108,41 +185,59 @@ def openai_compatible_chat_streaming(base_url: str, api_key: str, model: str, me
         'messages': messages,
         'temperature': 0.3,
         'stream': True,
-        'max_tokens': MAX_TOKENS,
+        'max_tokens': get_settings().max_tokens,
     }
     echo_tag = ''
+    on_first_token = cancel = frames = None
     if extra:
         echo_tag = str(extra.get('_echo_tag', '') or '')
+        on_first_token = extra.get('_on_first_token')
+        cancel = extra.get('_cancel')
+        frames = extra.get('_frames')
         payload.update({k: v for k, v in extra.items() if not str(k).startswith('_')})
     
     data = json.dumps(payload).encode('utf-8')
-    req = request.Request(url, data=data, headers={
+    headers = {
         'Content-Type': 'application/json',
         'Accept': 'text/event-stream',
         'User-Agent': 'ExpertsOrchestrator/1.0 (+https://local)',
-        'Connection': 'close',
+        'Connection': 'keep-alive',
         'Authorization': f'Bearer {api_key}',
-    })
+    }
     
-    opener = request.build_opener(request.ProxyHandler({})) if DISABLE_PROXY else request.build_opener()
     accum: list[str] = []
-    line_buffer: str = ''  # 持续累计的行缓冲，避免逐字符/逐词刷屏
+    echo = StreamEcho(echo_tag)
     status_code: int = 0
+    net: dict = {}
     
+    t0 = time.perf_counter()
     try:
-        with opener.open(req, timeout=REQUEST_TIMEOUT_SEC) as resp:
-            status_code = getattr(resp, 'status', 200)
-            # 按行读取 SSE
-            while True:
-                line_bytes = resp.readline()
-                if not line_bytes:
-                    break
-                line = line_bytes.decode('utf-8', errors='ignore').strip('\r\n')
-                if not line:
-                    continue  # keep-alive 空行
-                if line.startswith('data:'):
-                    payload_str = line[len('data:'):].strip()
+        resp, pool, conn, info = pooled_request('POST', url, data, headers, cancel=cancel)
+        net.update(info)
+        net['bytes'] = 0
+        net['retry_after'] = parse_retry_after(resp.headers.get('Retry-After'))
+        status_code = resp.status
+        if status_code >= 400:
+            try:
+                raw_bytes = resp.read()
+                net['bytes'] = len(raw_bytes)
+                raw = raw_bytes.decode('utf-8', errors='ignore')
+            finally:
+                finish_response(resp, pool, conn, cancel=cancel)
+            return {'ok': False, 'status': status_code, 'raw': raw, 'content': '', 'net': net}
+        completed = False
+        try:
+            # 按块读取 SSE，由解码器增量切出 data 行
+            decoder = SSEDecoder()
+            while not completed:
+                block = resp.read1(READ_BLOCK_SIZE)
+                net['bytes'] += len(block)
+                if cancel is not None and cancel.is_set():
+                    return {'ok': False, 'status': status_code, 'raw': 'CANCELLED', 'content': ''.join(accum), 'net': net}
+                payloads = decoder.feed(block) if block else decoder.close()
+                for payload_str in payloads:
                     if payload_str == '[DONE]':
+                        completed = True
                         break
                     try:
                         frame = json.loads(payload_str)
@@ -156,70 +251,49 @@ def openai_compatible_chat_streaming(base_url: str, api_key: str, model: str, me
                             piece = msg.get('content')
                         if piece:
                             text = str(piece)
+                            if not accum:
+                                net['ttft_sec'] = round(time.perf_counter() - t0, 4)
+                                if on_first_token is not None:
+                                    on_first_token()
                             accum.append(text)
+                            if frames is not None:
+                                frames.append([time.perf_counter() - t0, text])
                             # 可选在终端直接回显专家讨论（跨帧聚合到句子级别）
-                            if ECHO_STREAM and ECHO_STREAM_MODE != 'off':
-                                import re
-                                # 归一空白并拼接到全局缓冲
-                                normalized = re.sub(r"\s+", " ", text)
-                                line_buffer += normalized
-                                # 检测句子终止符或换行
-                                sentences: list[str] = []
-                                buf = ''
-                                for ch in line_buffer:
-                                    buf += ch
-                                    if ch in '。！？!?；;\n':
-                                        sentences.append(buf.strip())
-                                        buf = ''
-                                # 剩余部分回填到缓冲（不立即打印）
-                                line_buffer = buf
-                                # 打印已完成句子
-                                if sentences:
-                                    prefix = (echo_tag or '[GPT-TEAM] ') if ECHO_STREAM_PREFIX else ''
-                                    for s in sentences:
-                                        if s:
-                                            print(prefix + s, flush=True)
-                                # 安全阈值：若缓冲过长也强制换行
-                                if len(line_buffer) >= 160:
-                                    prefix = (echo_tag or '[GPT-TEAM] ') if ECHO_STREAM_PREFIX else ''
-                                    print(prefix + line_buffer.strip(), flush=True)
-                                    line_buffer = ''
+                            echo.feed(text)
                     except Exception:
                         # 忽略无法解析的增量帧
                         continue
-    except error.HTTPError as he:
-        try:
-            raw = he.read().decode('utf-8', errors='ignore')
-        except Exception:
-            raw = str(he)
-        return {'ok': False, 'status': he.code or 0, 'raw': raw, 'content': ''.join(accum)}
+                if not block:
+                    break
+        finally:
+            # 正常收尾（[DONE]）读尽剩余字节后归还连接复用；中途异常则直接关闭该连接
+            finish_response(resp, pool, conn, drain=completed, cancel=cancel)
     except Exception as e:
+        if cancel is not None and cancel.is_set():
+            return {'ok': False, 'status': status_code, 'raw': 'CANCELLED', 'content': ''.join(accum), 'net': net}
         # 若已有增量内容则视为成功，缓解长响应导致的超时
         if accum:
-            return {'ok': True, 'status': status_code or 200, 'raw': 'STREAM_PARTIAL', 'content': ''.join(accum)}
+            return {'ok': True, 'status': status_code or 200, 'raw': 'STREAM_PARTIAL', 'content': ''.join(accum), 'net': net}
         # 输出缓冲尾巴
-        if ECHO_STREAM and line_buffer.strip():
-            prefix = (echo_tag or '[GPT-TEAM] ') if ECHO_STREAM_PREFIX else ''
-            print(prefix + line_buffer.strip(), flush=True)
-        return {'ok': False, 'status': 0, 'raw': f'EXCEPTION: {e}', 'content': ''}
+        echo.flush()
+        return {'ok': False, 'status': 0, 'raw': f'EXCEPTION: {e}', 'content': '', 'net': net}
 
     # 输出缓冲尾巴
-    if ECHO_STREAM and line_buffer.strip():
-        prefix = (echo_tag or '[GPT-TEAM] ') if ECHO_STREAM_PREFIX else ''
-        print(prefix + line_buffer.strip(), flush=True)
-    return {'ok': True, 'status': status_code or 200, 'raw': 'STREAM_OK', 'content': ''.join(accum)}
+    echo.flush()
+    return {'ok': True, 'status': status_code or 200, 'raw': 'STREAM_OK', 'content': ''.join(accum), 'net': net}
 
 
-def probe_endpoint_reachable(base_url: str, timeout: int = REQUEST_TIMEOUT_SEC) -> bool:
-    """快速探测端点可达性：对 chat/completions 发送 HEAD 请求。
+def probe_endpoint_reachable(base_url: str, timeout: t.Optional[float] = None) -> bool:
+    """快速探测端点可达性：对 chat/completions 发送 HEAD 请求（默认使用短超时 probe_timeout_sec）。
     - 任意 HTTP 状态码(>=100)均视为可达（含 405/404）。
     - 仅在网络异常/超时返回 False。
     """
     try:
         url = base_url.rstrip('/') + '/chat/completions'
         req = request.Request(url, method='HEAD')
-        opener = request.build_opener(request.ProxyHandler({})) if DISABLE_PROXY else request.build_opener()
-        with opener.open(req, timeout=timeout) as resp:
+        settings = get_settings()
+        opener = request.build_opener(request.ProxyHandler({})) if settings.disable_proxy else request.build_opener()
+        with opener.open(req, timeout=timeout or settings.probe_timeout_sec) as resp:
             return bool(getattr(resp, 'status', 200))
     except error.HTTPError as e:
         return True  # HTTP 层返回，视为网络连通
@@ -235,7 +309,6 @@ def call_ai_provider(provider: dict, messages: list[dict], use_streaming: bool =
     provider_type = provider.get('provider_type', 'unknown')
     
     # 获取模型特定参数
-    from config import get_model_specific_params
     model_params = get_model_specific_params(provider_type, model)
     
     # 合并额外参数
@@ -260,8 +333,72 @@ def call_ai_provider(provider: dict, messages: list[dict], use_streaming: bool =
     echo_tag = f"{color}[GPT-TEAM|{provider_label}]{COLOR_RESET} "
     model_params.setdefault('_echo_tag', echo_tag)
     
+    streaming = use_streaming and model_params.get('stream', True)
+    started, t0 = time.time(), time.perf_counter()
+    
+    # 录制/回放：回放时完全不访问网络与缓存；录制时记录最终结果（含缓存命中）与流式帧节奏
+    cassette = get_cassette()
+    key = ''
+    if cassette is not None:
+        key = cache_key(base_url, model, messages, model_params)
+        if cassette.mode == REPLAY:
+            result = _replay(cassette, key, streaming, echo_tag, model_params)
+            _record_metrics(provider, streaming, model_params, result, started, t0)
+            return result
+        if streaming:
+            model_params['_frames'] = []
+    
+    # 响应缓存：相同请求直接复用，流式调用方经同一回显路径重放缓存内容
+    cache = get_cache()
+    if cache and not key:
+        key = cache_key(base_url, model, messages, model_params)
+    if cache and not cache_bypassed(model_params):
+        cached = cache.get(key)
+        if cached is not None:
+            if streaming:
+                echo = StreamEcho(echo_tag)
+                echo.feed(str(cached.get('content') or ''))
+                echo.flush()
+            result = {**cached, 'net': {}, 'cache': 'hit'}
+            if cassette is not None and cassette.mode == RECORD:
+                cassette.record(key, streaming, result, None, time.perf_counter() - t0)
+            _record_metrics(provider, streaming, model_params, result, started, t0)
+            return result
+    
     # 根据配置选择调用方式
-    if use_streaming and model_params.get('stream', True):
-        return openai_compatible_chat_streaming(base_url, api_key, model, messages, model_params)
+    if streaming:
+        result = openai_compatible_chat_streaming(base_url, api_key, model, messages, model_params)
     else:
-        return openai_compatible_chat(base_url, api_key, model, messages, model_params)
+        result = openai_compatible_chat(base_url, api_key, model, messages, model_params)
+    # 仅缓存完整成功的响应（中途断开的 STREAM_PARTIAL 不缓存）
+    if cache and result.get('ok') and result.get('raw') != 'STREAM_PARTIAL':
+        try:
+            cache.put(key, result)
+        except OSError as e:
+            print(f"[experts] 响应缓存写入失败: {e}")
+    result['cache'] = 'miss' if cache else 'off'
+    if cassette is not None and cassette.mode == RECORD and result.get('raw') != 'CANCELLED':
+        cassette.record(key, streaming, result, model_params.get('_frames'), time.perf_counter() - t0)
+    _record_metrics(provider, streaming, model_params, result, started, t0)
+    return result
+
+
+def _replay(cassette, key: str, streaming: bool, echo_tag: str, params: dict) -> dict:
+    """从磁带回放一次调用；未录制的请求返回 CASSETTE_MISS 失败结果（不回退到网络）。"""
+    entry = cassette.take(key)
+    if entry is None:
+        return {'ok': False, 'status': 0, 'raw': 'CASSETTE_MISS', 'content': '', 'net': {}, 'cache': 'cassette'}
+    echo = StreamEcho(echo_tag) if streaming else None
+    result = replay_entry(entry, cassette.pace, echo.feed if echo else (lambda text: None),
+                          params.get('_on_first_token'), params.get('_cancel'))
+    if echo is not None:
+        echo.flush()
+    result['cache'] = 'cassette'
+    return result
+
+
+def _record_metrics(provider: dict, streaming: bool, params: dict, result: dict, started: float, t0: float) -> None:
+    """记录本次调用的请求指标（写入 LOG_DIR/request_metrics.ndjson）。"""
+    duration = time.perf_counter() - t0
+    tokens = estimate_tokens(str(result.get('content') or ''))
+    get_metrics().record(build_entry(provider, streaming, params, result, started, duration, tokens))
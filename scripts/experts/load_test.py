@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器压测脚本
+
+功能：
+1. 启动 N 个本地模拟提供商（mock_server.MockProviderServer，各占一个端口/连接池/限流器）
+2. 用 M 段合成文档驱动 MainOrchestrator.run_meeting，全程离线
+3. 汇总吞吐、请求与分段延迟 p50/p95/p99、重试次数、服务端状态分布、限流与连接池统计
+
+用法：
+    python load_test.py --providers 3 --chunks 40 --latency 0.3 --burst-every 15 --disconnect-rate 0.05
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Any
+
+import expert_collaboration
+from config import Settings, configure
+from main_orchestrator import MainOrchestrator
+from connection_pool import pool_stats, close_all_pools
+from rate_limiter import get_limiter
+from mock_server import MockProviderServer, add_behavior_args, behavior_from_args
+from metrics import percentile
+
+
+class CallRecorder:
+    """包装 call_ai_provider，记录每次逻辑调用的耗时与结果（线程安全）。"""
+
+    def __init__(self, target):
+        self.target = target
+        self.lock = threading.Lock()
+        self.records: List[Dict[str, Any]] = []
+
+    def __call__(self, provider, messages, use_streaming=True, extra_params=None):
+        t0 = time.perf_counter()
+        result = self.target(provider, messages, use_streaming, extra_params)
+        with self.lock:
+            self.records.append({
+                'provider': provider['name'],
+                'sec': time.perf_counter() - t0,
+                'status': result.get('status'),
+                'ok': bool(result.get('ok')),
+                'partial': result.get('raw') == 'STREAM_PARTIAL',
+            })
+        return result
+
+
+class ChunkTimer:
+    """包装 ExpertCollaboration._process_chunk，记录每个分段的端到端耗时（含限流排队、429 重排队与对冲）。"""
+
+    def __init__(self):
+        self.target = expert_collaboration.ExpertCollaboration._process_chunk
+        self.lock = threading.Lock()
+        self.samples: List[float] = []
+
+    def install(self) -> None:
+        timer = self
+
+        def timed(collab, *args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return timer.target(collab, *args, **kwargs)
+            finally:
+                with timer.lock:
+                    timer.samples.append(time.perf_counter() - t0)
+
+        expert_collaboration.ExpertCollaboration._process_chunk = timed
+
+    def uninstall(self) -> None:
+        expert_collaboration.ExpertCollaboration._process_chunk = self.target
+
+
+def synthetic_chunks(m: int, chars: int = 1200) -> List[str]:
+    return [f'## 第 {i} 段\n\n' + ('压测文本内容。' * (chars // 7)) for i in range(1, m + 1)]
+
+
+def load_test_settings(stream: bool = True, root: str = None, hedge: bool = False) -> Settings:
+    """每轮压测独立的设置：日志写入临时目录；默认不读写响应缓存、不做增量复用、不回显，
+    确保每段都真实发出请求（环境变量显式设置时以环境为准）。"""
+    env = dict(os.environ)
+    env.setdefault('MEETING_CACHE', 'false')
+    env.setdefault('MEETING_INCREMENTAL', 'false')
+    env.setdefault('MEETING_ECHO_STREAM', 'false')
+    env['MEETING_STREAM'] = 'true' if stream else 'false'
+    if hedge:
+        env['MEETING_HEDGE'] = 'true'
+    env.setdefault('MEETING_REPO_ROOT', root or tempfile.mkdtemp(prefix='experts_load_test_'))
+    return Settings(env=env)
+
+
+def run_load_test(n_providers: int, m_chunks: int, behavior, stream: bool = True,
+                  hedge: bool = False) -> Dict[str, Any]:
+    settings = configure(load_test_settings(stream, hedge=hedge))
+    servers = [MockProviderServer(behavior).start() for _ in range(n_providers)]
+    providers = [{
+        'name': f'Mock{i}',
+        'base': s.base_url,
+        'key': 'sk-mock',
+        'model': 'mock-chat',
+        'provider_type': 'deepseek',
+    } for i, s in enumerate(servers, 1)]
+
+    recorder = CallRecorder(expert_collaboration.call_ai_provider)
+    expert_collaboration.call_ai_provider = recorder
+    chunk_timer = ChunkTimer()
+    chunk_timer.install()
+    orchestrator = MainOrchestrator()
+    orchestrator.providers = providers
+    orchestrator.document_chunks = synthetic_chunks(m_chunks)
+    t0 = time.perf_counter()
+    try:
+        orchestrator.run_meeting()
+    finally:
+        wall = time.perf_counter() - t0
+        expert_collaboration.call_ai_provider = recorder.target
+        chunk_timer.uninstall()
+        server_stats = {p['name']: s.stats() for p, s in zip(providers, servers)}
+        limiter_stats = {p['name']: get_limiter(p).snapshot() for p in providers}
+        pools = pool_stats()
+        close_all_pools()
+        for s in servers:
+            s.stop()
+
+    lat = [r['sec'] for r in recorder.records]
+    server_requests = sum(s['requests'] for s in server_stats.values())
+    ok = sum(1 for r in recorder.records if r['ok'])
+    return {
+        'providers': n_providers,
+        'chunks': m_chunks,
+        'stream': stream,
+        'hedge': orchestrator.hedge_stats,
+        'log_dir': str(settings.log_dir),
+        'wall_sec': round(wall, 3),
+        'logical_calls': len(recorder.records),
+        'ok_calls': ok,
+        'partial_calls': sum(1 for r in recorder.records if r['partial']),
+        'failed_calls': len(recorder.records) - ok,
+        'server_requests': server_requests,
+        'retries': server_requests - len(recorder.records),
+        'throughput_calls_per_sec': round(len(recorder.records) / wall, 2) if wall else 0.0,
+        'latency_sec': {
+            'p50': round(percentile(lat, 50), 3),
+            'p95': round(percentile(lat, 95), 3),
+            'p99': round(percentile(lat, 99), 3),
+            'max': round(max(lat), 3) if lat else 0.0,
+        },
+        'chunk_latency_sec': {
+            'p50': round(percentile(chunk_timer.samples, 50), 3),
+            'p95': round(percentile(chunk_timer.samples, 95), 3),
+            'p99': round(percentile(chunk_timer.samples, 99), 3),
+            'max': round(max(chunk_timer.samples), 3) if chunk_timer.samples else 0.0,
+        },
+        'server': server_stats,
+        'limiters': limiter_stats,
+        'pools': pools,
+        'meeting_status': {name: r.get('status') for name, r in orchestrator.meeting_results.items()},
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description='专家编排器离线压测（本地模拟提供商）')
+    ap.add_argument('--providers', type=int, default=3, help='模拟提供商数量 N')
+    ap.add_argument('--chunks', type=int, default=20, help='文档切片数量 M')
+    ap.add_argument('--no-stream', action='store_true', help='使用非流式 JSON 接口')
+    ap.add_argument('--hedge', action='store_true', help='开启对冲请求（MEETING_HEDGE）')
+    add_behavior_args(ap)
+    args = ap.parse_args()
+    report = run_load_test(args.providers, args.chunks, behavior_from_args(args),
+                           stream=not args.no_stream, hedge=args.hedge)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器后台日志写入模块
+
+功能：
+1. 单一后台线程 + 队列：请求线程只负责入队，序列化与磁盘 I/O 全部在后台完成
+2. 每条记录只序列化一次、只写一次：写入 LOG_DIR 后以硬链接（跨设备时复制）同步到 OUTPUT_DIR 归档
+3. 批量处理：一次唤醒尽量取空队列，合并小写入
+4. 可选压缩：超过阈值的大响应写为 .json.gz
+5. 退出前 flush（atexit 兜底），保证日志不丢
+"""
+
+import atexit
+import gzip
+import json
+import os
+import pathlib
+import queue
+import shutil
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from config import get_settings
+
+
+_STOP = object()
+
+
+class LogWriter:
+    """后台批量日志写入器。submit() 非阻塞；flush() 等待已提交的记录全部落盘。"""
+
+    def __init__(self, log_dir: Optional[pathlib.Path] = None, archive_dir: Optional[pathlib.Path] = None,
+                 compress_min_bytes: Optional[int] = None, batch_size: int = 64):
+        """未指定的目录/阈值取当前设置（log_dir / output_dir / log_compress_min_bytes）。"""
+        settings = get_settings()
+        self.log_dir = pathlib.Path(log_dir or settings.log_dir)
+        self.archive_dir = pathlib.Path(archive_dir or settings.output_dir)
+        self.compress_min_bytes = settings.log_compress_min_bytes if compress_min_bytes is None else compress_min_bytes
+        self.batch_size = max(1, batch_size)
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.stats = {'submitted': 0, 'written': 0, 'batches': 0, 'bytes': 0,
+                      'compressed': 0, 'linked': 0, 'copied': 0, 'errors': 0}
+        atexit.register(self.close)  # 兜底：进程退出前写完队列
+
+    # ------------------------------------------------------------------ 提交
+    def submit(self, name: str, obj: Any) -> None:
+        """提交一条 JSON 记录（文件名相对 log_dir）。对象在后台序列化，调用方之后不应再修改它。"""
+        self._ensure_started()
+        self._queue.put((name, obj))
+
+    def flush(self) -> None:
+        """阻塞直到已提交的记录全部写完。"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        """flush 后停止后台线程（可再次 submit，会自动重启）。"""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _ensure_started(self) -> None:
+        with self._start_lock:
+            self.stats['submitted'] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='experts-log-writer', daemon=True)
+                self._thread.start()
+
+    # ------------------------------------------------------------------ 后台
+    def _run(self) -> None:
+        while True:
+            batch: List[Tuple[str, Any]] = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            try:
+                self.stats['batches'] += 1
+                for item in batch:
+                    if item is _STOP:
+                        stop = True
+                    else:
+                        self._write(*item)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, name: str, obj: Any) -> None:
+        try:
+            data = json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+            path = self.log_dir / name
+            if self.compress_min_bytes and len(data) >= self.compress_min_bytes:
+                path = path.with_name(path.name + '.gz')
+                data = gzip.compress(data, compresslevel=5)
+                self.stats['compressed'] += 1
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+            self.stats['written'] += 1
+            self.stats['bytes'] += len(data)
+            if self.archive_dir is not None:
+                self._archive(path)
+        except Exception as e:  # 日志失败不影响会议流程
+            self.stats['errors'] += 1
+            print(f"[experts] 日志写入失败 {name}: {e}")
+
+    def _archive(self, path: pathlib.Path) -> None:
+        """同步到归档目录：优先硬链接（零拷贝），跨设备或不支持时复制。"""
+        target = self.archive_dir / path.relative_to(self.log_dir)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if target.exists():
+                target.unlink()
+            os.link(path, target)
+            self.stats['linked'] += 1
+        except OSError:
+            shutil.copyfile(path, target)
+            self.stats['copied'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        s = dict(self.stats)
+        s['pending'] = self._queue.unfinished_tasks
+        return s
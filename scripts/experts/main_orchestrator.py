@@ -18,12 +18,12 @@ from config import (
     load_environment_config, 
     get_provider_configs, 
     mask_secret, 
-    LOG_DIR
+    get_settings
 )
 from document_processor import (
     collect_doc_text, 
-    split_text_for_chunks, 
-    create_meeting_template,
+    split_text_by_tokens,
+    split_text_content_defined,
     validate_document_content
 )
 from expert_collaboration import (
@@ -31,18 +31,34 @@ from expert_collaboration import (
     create_meeting_summary, 
     validate_meeting_results
 )
+from connection_pool import pool_stats, close_all_pools
+from response_cache import cache_stats
+from chunk_manifest import ChunkManifest
+from corpus import CorpusLoader
+from token_estimator import estimate_tokens, chunk_token_budget
+from metrics import get_metrics
+from meeting_report import MeetingReport
+from consensus import format_item
+from cassette import get_cassette, cassette_stats
 
 
 class MainOrchestrator:
     """主编排器，负责协调整个专家会议流程。"""
     
     def __init__(self):
+        self.settings = get_settings()  # 本次会议的设置（日志目录、时间戳等在首次使用时确定）
         self.env_config = {}
         self.providers = []
         self.document_content = ""
         self.document_chunks = []
         self.meeting_results = {}
         self.collaboration_summary = {}
+        self.manifest = None
+        self.corpus = None
+        self.chunk_diff = {}
+        self.hedge_stats = {}
+        self.health_stats = {}
+        self.report = None
         
     def initialize(self) -> bool:
         """初始化编排器，加载配置和检查环境。"""
@@ -63,26 +79,50 @@ class MainOrchestrator:
             for provider in self.providers:
                 print(f"  - {provider['name']} @ {provider['base']}")
             
-            # 加载文档内容
-            self.document_content = collect_doc_text()
-            if not self.document_content:
-                print("[experts] 错误：无法读取项目报告文档")
-                return False
-            
-            # 验证文档内容
-            doc_validation = validate_document_content(self.document_content)
-            if not doc_validation['is_valid']:
-                print(f"[experts] 文档验证失败: {doc_validation['errors']}")
-                return False
-            
-            if doc_validation['warnings']:
-                print(f"[experts] 文档验证警告: {doc_validation['warnings']}")
+            # 加载文档内容：配置了 MEETING_CORPUS 时读取多文档语料（段落流直接交给切片），否则读取主报告
+            if self.settings.corpus_patterns:
+                self.corpus = CorpusLoader(self.settings.corpus_patterns)
+                source = self.corpus.paragraphs()
+                print(f"[experts] 多文档语料: {', '.join(self.settings.corpus_patterns)}")
+            else:
+                self.document_content = collect_doc_text()
+                if not self.document_content:
+                    print("[experts] 错误：无法读取项目报告文档")
+                    return False
+                
+                # 验证文档内容
+                doc_validation = validate_document_content(self.document_content)
+                if not doc_validation['is_valid']:
+                    print(f"[experts] 文档验证失败: {doc_validation['errors']}")
+                    return False
+                
+                if doc_validation['warnings']:
+                    print(f"[experts] 文档验证警告: {doc_validation['warnings']}")
+                
+                print(f"[experts] 文档加载成功，长度: {len(self.document_content)} 字符")
+                source = self.document_content
             
-            print(f"[experts] 文档加载成功，长度: {len(self.document_content)} 字符")
+            # 文档切片：按各模型共同的 token 预算打包段落
+            # （增量模式使用内容定义切片，局部编辑不会让后续切片整体位移）
+            budget = chunk_token_budget(self.providers)
+            if self.settings.incremental_enabled:
+                self.document_chunks = split_text_content_defined(
+                    source, max_chars=budget, min_chars=budget // 2, size=estimate_tokens)
+                self.manifest = ChunkManifest()
+                self.chunk_diff = self.manifest.diff(self.document_chunks)
+                print(f"[experts] 文档切片完成，共 {len(self.document_chunks)} 段（每段 ≤{budget} tokens），"
+                      f"新增/修改 {len(self.chunk_diff['changed'])} 段，未变化 {self.chunk_diff['unchanged']} 段")
+            else:
+                self.document_chunks = split_text_by_tokens(source, budget, self.settings.chunk_overlap_tokens)
+                print(f"[experts] 文档切片完成，共 {len(self.document_chunks)} 段（每段 ≤{budget} tokens）")
             
-            # 文档切片
-            self.document_chunks = split_text_for_chunks(self.document_content, max_chars=7000)
-            print(f"[experts] 文档切片完成，共 {len(self.document_chunks)} 段")
+            if self.corpus is not None:
+                cs = self.corpus.snapshot()
+                print(f"[experts] 语料读取: 文件 {cs['files']}，读取 {cs['read']}（mmap {cs['mmapped']}，"
+                      f"{cs['bytes']} 字节），未变化跳过 {cs['skipped']}，重复段落 {cs['duplicates']}，失败 {cs['errors']}")
+                if not self.document_chunks:
+                    print("[experts] 语料自上次会议以来没有新增/修改的文件，无需分析")
+                    return False
             
             return True
             
@@ -99,25 +139,58 @@ class MainOrchestrator:
             f"ANTHROPIC_API_KEY={mask_secret(self.env_config.get('ANTHROPIC_API_KEY',''))}\n"
         )
         
-        secrets_path = LOG_DIR / 'secrets_masked.txt'
+        secrets_path = self.settings.log_dir / 'secrets_masked.txt'
         secrets_path.parent.mkdir(parents=True, exist_ok=True)
         secrets_path.write_text(secrets_snapshot, encoding='utf-8')
         print(f"[experts] 密钥快照已写入: {secrets_path}")
     
     def run_meeting(self) -> bool:
         """运行专家会议。"""
-        print(f"[experts] 开始专家会议，日志目录: {LOG_DIR}")
+        print(f"[experts] 开始专家会议，日志目录: {self.settings.log_dir}")
         
         try:
             # 写入密钥快照
             self.write_secrets_snapshot()
             
+            # 增量会议纪要：先写出骨架，各提供商完成后立即追加其章节
+            self.report = MeetingReport(self.settings.log_dir / 'meeting.md', self.providers,
+                                        len(self.document_chunks))
+            self.report.start()
+            
             # 创建专家协作管理器
-            collaboration_manager = ExpertCollaboration(self.providers, LOG_DIR)
+            collaboration_manager = ExpertCollaboration(self.providers, self.settings.log_dir, self.manifest,
+                                                        self.report)
             
             # 运行并行专家会议
             print("[experts] 启动专家协作分析...")
             self.meeting_results = collaboration_manager.run_parallel_meeting(self.document_chunks)
+            self.health_stats = collaboration_manager.health.snapshot()
+            if collaboration_manager.hedger is not None:
+                self.hedge_stats = collaboration_manager.hedger.snapshot()
+            
+            # 保存切片清单，供下次会议增量复用
+            if self.manifest is not None:
+                try:
+                    self.manifest.save()
+                except OSError as e:
+                    print(f"[experts] 切片清单写入失败: {e}")
+            # 录制的磁带在会议结束时落盘（进程退出时另有兜底）
+            cassette = get_cassette()
+            if cassette is not None:
+                try:
+                    cassette.save()
+                except OSError as e:
+                    print(f"[experts] 磁带写入失败: {e}")
+                cs = cassette.snapshot()
+                print(f"[experts] 磁带（{cs['mode']}）: 录制 {cs['recorded']}，回放 {cs['replayed']}，"
+                      f"未命中 {cs['misses']}，指纹 {cs['keys']}")
+            
+            # 语料文件清单：会议完成后才登记，失败的会议下次仍会重新分析这些文件
+            if self.corpus is not None:
+                try:
+                    self.corpus.save_manifest()
+                except OSError as e:
+                    print(f"[experts] 语料清单写入失败: {e}")
             
             # 生成协作总结
             self.collaboration_summary = collaboration_manager.generate_collaboration_summary()
@@ -133,41 +206,66 @@ class MainOrchestrator:
                 print(f"[experts] 会议结果警告: {validation_result['warnings']}")
             
             print(f"[experts] 专家会议完成，质量评分: {validation_result['quality_score']:.2f}")
+            self.print_connection_stats()
+            self.print_request_metrics()
             return True
             
         except Exception as e:
             print(f"[experts] 专家会议运行失败: {e}")
             return False
     
+    def print_connection_stats(self) -> None:
+        """打印各源站连接池统计：新建/复用次数与握手耗时，直观体现 keep-alive 的节省。"""
+        for origin, s in pool_stats().items():
+            print(f"[experts] 连接池 {origin}: 请求 {s['requests']}，新建 {s['created']}，复用 {s['reused']}，"
+                  f"握手合计 {s['handshake_sec_total']:.3f}s（平均 {s['handshake_ms_avg']}ms），"
+                  f"池满等待 {s['waits']} 次共 {s['wait_sec_total']:.3f}s（上限 {s['maxsize']}，超时 {s['wait_timeouts']}）")
+        cs = cache_stats()
+        if cs:
+            print(f"[experts] 响应缓存: 命中 {cs['hits']}，未命中 {cs['misses']}，写入 {cs['stores']}，"
+                  f"过期 {cs['expired']}，淘汰 {cs['evicted']}")
+    
+    def print_request_metrics(self) -> None:
+        """按提供商打印请求耗时分位数（明细见日志目录下 request_metrics.ndjson）。"""
+        for name, s in get_metrics().summary().items():
+            d, f, q = s['duration_sec'], s['ttft_sec'], s['queue_wait_sec']
+            print(f"[experts] 请求指标 {name}: 请求 {s['requests']}（成功 {s['ok']}，重试 {s['retries']}，"
+                  f"缓存命中 {s['cache_hits']}）总耗时 p50/p95/p99 {d['p50']}/{d['p95']}/{d['p99']}s，"
+                  f"首 token {f['p50']}/{f['p95']}/{f['p99']}s，排队 {q['p50']}/{q['p95']}/{q['p99']}s，"
+                  f"平均 {s['tokens_per_sec_avg']} tokens/s")
+    
     def generate_meeting_report(self) -> bool:
         """生成会议纪要和报告。"""
         print("[experts] 生成会议纪要...")
         
         try:
-            # 创建会议纪要模板
-            meeting_lines = create_meeting_template()
+            # 各专家章节已在会议过程中增量写入；未经 run_meeting 时在此一次补齐
+            if self.report is None:
+                self.report = MeetingReport(self.settings.log_dir / 'meeting.md', self.providers,
+                                            len(self.document_chunks))
+                for provider_name, result in self.meeting_results.items():
+                    self.report.provider_done(provider_name, result)
             
-            # 添加会议结果概览
-            meeting_lines.append(f"## 会议结果概览\n")
+            # 最终一步只追加会议结果概览与协作总结
+            meeting_lines = [f"\n## 会议结果概览\n"]
             meeting_lines.append(f"- 参与专家数量: {self.collaboration_summary.get('total_experts', 0)}")
             meeting_lines.append(f"- 成功完成分析: {len(self.collaboration_summary.get('successful_experts', []))}")
             meeting_lines.append(f"- 协作评分: {self.collaboration_summary.get('collaboration_score', 0):.2f}\n")
             
-            # 添加各专家建议
-            for provider_name, result in self.meeting_results.items():
-                status = result.get('status', 'unknown')
-                content = result.get('content', '')
-                
-                if status == 'success':
-                    meeting_lines.append(f"\n## {provider_name} 的建议\n\n{content}\n")
-                else:
-                    meeting_lines.append(f"\n## {provider_name} 的建议\n\n**状态：{status}**\n\n{content}\n")
-            
             # 添加协作总结
             if self.collaboration_summary.get('status') == 'success':
                 meeting_lines.append("\n## 专家协作总结\n")
                 meeting_lines.append(f"- 成功专家: {', '.join(self.collaboration_summary.get('successful_experts', []))}")
                 meeting_lines.append(f"- 协作评分: {self.collaboration_summary.get('collaboration_score', 0):.2f}")
+                total = self.collaboration_summary.get('total_experts', 0)
+                if self.collaboration_summary.get('consensus'):
+                    meeting_lines.append("\n### 专家共识\n")
+                    for item in self.collaboration_summary['consensus']:
+                        meeting_lines.append(f"- {format_item(item, total)}")
+                if self.collaboration_summary.get('unique_insights'):
+                    meeting_lines.append("\n### 独特见解\n")
+                    for item in self.collaboration_summary['unique_insights']:
+                        meeting_lines.append(f"- {format_item(item, total)}")
             
             # 添加页脚
             anthropic_key = self.env_config.get('ANTHROPIC_API_KEY', '')
@@ -176,12 +274,8 @@ class MainOrchestrator:
             
             meeting_lines.append(f'\n---\n\n*会议纪要生成时间：{dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}*')
             
-            # 写入会议纪要
-            meeting_path = LOG_DIR / 'meeting.md'
-            meeting_path.parent.mkdir(parents=True, exist_ok=True)
-            meeting_path.write_text('\n'.join(meeting_lines), encoding='utf-8')
-            
-            print(f"[experts] 会议纪要已生成: {meeting_path}")
+            self.report.finalize(meeting_lines)
+            print(f"[experts] 会议纪要已生成: {self.report.path}（增量写入 {self.report.snapshot()['writes']} 次）")
             
             # 生成JSON格式的详细报告
             detailed_report = {
@@ -190,15 +284,23 @@ class MainOrchestrator:
                     'total_providers': len(self.providers),
                     'successful_providers': len(self.collaboration_summary.get('successful_experts', [])),
                     'collaboration_score': self.collaboration_summary.get('collaboration_score', 0),
-                    'document_chunks': len(self.document_chunks)
+                    'document_chunks': len(self.document_chunks),
+                    'changed_chunks': self.chunk_diff.get('changed', list(range(1, len(self.document_chunks) + 1)))
                 },
                 'providers': self.providers,
                 'meeting_results': self.meeting_results,
                 'collaboration_summary': self.collaboration_summary,
+                'connection_pools': pool_stats(),
+                'response_cache': cache_stats(),
+                'cassette': cassette_stats(),
+                'request_metrics': get_metrics().summary(),
+                'corpus': self.corpus.snapshot() if self.corpus is not None else {},
+                'hedging': self.hedge_stats,
+                'provider_health': self.health_stats,
                 'validation': validate_meeting_results(self.meeting_results)
             }
             
-            report_path = LOG_DIR / 'detailed_report.json'
+            report_path = self.settings.log_dir / 'detailed_report.json'
             import json
             report_path.write_text(json.dumps(detailed_report, ensure_ascii=False, indent=2), encoding='utf-8')
             
@@ -228,8 +330,9 @@ class MainOrchestrator:
             print("[experts] 报告生成失败")
             return False
         
+        close_all_pools()
         print("[experts] ===== 专家团队会议完成 =====")
-        print(f"[experts] 所有文件已保存到: {LOG_DIR}")
+        print(f"[experts] 所有文件已保存到: {self.settings.log_dir}")
         return True
 
 
@@ -257,7 +360,7 @@ def run_meeting() -> None:
                 "- 查看详细错误日志\n"
             ]
             
-            error_path = LOG_DIR / 'error_report.md'
+            error_path = orchestrator.settings.log_dir / 'error_report.md'
             error_path.parent.mkdir(parents=True, exist_ok=True)
             error_path.write_text('\n'.join(error_report), encoding='utf-8')
             print(f"[experts] 错误报告已生成: {error_path}")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器增量会议纪要模块
+
+功能：
+1. 会议开始即写出纪要骨架（模板 + 各提供商进度表），不再等所有提供商完成才落盘
+2. 各提供商分段进度随完成实时更新（节流写入），提供商完成后立即追加其建议章节
+3. 每次写入均为临时文件 + os.replace 原子替换，读者任何时刻看到的都是完整一致的文件
+4. 最终一步只追加协作总结与页脚
+"""
+
+import os
+import pathlib
+import threading
+import time
+from typing import Dict, List, Any
+from document_processor import create_meeting_template, format_expert_section
+
+
+STAGE_PENDING = '等待中'
+STAGE_ANALYZING = '分析中'
+STAGE_REDUCING = '聚合中'
+
+PROGRESS_MIN_INTERVAL_SEC: float = 1.0  # 分段进度的最小落盘间隔；章节与总结总是立即写入
+
+
+class MeetingReport:
+    """增量会议纪要（线程安全）。各提供商线程上报进度/结果，纪要文件随之原子重写。"""
+
+    def __init__(self, path: pathlib.Path, providers: List[Dict[str, str]], total_chunks: int,
+                 min_interval_sec: float = PROGRESS_MIN_INTERVAL_SEC):
+        self.path = pathlib.Path(path)
+        self.min_interval_sec = min_interval_sec
+        self.header = create_meeting_template()
+        self.progress: Dict[str, Dict[str, Any]] = {
+            p['name']: {'stage': STAGE_PENDING, 'done': 0, 'total': total_chunks} for p in providers
+        }
+        self.sections: List[str] = []   # 按完成先后排列
+        self.summary_lines: List[str] = []
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'writes': 0, 'throttled': 0}
+
+    def start(self) -> None:
+        """写出纪要骨架。"""
+        with self._lock:
+            self._write()
+
+    def chunk_progress(self, provider_name: str, done: int, total: int, stage: str = STAGE_ANALYZING) -> None:
+        """更新某提供商的分段进度；距上次写入不足 min_interval_sec 时只更新内存。"""
+        with self._lock:
+            entry = self.progress.setdefault(provider_name, {})
+            entry.update({'stage': stage, 'done': done, 'total': total})
+            if time.monotonic() - self._last_write < self.min_interval_sec:
+                self.stats['throttled'] += 1
+                return
+            self._write()
+
+    def provider_done(self, provider_name: str, result: Dict[str, Any]) -> None:
+        """某提供商完成（含失败/跳过）：更新进度并立即追加其建议章节。"""
+        status = result.get('status', 'unknown')
+        with self._lock:
+            self.progress[provider_name] = {
+                'stage': status,
+                'done': result.get('chunks_processed', 0),
+                'total': result.get('total_chunks', 0),
+            }
+            self.sections.append(format_expert_section(provider_name, result.get('content', ''), status))
+            self._write()
+
+    def finalize(self, summary_lines: List[str]) -> None:
+        """最终一步：在已有内容之后追加协作总结与页脚。"""
+        with self._lock:
+            self.summary_lines = list(summary_lines)
+            self._write()
+
+    def render(self) -> str:
+        lines = list(self.header)
+        lines.append('## 会议进度\n')
+        lines.append('| 专家 | 状态 | 分段 |')
+        lines.append('| --- | --- | --- |')
+        for name, entry in self.progress.items():
+            lines.append(f"| {name} | {entry.get('stage', STAGE_PENDING)} | {entry.get('done', 0)}/{entry.get('total', 0)} |")
+        lines.extend(self.sections)
+        lines.extend(self.summary_lines)
+        return '\n'.join(lines)
+
+    def _write(self) -> None:
+        """原子重写纪要文件（调用方持有锁）；写入失败只打印，不影响会议本身。"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp.write_text(self.render(), encoding='utf-8')
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[experts] 会议纪要写入失败: {e}")
+            return
+        self._last_write = time.monotonic()
+        self.stats['writes'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats)
+
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器请求指标模块
+
+功能：
+1. 每次 call_ai_provider 记录一条结构化指标：排队等待、建连耗时、首 token 时间（TTFT）、
+   总耗时、接收字节/字符数、tokens/秒、重试次数、最终状态
+2. 逐条追加到 LOG_DIR/request_metrics.ndjson（线程安全，逐行 flush）
+3. 会议结束时按提供商汇总 p50/p95/p99
+"""
+
+import json
+import math
+import threading
+import time
+from typing import Dict, List, Any, Optional
+from config import Settings, get_settings
+
+
+METRICS_FILE_NAME = 'request_metrics.ndjson'
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩百分位（q 取 0~100）。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, math.ceil(q / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+class RequestMetrics:
+    """请求指标收集器：内存保留全部记录用于汇总，同时追加写入 NDJSON。"""
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else get_settings().log_dir / METRICS_FILE_NAME
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._fh = None
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self.records.append(entry)
+            try:
+                if self._fh is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self._fh = open(self.path, 'a', encoding='utf-8')
+                self._fh.write(line + '\n')
+                self._fh.flush()
+            except OSError as e:
+                print(f"[experts] 请求指标写入失败: {e}")
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """按提供商汇总：次数/成功数/重试数/缓存命中 + 各耗时分位数与平均 tokens/秒。"""
+        with self._lock:
+            records = list(self.records)
+        by_provider: Dict[str, List[Dict[str, Any]]] = {}
+        for r in records:
+            by_provider.setdefault(r.get('provider', 'unknown'), []).append(r)
+        out: Dict[str, Dict[str, Any]] = {}
+        for name, rs in by_provider.items():
+            live = [r for r in rs if r.get('cache') != 'hit']
+            s: Dict[str, Any] = {
+                'requests': len(rs),
+                'ok': sum(1 for r in rs if r.get('ok')),
+                'retries': sum(r.get('retries', 0) for r in rs),
+                'cache_hits': len(rs) - len(live),
+                'bytes': sum(r.get('bytes', 0) for r in live),
+            }
+            for field in ('duration_sec', 'ttft_sec', 'queue_wait_sec'):
+                vals = [r[field] for r in live if r.get(field) is not None]
+                s[field] = {f'p{q}': round(percentile(vals, q), 3) for q in (50, 95, 99)}
+            rates = [r['tokens_per_sec'] for r in live if r.get('tokens_per_sec')]
+            s['tokens_per_sec_avg'] = round(sum(rates) / len(rates), 1) if rates else 0.0
+            out[name] = s
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+_METRICS: Optional[RequestMetrics] = None
+_METRICS_SETTINGS: Optional[Settings] = None
+_METRICS_LOCK = threading.Lock()
+
+
+def get_metrics() -> RequestMetrics:
+    """全局指标收集器；生效设置变化（如压测每轮 configure）时换用新的日志目录。"""
+    global _METRICS, _METRICS_SETTINGS
+    settings = get_settings()
+    with _METRICS_LOCK:
+        if _METRICS is None or _METRICS_SETTINGS is not settings:
+            if _METRICS is not None:
+                _METRICS.close()
+            _METRICS = RequestMetrics(settings.log_dir / METRICS_FILE_NAME)
+            _METRICS_SETTINGS = settings
+        return _METRICS
+
+
+def build_entry(provider: Dict[str, str], streaming: bool, params: Dict[str, Any],
+                result: Dict[str, Any], started: float, duration: float, tokens: int) -> Dict[str, Any]:
+    """由一次调用的结果与 net 信息组装指标记录。"""
+    net = result.get('net') or {}
+    ttft = net.get('ttft_sec', duration if result.get('ok') else None)
+    gen_sec = duration - (ttft or 0.0) if streaming else duration
+    # 排队耗时 = 限流器等许可 + 连接池满时等连接归还
+    queue_wait = params.get('_queue_wait_sec')
+    if net.get('pool_wait_sec'):
+        queue_wait = round((queue_wait or 0.0) + net['pool_wait_sec'], 4)
+    return {
+        'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+        'provider': provider.get('name', 'unknown'),
+        'model': provider.get('model'),
+        'mode': 'stream' if streaming else 'json',
+        'cache': result.get('cache'),
+        'status': result.get('status'),
+        'ok': bool(result.get('ok')),
+        'partial': result.get('raw') == 'STREAM_PARTIAL',
+        'queue_wait_sec': queue_wait,
+        'pool_wait_sec': net.get('pool_wait_sec'),
+        'connect_sec': net.get('connect_sec'),
+        'reused_connection': net.get('reused'),
+        'ttft_sec': round(ttft, 4) if ttft is not None else None,
+        'duration_sec': round(duration, 4),
+        'bytes': net.get('bytes', 0),
+        'chars': len(str(result.get('content') or '')),
+        'tokens': tokens,
+        'tokens_per_sec': round(tokens / gen_sec, 1) if tokens and gen_sec > 0 else None,
+        'retries': int(net.get('retries', 0)) + int(params.get('_retry', 0) or 0),
+    }
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器本地模拟服务
+
+功能：
+1. 本地 OpenAI 兼容 /chat/completions 替身，支持 JSON 与 SSE（stream=true）两种返回
+2. 可配置首包延迟、长尾慢请求、输出速度（tokens/秒）、错误率、429 突发（带 Retry-After）、流式中途断连
+3. 统计各状态码次数，供压测脚本 load_test.py 汇总
+
+用法：
+    python mock_server.py --port 18080 --latency 0.2 --tps 300 --error-rate 0.02 --burst-every 20
+    将 DEEPSEEK_BASE_URL 等指向 http://127.0.0.1:18080/v1 即可离线跑通编排器
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+
+
+@dataclass
+class MockBehavior:
+    """模拟行为参数（所有概率取值 0~1）。"""
+    latency: float = 0.2          # 首包延迟（秒）
+    jitter: float = 0.1           # 首包延迟随机抖动上限（秒）
+    tps: float = 400.0            # 输出速度（tokens/秒），0 表示不限速
+    reply_tokens: int = 120       # 每次回复的 token 数（按词近似）
+    error_rate: float = 0.0       # 返回 500 的概率
+    rate_429: float = 0.0         # 随机返回 429 的概率
+    burst_every: int = 0          # 每隔多少个请求触发一次 429 突发（0 关闭）
+    burst_len: int = 3            # 每次突发连续返回 429 的请求数
+    retry_after: float = 1.0      # 429 响应的 Retry-After（秒）
+    disconnect_rate: float = 0.0  # 流式响应中途断开连接的概率
+    straggler_rate: float = 0.0   # 慢请求（长尾）概率
+    straggler_delay: float = 5.0  # 慢请求额外的首包延迟（秒）
+    seed: Optional[int] = None
+
+
+class MockState:
+    """跨请求共享的计数与随机源（线程安全）。"""
+
+    def __init__(self, behavior: MockBehavior):
+        self.behavior = behavior
+        self.rng = random.Random(behavior.seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.burst_left = 0
+        self.stats: Dict[str, int] = {}
+
+    def decide(self, stream: bool) -> str:
+        """为本次请求抽取结果：ok / 429 / 500 / disconnect。"""
+        b = self.behavior
+        with self.lock:
+            self.requests += 1
+            if b.burst_every and self.requests % b.burst_every == 0:
+                self.burst_left = b.burst_len
+            if self.burst_left > 0:
+                self.burst_left -= 1
+                outcome = '429'
+            elif self.rng.random() < b.rate_429:
+                outcome = '429'
+            elif self.rng.random() < b.error_rate:
+                outcome = '500'
+            elif stream and self.rng.random() < b.disconnect_rate:
+                outcome = 'disconnect'
+            else:
+                outcome = 'ok'
+            self.stats[outcome] = self.stats.get(outcome, 0) + 1
+            return outcome
+
+    def first_byte_delay(self) -> float:
+        with self.lock:
+            b = self.behavior
+            delay = b.latency + self.rng.random() * b.jitter
+            if b.straggler_rate and self.rng.random() < b.straggler_rate:
+                delay += b.straggler_delay
+            return delay
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {'requests': self.requests, **self.stats}
+
+
+def _reply_words(messages: list, n: int) -> list[str]:
+    """确定性的回复文本：约 n 个词，夹带句末符以触发回显切句。"""
+    seed = sum(len(str(m.get('content', ''))) for m in messages)
+    words = []
+    for i in range(n):
+        words.append(f'w{(seed + i) % 97}')
+        if i % 12 == 11:
+            words.append('。')
+    return words
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):  # 安静模式
+            pass
+
+        def _send_json(self, status: int, obj: dict, extra_headers: Optional[dict] = None) -> None:
+            body = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for k, v in (extra_headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _chunk(self, data: bytes) -> None:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.flush()
+
+        def do_HEAD(self):
+            self.send_response(405)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def do_POST(self):
+            try:
+                self._handle_post()
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True   # 客户端主动断开（如对冲请求被取消）
+
+        def _handle_post(self):
+            length = int(self.headers.get('Content-Length', 0) or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._send_json(400, {'error': {'message': 'invalid json'}})
+                return
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send_json(404, {'error': {'message': f'unknown path {self.path}'}})
+                return
+            stream = bool(body.get('stream'))
+            outcome = state.decide(stream)
+            b = state.behavior
+            if outcome == '429':
+                self._send_json(429, {'error': {'message': 'rate limited (mock)'}},
+                                {'Retry-After': f'{b.retry_after:g}'})
+                return
+            time.sleep(state.first_byte_delay())
+            if outcome == '500':
+                self._send_json(500, {'error': {'message': 'internal error (mock)'}})
+                return
+            n = max(1, min(int(body.get('max_tokens') or b.reply_tokens), b.reply_tokens))
+            words = _reply_words(body.get('messages') or [], n)
+            per_word = (1.0 / b.tps) if b.tps > 0 else 0.0
+            if not stream:
+                time.sleep(per_word * len(words))
+                self._send_json(200, {
+                    'id': 'mock', 'object': 'chat.completion', 'model': body.get('model', 'mock'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ' '.join(words)},
+                                 'finish_reason': 'stop'}],
+                    'usage': {'completion_tokens': len(words)},
+                })
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            cut_at = len(words) // 2 if outcome == 'disconnect' else -1
+            for i, w in enumerate(words):
+                if i == cut_at:
+                    self.close_connection = True
+                    self.wfile.flush()
+                    self.connection.shutdown(2)   # 模拟中途断连（不发送结束块）
+                    return
+                frame = {'choices': [{'index': 0, 'delta': {'content': w + ' '}}]}
+                self._chunk(b'data: ' + json.dumps(frame, ensure_ascii=False).encode('utf-8') + b'\n\n')
+                if per_word:
+                    time.sleep(per_word)
+            self._chunk(b'data: [DONE]\n\n')
+            self.wfile.write(b'0\r\n\r\n')
+
+    return Handler
+
+
+class MockProviderServer:
+    """在后台线程运行的模拟服务；port=0 时自动分配端口。"""
+
+    def __init__(self, behavior: Optional[MockBehavior] = None, host: str = '127.0.0.1', port: int = 0):
+        self.state = MockState(behavior or MockBehavior())
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.state))
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self) -> 'MockProviderServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='mock-provider', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.state.snapshot()
+
+
+def add_behavior_args(ap: argparse.ArgumentParser) -> None:
+    """命令行参数 ↔ MockBehavior 字段（load_test.py 复用）。"""
+    d = MockBehavior()
+    ap.add_argument('--latency', type=float, default=d.latency, help='首包延迟（秒）')
+    ap.add_argument('--jitter', type=float, default=d.jitter, help='首包延迟抖动上限（秒）')
+    ap.add_argument('--tps', type=float, default=d.tps, help='输出速度 tokens/秒（0 不限速）')
+    ap.add_argument('--reply-tokens', type=int, default=d.reply_tokens, help='每次回复的 token 数')
+    ap.add_argument('--error-rate', type=float, default=d.error_rate, help='返回 500 的概率')
+    ap.add_argument('--rate-429', type=float, default=d.rate_429, help='随机 429 的概率')
+    ap.add_argument('--burst-every', type=int, default=d.burst_every, help='每 N 个请求触发一次 429 突发')
+    ap.add_argument('--burst-len', type=int, default=d.burst_len, help='突发连续 429 的请求数')
+    ap.add_argument('--retry-after', type=float, default=d.retry_after, help='429 的 Retry-After 秒数')
+    ap.add_argument('--disconnect-rate', type=float, default=d.disconnect_rate, help='流式中途断连概率')
+    ap.add_argument('--straggler-rate', type=float, default=d.straggler_rate, help='慢请求（长尾）概率')
+    ap.add_argument('--straggler-delay', type=float, default=d.straggler_delay, help='慢请求额外首包延迟（秒）')
+    ap.add_argument('--seed', type=int, default=None, help='随机种子（可复现）')
+
+
+def behavior_from_args(args: argparse.Namespace) -> MockBehavior:
+    return MockBehavior(**{k: getattr(args, k) for k in asdict(MockBehavior()) if hasattr(args, k)})
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description='本地 OpenAI 兼容模拟服务（JSON/SSE）')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=18080)
+    add_behavior_args(ap)
+    args = ap.parse_args()
+    server = MockProviderServer(behavior_from_args(args), args.host, args.port)
+    print(f'[mock] 监听 {server.base_url}  行为: {asdict(server.state.behavior)}', flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f'[mock] 统计: {server.stats()}', flush=True)
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
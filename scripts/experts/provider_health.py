@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器提供商健康登记模块
+
+功能：
+1. 会议开始前并发探测所有提供商端点（独立的短超时），不再在各提供商线程内逐个阻塞探测
+2. 探测结果带 TTL 持久化到磁盘，跨次运行复用，TTL 内不重复探测
+3. 每个提供商一个熔断器：连续失败/超时达到阈值即打开，打开期间请求立即跳过；
+   冷却期后进入半开状态，放行一个试探请求，成功则关闭、失败则重新打开
+"""
+
+import json
+import os
+import pathlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Any, Optional
+from config import Settings, get_settings
+
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+def is_failure_status(status: int) -> bool:
+    """计入熔断的失败：网络异常/超时（0）、408 与 5xx。429 由限流器处理，其它 4xx 属请求问题，均不计入。"""
+    return status == 0 or status == 408 or status >= 500
+
+
+class CircuitBreaker:
+    """单个提供商的熔断器（线程安全）。"""
+
+    def __init__(self, failure_threshold: int, open_sec: float,
+                 state: str = CLOSED, failures: int = 0, opened_at: float = 0.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_sec = open_sec
+        self.state = state
+        self.failures = failures
+        self.opened_at = opened_at
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """是否放行一次请求；打开状态冷却期满后转为半开，只放行一个试探请求。"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.state == OPEN and now - self.opened_at >= self.open_sec:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record(self, ok: bool, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            self._trial_in_flight = False
+            if ok:
+                self.state, self.failures = CLOSED, 0
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state, self.opened_at = OPEN, now
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures, 'opened_at': self.opened_at}
+
+
+class HealthRegistry:
+    """提供商健康登记：{base: {'ok', 'at', 'latency_ms'}} 探测缓存 + {name: 熔断器}，可持久化。"""
+
+    def __init__(self, path: pathlib.Path, ttl_sec: float, probe_timeout_sec: float,
+                 failure_threshold: int, open_sec: float):
+        self.path = pathlib.Path(path)
+        self.ttl_sec = ttl_sec
+        self.probe_timeout_sec = probe_timeout_sec
+        self.failure_threshold = failure_threshold
+        self.open_sec = open_sec
+        self.probes: Dict[str, Dict[str, Any]] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self.stats = {'probed': 0, 'probe_cache_hits': 0, 'skipped_open': 0}
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+            self.probes = dict(data.get('probes') or {})
+            for name, b in (data.get('breakers') or {}).items():
+                self.breakers[name] = CircuitBreaker(failure_threshold, open_sec, b.get('state', CLOSED),
+                                                     int(b.get('failures', 0)), float(b.get('opened_at', 0.0)))
+        except (OSError, ValueError):
+            pass
+
+    def breaker(self, provider: Dict[str, str]) -> CircuitBreaker:
+        name = provider.get('name', 'unknown')
+        with self._lock:
+            b = self.breakers.get(name)
+            if b is None:
+                b = self.breakers[name] = CircuitBreaker(self.failure_threshold, self.open_sec)
+            return b
+
+    def _cached_probe(self, base: str, now: float) -> Optional[bool]:
+        with self._lock:
+            entry = self.probes.get(base)
+        if entry and now - float(entry.get('at', 0)) < self.ttl_sec:
+            return bool(entry.get('ok'))
+        return None
+
+    def probe_all(self, providers: List[Dict[str, str]],
+                  probe: Callable[[str, float], bool]) -> Dict[str, bool]:
+        """并发探测（TTL 内复用缓存、熔断打开的直接判为不可用），返回 {提供商名: 是否可用}。
+
+        probe(base_url, timeout) 与 http_client.probe_endpoint_reachable 签名相同。
+        实际探测的结果计入熔断器（半开状态下探测即为试探请求）；缓存命中不重复计入。
+        """
+        now = time.time()
+        result: Dict[str, bool] = {}
+        to_probe: Dict[str, List[Dict[str, str]]] = {}
+        for p in providers:
+            breaker = self.breaker(p)
+            if not breaker.allow(now):
+                result[p['name']] = False
+                self.stats['skipped_open'] += 1
+                continue
+            cached = self._cached_probe(p['base'], now)
+            if cached is not None and breaker.state != HALF_OPEN:   # 半开时必须真实探测作为试探
+                result[p['name']] = cached
+                self.stats['probe_cache_hits'] += 1
+            else:
+                to_probe.setdefault(p['base'], []).append(p)
+        if to_probe:
+            with ThreadPoolExecutor(max_workers=len(to_probe), thread_name_prefix='probe') as executor:
+                futures = {base: executor.submit(self._timed_probe, probe, base) for base in to_probe}
+            for base, future in futures.items():
+                ok, latency_ms = future.result()
+                with self._lock:
+                    self.probes[base] = {'ok': ok, 'at': time.time(), 'latency_ms': latency_ms}
+                self.stats['probed'] += 1
+                for p in to_probe[base]:
+                    result[p['name']] = ok
+                    self.breaker(p).record(ok)
+        return result
+
+    def _timed_probe(self, probe: Callable[[str, float], bool], base: str) -> tuple:
+        t0 = time.perf_counter()
+        try:
+            ok = bool(probe(base, self.probe_timeout_sec))
+        except Exception:
+            ok = False
+        return ok, round((time.perf_counter() - t0) * 1000, 1)
+
+    def save(self) -> None:
+        """原子写入探测缓存与熔断状态，供下次运行复用。"""
+        with self._lock:
+            data = {'probes': dict(self.probes),
+                    'breakers': {name: b.to_dict() for name, b in self.breakers.items()}}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+        os.replace(tmp, self.path)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            s: Dict[str, Any] = dict(self.stats)
+            s['breakers'] = {name: b.to_dict()['state'] for name, b in self.breakers.items()}
+        return s
+
+
+_REGISTRY: Optional[HealthRegistry] = None
+_REGISTRY_SETTINGS: Optional[Settings] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_health_registry() -> HealthRegistry:
+    """全局健康登记（首次使用时读取磁盘缓存；生效设置变化时重建）。"""
+    global _REGISTRY, _REGISTRY_SETTINGS
+    settings = get_settings()
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None or _REGISTRY_SETTINGS is not settings:
+            _REGISTRY = HealthRegistry(settings.health_file, settings.health_ttl_sec, settings.probe_timeout_sec,
+                                       settings.breaker_failures, settings.breaker_open_sec)
+            _REGISTRY_SETTINGS = settings
+        return _REGISTRY
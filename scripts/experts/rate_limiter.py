@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器限流模块
+
+功能：
+1. 每个提供商一组令牌桶：每分钟请求数（RPM）与每分钟 token 数（TPM）
+2. 最大在途请求数（max in-flight）上限
+3. 遇到 429 时按 Retry-After 暂停并乘性降速，成功后逐步恢复（AIMD）
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Any
+from config import Settings, get_settings
+from token_estimator import estimate_tokens
+
+
+class TokenBucket:
+    """连续补充的令牌桶：容量 = 每分钟额度，按 rate/60 每秒补充。"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float, scale: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * scale)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float, scale: float) -> float:
+        """还需等待多少秒才够 amount 个令牌（超过容量的请求按满桶计）。"""
+        self._refill(now, scale)
+        need = min(amount, self.capacity) - self.tokens
+        return 0.0 if need <= 0 else need / max(self.rate * scale, 1e-9)
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class ProviderLimiter:
+    """单个提供商的 RPM/TPM 令牌桶 + 在途上限 + 429 自适应退让。"""
+
+    MIN_SCALE = 0.1
+
+    def __init__(self, name: str, rpm: float, tpm: float, max_in_flight: int):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.in_flight = 0
+        self.scale = 1.0              # 自适应速率系数（429 时减半，成功后缓慢恢复）
+        self.blocked_until = 0.0      # Retry-After 暂停截止（monotonic）
+        self._cond = threading.Condition()
+        self.stats = {'acquired': 0, 'throttled': 0, 'wait_sec_total': 0.0}
+
+    def acquire(self, est_tokens: int) -> float:
+        """阻塞直到可以发出请求；返回等待秒数（排队耗时）。"""
+        t0 = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self.blocked_until - now
+                if self.in_flight >= self.max_in_flight:
+                    wait = max(wait, 0.05) if wait > 0 else None
+                else:
+                    wait = max(wait,
+                               self.requests.wait_time(1, now, self.scale),
+                               self.tokens.wait_time(est_tokens, now, self.scale))
+                    if wait <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(est_tokens)
+                        self.in_flight += 1
+                        break
+                self._cond.wait(wait)
+            waited = time.monotonic() - t0
+            self.stats['acquired'] += 1
+            self.stats['wait_sec_total'] += waited
+        return waited
+
+    def release(self, status: int = 200, retry_after: Optional[float] = None) -> None:
+        """归还在途名额并根据状态调整速率：429 → 暂停 Retry-After 并减速；成功 → 逐步恢复。"""
+        with self._cond:
+            self.in_flight -= 1
+            if status == 429:
+                self.stats['throttled'] += 1
+                self.scale = max(self.MIN_SCALE, self.scale * 0.5)
+                pause = retry_after if retry_after is not None else 2.0 / self.scale
+                self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+            elif 200 <= status < 300:
+                self.scale = min(1.0, self.scale + 0.05)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, est_tokens: int):
+        """with limiter.slot(n) as outcome: ...；在 outcome 中写入 status/retry_after 以驱动自适应。"""
+        outcome: Dict[str, Any] = {'status': 0, 'retry_after': None, 'queue_wait_sec': self.acquire(est_tokens)}
+        try:
+            yield outcome
+        finally:
+            self.release(outcome.get('status') or 0, outcome.get('retry_after'))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            s = dict(self.stats)
+            s.update({'scale': round(self.scale, 3), 'in_flight': self.in_flight})
+        s['wait_sec_total'] = round(s['wait_sec_total'], 3)
+        return s
+
+
+_LIMITERS: Dict[str, ProviderLimiter] = {}
+_LIMITERS_SETTINGS: Optional[Settings] = None
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(provider: Dict[str, str]) -> ProviderLimiter:
+    """按提供商名称取（或创建）限流器；额度来自当前设置的 rate_limits，设置变化时全部重建。"""
+    global _LIMITERS_SETTINGS
+    name = provider.get('name', 'unknown')
+    settings = get_settings()
+    with _LIMITERS_LOCK:
+        if _LIMITERS_SETTINGS is not settings:
+            _LIMITERS.clear()
+            _LIMITERS_SETTINGS = settings
+        lim = _LIMITERS.get(name)
+        if lim is None:
+            limits = settings.rate_limits
+            cfg = limits.get(provider.get('provider_type', ''), limits['default'])
+            lim = _LIMITERS[name] = ProviderLimiter(
+                name, cfg['rpm'], cfg['tpm'], cfg.get('max_in_flight', settings.max_in_flight))
+        return lim
+
+
+def estimate_request_tokens(messages: list[dict], max_tokens: Optional[int] = None) -> int:
+    """一次请求计入 TPM 的 token：输入估算 + 输出上限（默认取设置中的 max_tokens）。"""
+    if max_tokens is None:
+        max_tokens = get_settings().max_tokens
+    return sum(estimate_tokens(str(m.get('content', ''))) for m in messages) + max_tokens
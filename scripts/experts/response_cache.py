@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器响应缓存模块
+
+功能：
+1. 以内容寻址（provider base + model + messages + 服务端参数的 SHA-256）缓存成功的 Chat 响应
+2. 磁盘存储，总大小上限 + LRU 淘汰（命中时刷新文件 mtime 作为最近使用时间）
+3. 过期时间（TTL）与绕过开关（读时跳过缓存，仍写入新结果）
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+from typing import Dict, Optional, Any
+from config import Settings, get_settings
+
+
+# 不影响响应内容、不参与缓存键的参数（stream 只影响传输方式，流式/非流式共享同一条缓存）
+_KEY_EXCLUDED_PARAMS = {'stream'}
+
+
+def cache_key(base_url: str, model: str, messages: list[dict], params: Dict[str, Any]) -> str:
+    """计算缓存键：忽略以 '_' 开头的本地参数与 stream，JSON 规范化后取 SHA-256。"""
+    server_params = {k: v for k, v in params.items()
+                     if not str(k).startswith('_') and k not in _KEY_EXCLUDED_PARAMS}
+    blob = json.dumps({
+        'base': base_url.rstrip('/'),
+        'model': model,
+        'messages': messages,
+        'params': server_params,
+    }, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """磁盘响应缓存：<root>/<key[:2]>/<key>.json。首次使用时扫描一次目录建立索引。"""
+
+    def __init__(self, root: pathlib.Path, max_bytes: int, ttl_sec: float):
+        self.root = pathlib.Path(root)
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self._index: Optional[Dict[str, list]] = None   # key -> [size, last_used]
+        self._total = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'expired': 0, 'evicted': 0}
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.root / key[:2] / f'{key}.json'
+
+    def _load_index(self) -> Dict[str, list]:
+        # 调用方持有 self._lock
+        if self._index is None:
+            self._index, self._total = {}, 0
+            if self.root.exists():
+                for p in self.root.glob('*/*.json'):
+                    try:
+                        st = p.stat()
+                    except OSError:
+                        continue
+                    self._index[p.stem] = [st.st_size, st.st_mtime]
+                    self._total += st.st_size
+        return self._index
+
+    def _drop(self, key: str) -> None:
+        # 调用方持有 self._lock
+        size, _ = self._index.pop(key, (0, 0))
+        self._total -= size
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """命中返回缓存的结果字典；未命中/过期/损坏返回 None。"""
+        with self._lock:
+            index = self._load_index()
+            if key not in index:
+                self.stats['misses'] += 1
+                return None
+            path = self._path(key)
+            try:
+                entry = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                self._drop(key)
+                self.stats['misses'] += 1
+                return None
+            now = time.time()
+            if self.ttl_sec and now - entry.get('created', 0) > self.ttl_sec:
+                self._drop(key)
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            index[key][1] = now
+            try:
+                os.utime(path, (now, now))   # 持久化最近使用时间，供下次运行的 LRU 排序
+            except OSError:
+                pass
+            self.stats['hits'] += 1
+            return entry['result']
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """写入一条结果（原子替换），超出容量时按最近使用时间淘汰最旧的条目。"""
+        entry = {'created': time.time(), 'result': {
+            'ok': result.get('ok'),
+            'status': result.get('status'),
+            'raw': result.get('raw'),
+            'content': result.get('content'),
+        }}
+        data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        path = self._path(key)
+        with self._lock:
+            index = self._load_index()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            if key in index:
+                self._total -= index[key][0]
+            index[key] = [len(data), time.time()]
+            self._total += len(data)
+            self.stats['stores'] += 1
+            if self._total > self.max_bytes:
+                for old in sorted(index, key=lambda k: index[k][1]):
+                    if self._total <= self.max_bytes:
+                        break
+                    if old != key:
+                        self._drop(old)
+                        self.stats['evicted'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self.stats)
+            if self._index is not None:
+                s['entries'] = len(self._index)
+                s['bytes'] = self._total
+        return s
+
+
+_CACHE: Optional[ResponseCache] = None
+_CACHE_SETTINGS: Optional[Settings] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """全局缓存实例（生效设置变化时重建）；MEETING_CACHE=false 时返回 None。"""
+    global _CACHE, _CACHE_SETTINGS
+    settings = get_settings()
+    if not settings.cache_enabled:
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None or _CACHE_SETTINGS is not settings:
+            _CACHE = ResponseCache(settings.cache_dir, settings.cache_max_bytes, settings.cache_ttl_sec)
+            _CACHE_SETTINGS = settings
+        return _CACHE
+
+
+def cache_bypassed(params: Dict[str, Any]) -> bool:
+    """是否跳过读缓存：全局开关 MEETING_CACHE_BYPASS 或单次调用传入 _cache=False。"""
+    return get_settings().cache_bypass or params.get('_cache') is False
+
+
+def cache_stats() -> Dict[str, Any]:
+    return _CACHE.snapshot() if _CACHE is not None else {}
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器流式解析模块
+
+功能：
+1. SSEDecoder：增量解析 SSE 字节流，按大块读取、按字节切行，仅对 data 行解码
+2. SentenceSegmenter：增量句子切分，只扫描新到达的文本（摊还 O(1)/字符），
+   输出与原逐帧全缓冲重扫的实现逐字一致
+"""
+
+import re
+from typing import List
+
+
+READ_BLOCK_SIZE: int = 64 * 1024   # 每次从响应读取的最大字节数（read1 有多少取多少，不等满块）
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_SENTENCE_END_RE = re.compile('[。！？!?；;\n]')
+ECHO_FORCE_BREAK_CHARS: int = 160  # 未遇到句末符时，缓冲达到该长度强制输出一行
+
+
+class SSEDecoder:
+    """增量 SSE 解码器：feed(字节块) -> 本块内完整 data 行的载荷字符串列表。
+
+    - 行以 \\n 结尾（兼容 \\r\\n）；空行（事件分隔/keep-alive）与非 data 字段忽略
+    - 跨块的半行留在缓冲中，等下一块补齐；close() 取出流末尾未换行的最后一行
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def feed(self, block: bytes) -> List[str]:
+        self._buf += block
+        out: List[str] = []
+        start = 0
+        buf = self._buf
+        while True:
+            nl = buf.find(b'\n', start)
+            if nl < 0:
+                break
+            self._emit(bytes(buf[start:nl]), out)
+            start = nl + 1
+        if start:
+            del buf[:start]
+        return out
+
+    def close(self) -> List[str]:
+        out: List[str] = []
+        if self._buf:
+            self._emit(bytes(self._buf), out)
+            self._buf.clear()
+        return out
+
+    @staticmethod
+    def _emit(line: bytes, out: List[str]) -> None:
+        line = line.strip(b'\r\n')
+        if line.startswith(b'data:'):
+            out.append(line[5:].decode('utf-8', errors='ignore').strip())
+
+
+class SentenceSegmenter:
+    """增量句子切分：push(文本) -> 本次完成的句子列表（已 strip，跳过空句）。
+
+    规则：每段文本先把空白归一为单个空格，遇到句末符（。！？!?；;）即成句；
+    未成句的尾巴保留在 pending（始终短于 ECHO_FORCE_BREAK_CHARS），超过阈值时整体强制输出。
+    每个字符只被正则扫描一次，不再随缓冲长度重复扫描。
+    """
+
+    def __init__(self, force_break: int = ECHO_FORCE_BREAK_CHARS):
+        self.force_break = force_break
+        self.pending: str = ''
+
+    def push(self, text: str) -> List[str]:
+        normalized = _WHITESPACE_RE.sub(' ', text)
+        sentences: List[str] = []
+        last = 0
+        for m in _SENTENCE_END_RE.finditer(normalized):
+            s = (self.pending + normalized[last:m.end()]).strip()
+            self.pending = ''
+            last = m.end()
+            if s:
+                sentences.append(s)
+        self.pending += normalized[last:]
+        if len(self.pending) >= self.force_break:
+            sentences.append(self.pending.strip())  # 强制断行照原样输出（即便只剩空白）
+            self.pending = ''
+        return sentences
+
+    def flush(self) -> str:
+        """取出并清空未成句的尾巴（已 strip）。"""
+        tail, self.pending = self.pending.strip(), ''
+        return tail
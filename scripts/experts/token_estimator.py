@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家团队编排器 token 估算模块
+
+功能：
+1. 本地启发式分词估算：按文字体系区分（CJK 约 1 token/字，ASCII 约 4 字符/token，
+   其它文字约 2 字符/token），只用 C 层编码计数，5MB 文本约 10 毫秒
+2. 根据 MODEL_CONFIGS 的上下文窗口与 MAX_TOKENS，计算每段文档可用的 token 预算
+3. 计算分层聚合时每次归约请求可容纳的输入 token 预算
+"""
+
+from typing import Dict, List
+from config import MODEL_CONFIGS, get_settings
+
+
+PROMPT_OVERHEAD_TOKENS: int = 1024  # 系统提示词 + 用户消息模板的预留
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本 token 数（偏保守，宁多勿少）。
+    
+    只做两次 C 层编码计数，按 UTF-8 字节宽度区分文字体系：
+    ASCII（1 字节）≈ 4 字符/token；2 字节字符（拉丁扩展/西里尔/希腊/阿拉伯等）≈ 2 字符/token；
+    3 字节及以上（CJK、假名、韩文、全角标点、emoji）≈ 1 token/字符。
+    """
+    if not text:
+        return 0
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    if ascii_chars == len(text):
+        return (ascii_chars + 3) // 4
+    wide_bytes = len(text.encode('utf-8', 'surrogatepass')) - ascii_chars
+    wide_chars = len(text) - ascii_chars
+    cjk_chars = min(wide_chars, max(0, wide_bytes - 2 * wide_chars))   # 设 2/3 字节字符各 x/y 个：y = 字节 - 2*字符
+    return cjk_chars + (ascii_chars + 3) // 4 + (wide_chars - cjk_chars + 1) // 2
+
+
+def chunk_token_budget(providers: List[Dict[str, str]]) -> int:
+    """所有提供商共用的单段文档 token 预算：
+    min(各模型上下文窗口 - 输出上限 MAX_TOKENS - 提示词预留, CHUNK_TOKEN_CAP)。
+    """
+    settings = get_settings()
+    budget = settings.chunk_token_cap
+    for provider in providers:
+        cfg = MODEL_CONFIGS.get(provider.get('provider_type', ''), {})
+        window = cfg.get('context_window')
+        if window:
+            budget = min(budget, window - settings.max_tokens - PROMPT_OVERHEAD_TOKENS)
+    return max(256, budget)
+
+
+def reduce_token_budget(provider: Dict[str, str]) -> int:
+    """单个提供商一次归约请求的输入 token 预算：
+    min(模型上下文窗口 - 输出上限 MAX_TOKENS - 提示词预留, REDUCE_TOKEN_CAP)。
+    """
+    settings = get_settings()
+    budget = settings.reduce_token_cap
+    window = MODEL_CONFIGS.get(provider.get('provider_type', ''), {}).get('context_window')
+    if window:
+        budget = min(budget, window - settings.max_tokens - PROMPT_OVERHEAD_TOKENS)
+    return max(256, budget)
@@ -2,39 +2,221 @@
 # -*- coding: utf-8 -*-
 
 """
-读取 DEPLOYMENT_PLAN_V2.md 中的任务条目（形如 - [ ] / - [x]），解析为待办清单并打印为行文本。
-输出格式：TODO: <section> - <item>
+读取计划文档（Markdown）中的任务条目（形如 - [ ] / - [x]），建立带稳定 ID 的待办索引。
+
+用法：
+  read_todos_from_plan.py                      # 默认读取 DEPLOYMENT_PLAN_V2.md，打印未完成条目
+  read_todos_from_plan.py 'docs/**/*.md' --all --json
+  read_todos_from_plan.py 'docs/**/*.md' --watch --interval 2 --index .cache/todo_index.json
+
+输出格式：
+  默认：TODO: <section> - <item>（--all 时已勾选条目为 DONE: ...）
+  --json：每行一个条目 {"id", "file", "line", "section", "text", "checked"}
+  --watch：轮询文件 mtime/大小，只重新解析有变化的文件，每行输出一个增量事件：
+    {"event": "added"|"removed"|"closed"|"reopened"|"changed", "id", ...}
+    changed 表示同一小节内条目文本被修改（附 prev_id / prev_text）
+  相对路径与 glob（支持 **）均相对项目根目录；--index 持久化索引，重启后只输出重启期间的变化。
 """
 
+import argparse
+import glob
+import hashlib
+import json
 import os
 import re
+import sys
+import time
 from pathlib import Path
+from typing import Dict, List, Optional, Any
 
-def main() -> None:
-    # 当前脚本位于: 程序集_Programs/个人网站项目V2/scripts/utils/
-    # 项目根:      程序集_Programs/个人网站项目V2/
-    project_root = Path(__file__).resolve().parents[2]
-    plan_file = project_root / 'DEPLOYMENT_PLAN_V2.md'
-    if not plan_file.exists():
-        return
+PATTERN_SECTION = re.compile(r'^#{1,6}\s+(.*)')
+PATTERN_ITEM = re.compile(r'^\s*[-*+]\s*\[([ xX])\]\s*(.*)')
+PATTERN_FENCE = re.compile(r'^\s*(```|~~~)')
+
+
+def item_id(file: str, section: str, text: str, occurrence: int) -> str:
+    """稳定 ID：文件 + 小节 + 条目文本（+ 同文重复序号）。勾选状态与行号变化不影响 ID。"""
+    key = '\x1f'.join((file, section, ' '.join(text.split()), str(occurrence)))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+
+def parse_plan(path: Path, file: str) -> List[Dict[str, Any]]:
+    """解析单个计划文档，返回条目列表（跳过代码块中的内容）。"""
+    items: List[Dict[str, Any]] = []
+    seen: Dict[tuple, int] = {}
     section = ''
-    pattern_section = re.compile(r'^###\s+(.*)')
-    pattern_item = re.compile(r'^-\s*\[([ xX])\]\s*(.*)')
-    with plan_file.open('r', encoding='utf-8') as f:
-        for line in f:
+    in_fence = False
+    with path.open('r', encoding='utf-8', errors='replace') as f:
+        for lineno, line in enumerate(f, 1):
             line = line.rstrip('\n')
-            msec = pattern_section.match(line)
+            if PATTERN_FENCE.match(line):
+                in_fence = not in_fence
+                continue
+            if in_fence:
+                continue
+            msec = PATTERN_SECTION.match(line)
             if msec:
                 section = msec.group(1).strip()
                 continue
-            mitem = pattern_item.match(line)
+            mitem = PATTERN_ITEM.match(line)
             if mitem:
-                checked = mitem.group(1) in ('x', 'X')
-                item = mitem.group(2).strip()
-                if not checked and item:
-                    print(f'TODO: {section} - {item}')
+                text = mitem.group(2).strip()
+                if not text:
+                    continue
+                key = (section, text)
+                occurrence = seen.get(key, 0)
+                seen[key] = occurrence + 1
+                items.append({
+                    'id': item_id(file, section, text, occurrence),
+                    'file': file,
+                    'line': lineno,
+                    'section': section,
+                    'text': text,
+                    'checked': mitem.group(1) in ('x', 'X'),
+                })
+    return items
 
-if __name__ == '__main__':
-    main()
 
+def diff_items(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """比较同一文件新旧条目，产出增量事件。同一小节内按顺序配对的删除 + 新增视为 changed。"""
+    old_by_id = {it['id']: it for it in old}
+    new_by_id = {it['id']: it for it in new}
+    events: List[Dict[str, Any]] = []
+    for it in new:
+        prev = old_by_id.get(it['id'])
+        if prev is not None and prev['checked'] != it['checked']:
+            events.append({'event': 'closed' if it['checked'] else 'reopened', **it})
+    removed: Dict[str, List[Dict[str, Any]]] = {}
+    for it in old:
+        if it['id'] not in new_by_id:
+            removed.setdefault(it['section'], []).append(it)
+    for it in new:
+        if it['id'] in old_by_id:
+            continue
+        candidates = removed.get(it['section'])
+        if candidates:
+            prev = candidates.pop(0)
+            events.append({'event': 'changed', **it, 'prev_id': prev['id'], 'prev_text': prev['text']})
+        else:
+            events.append({'event': 'added', **it})
+    for items in removed.values():
+        events.extend({'event': 'removed', **it} for it in items)
+    return events
+
+
+class TodoIndex:
+    """多文档待办索引：{file: {'mtime_ns', 'size', 'items'}}。refresh() 只重新解析 stat 变化的文件。"""
+
+    def __init__(self, root: Path, patterns: List[str]):
+        self.root = root
+        self.patterns = patterns
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'polls': 0, 'stat_calls': 0, 'parsed': 0}
+
+    def discover(self) -> Dict[str, Path]:
+        found: Dict[str, Path] = {}
+        for pattern in self.patterns:
+            if os.path.isabs(pattern):
+                paths = [Path(p) for p in glob.glob(pattern, recursive=True)]
+            else:
+                paths = list(self.root.glob(pattern))
+            for p in sorted(paths):
+                if p.is_file():
+                    try:
+                        file = p.resolve().relative_to(self.root.resolve()).as_posix()
+                    except ValueError:
+                        file = str(p.resolve())
+                    found.setdefault(file, p)
+        return found
+
+    def refresh(self) -> List[Dict[str, Any]]:
+        """扫描一次，返回相对当前索引的增量事件。"""
+        self.stats['polls'] += 1
+        events: List[Dict[str, Any]] = []
+        found = self.discover()
+        for file, path in found.items():
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            self.stats['stat_calls'] += 1
+            entry = self.files.get(file)
+            if entry and entry['mtime_ns'] == st.st_mtime_ns and entry['size'] == st.st_size:
+                continue
+            try:
+                items = parse_plan(path, file)
+            except OSError:
+                continue
+            self.stats['parsed'] += 1
+            events.extend(diff_items(entry['items'] if entry else [], items))
+            self.files[file] = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'items': items}
+        for file in [f for f in self.files if f not in found]:
+            events.extend(diff_items(self.files.pop(file)['items'], []))
+        return events
+
+    def items(self, include_checked: bool = False) -> List[Dict[str, Any]]:
+        return [it for entry in self.files.values() for it in entry['items']
+                if include_checked or not it['checked']]
+
+    def load(self, path: Path) -> None:
+        try:
+            self.files = dict(json.loads(path.read_text(encoding='utf-8')).get('files') or {})
+        except (OSError, ValueError):
+            pass
 
+    def save(self, path: Path) -> None:
+        """原子写入索引。"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_text(json.dumps({'files': self.files}, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, path)
+
+
+def emit(record: Dict[str, Any]) -> None:
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    # 当前脚本位于: 程序集_Programs/个人网站项目V2/scripts/utils/
+    # 项目根:      程序集_Programs/个人网站项目V2/
+    project_root = Path(__file__).resolve().parents[2]
+    ap = argparse.ArgumentParser(description='计划文档待办索引')
+    ap.add_argument('patterns', nargs='*', default=['DEPLOYMENT_PLAN_V2.md'],
+                    help='计划文档路径或 glob（相对项目根目录，支持 **）')
+    ap.add_argument('--all', action='store_true', help='包含已勾选的条目')
+    ap.add_argument('--json', action='store_true', help='以 JSON 行输出条目')
+    ap.add_argument('--watch', action='store_true', help='轮询模式：输出 added/removed/closed/reopened/changed 增量')
+    ap.add_argument('--interval', type=float, default=2.0, help='轮询间隔（秒）')
+    ap.add_argument('--index', type=Path, help='索引文件（持久化，重启后只输出期间的变化）')
+    args = ap.parse_args(argv)
+
+    index = TodoIndex(project_root, args.patterns)
+    if args.index is not None:
+        index.load(args.index)
+
+    if not args.watch:
+        index.refresh()
+        for it in index.items(include_checked=args.all):
+            if args.json:
+                emit(it)
+            else:
+                print(f"{'DONE' if it['checked'] else 'TODO'}: {it['section']} - {it['text']}")
+        if args.index is not None:
+            index.save(args.index)
+        return
+
+    try:
+        while True:
+            events = index.refresh()
+            for event in events:
+                emit(event)
+            if events:
+                sys.stdout.flush()
+                if args.index is not None:
+                    index.save(args.index)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()